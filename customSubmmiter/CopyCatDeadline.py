@@ -0,0 +1,385 @@
+import os
+import sys
+import subprocess
+import json
+import time
+import datetime
+import traceback
+import threading
+
+from CopyCatWebService import WebServiceClient, WebServiceError, getWebServiceClient
+
+try:
+    from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+except ImportError:
+    pass
+
+DEADLINE_WEBSERVICE_URL = "" #URL for your web service -> https://docs.thinkboxsoftware.com/products/deadline/10.1/1_User%20Manual/manual/standalone-python.html
+DEADLINE_WEBSERVICE_PORT = "" #port
+
+COPYCAT_GROUP = "copycat"
+
+# Workers in these states can't take the training job, and neither can workers whose last status update is older than MAX_HEARTBEAT_AGE seconds.
+# Busy workers (rendering, starting a job) are kept, they pick the job up from the queue, but ranked after idle ones.
+UNUSABLE_WORKER_STATES = ("offline", "stalled", "unknown")
+BUSY_WORKER_STATES = ("rendering", "startingjob")
+MAX_HEARTBEAT_AGE = 300
+# The web service reports worker state as a number
+WORKER_STATES = {0: "Unknown", 1: "Rendering", 2: "Idle", 3: "Offline", 4: "Stalled", 8: "StartingJob"}
+
+# Farm info (pools, groups, max priority, group members) is cached here so the dialog can open without
+# waiting on Deadline. Entries older than FARM_INFO_CACHE_TTL seconds are refreshed in the background.
+FARM_INFO_CACHE_FILE = os.path.join(os.path.expanduser("~"), ".copycat_submitter", "farm_info.json")
+FARM_INFO_CACHE_TTL = 300
+
+# Deadline script executed with "deadlinecommand -ExecuteScriptNoGui" so everything is grabbed in one process.
+FARM_INFO_MARKER = "COPYCAT_FARM_INFO:"
+FARM_INFO_SCRIPT = '''
+import json
+from System import DateTime
+from Deadline.Scripting import RepositoryUtils
+
+def __main__(*args):
+    groups = [group.lower() for group in args]
+    info = {"Pools": list(RepositoryUtils.GetPoolNames()),
+            "Groups": list(RepositoryUtils.GetGroupNames()),
+            "MaxPriority": 100,
+            "GroupMachines": dict((group, []) for group in groups),
+            "Workers": {}}
+    try:
+        info["MaxPriority"] = int(RepositoryUtils.GetMaximumPriority())
+    except Exception:
+        pass
+
+    slaveInfos = dict((slaveInfo.SlaveName.lower(), slaveInfo) for slaveInfo in RepositoryUtils.GetSlaveInfos(True))
+    for settings in RepositoryUtils.GetSlaveSettingsList(True):
+        inGroup = False
+        for group in settings.SlaveGroups:
+            if group.lower() in info["GroupMachines"]:
+                info["GroupMachines"][group.lower()].append(settings.SlaveName)
+                inGroup = True
+        slaveInfo = slaveInfos.get(settings.SlaveName.lower())
+        if not inGroup or slaveInfo is None:
+            continue
+
+        # SlaveInfo and SlaveSettings properties of the Deadline Scripting reference
+        worker = {"State": str(slaveInfo.SlaveState),
+                  "Enabled": bool(settings.SlaveEnabled),
+                  "HeartbeatAge": (DateTime.UtcNow - slaveInfo.SlaveStatusDate.ToUniversalTime()).TotalSeconds,
+                  "Gpus": len(list(settings.SlaveGpuAffinity)) if settings.SlaveOverrideGpuAffinity else None,
+                  "FreeMemory": int(slaveInfo.MachineAvailableMemory)}
+        info["Workers"][settings.SlaveName] = worker
+
+    print("%s" + json.dumps(info))
+''' % FARM_INFO_MARKER
+
+_deadlineCommand = None # type: Optional[str]
+_farmInfoCache = None
+
+def isWebServiceConfigured():
+    # type: () -> bool
+    return DEADLINE_WEBSERVICE_URL != ""
+
+def connect_to_api():
+    # type: () -> WebServiceClient
+    """The shared web service client, its keep-alive connections are reused by every call."""
+    if not isWebServiceConfigured():
+        raise WebServiceError("DEADLINE_WEBSERVICE_URL is not set in CopyCatDeadline.py, the submitter needs the web service")
+    return getWebServiceClient(DEADLINE_WEBSERVICE_URL, DEADLINE_WEBSERVICE_PORT)
+
+def getJSONResponseFromDeadline(arguments: list) -> Any:
+    result = {}
+    json_arg = ["-prettyJSON"]
+    cmd  = json_arg + arguments
+    try:
+        result = json.loads(CallDeadlineCommand(cmd)) # type: Dict
+    except:
+        print("Unable to get submitter info from Deadline:\n\n" + traceback.format_exc())
+        raise
+
+    if result[ "ok" ]:
+        result = result[ "result" ]
+    else:
+        print("DeadlineCommand returned a bad result and was unable to grab the submitter info.\n\n" + result[ "result" ])
+        raise Exception(result[ "result" ])
+
+    return result #type: Optional[dict | list]
+
+def queryFarmInfoFromWebService(groups):
+    # type: (List[str]) -> Dict
+    api_connection = connect_to_api()
+    info = {
+        "Pools": list(api_connection.Pools.GetPoolNames()),
+        "Groups": list(api_connection.Groups.GetGroupNames()),
+        "GroupMachines": dict((group.lower(), []) for group in groups),
+        "Workers": {},
+    }
+    try:
+        info["MaxPriority"] = api_connection.Misc.GetMaximumPriority()
+    except (WebServiceError, TypeError, ValueError) as e:
+        # Without it the dialog keeps the maximum it has
+        print(f"Unable to read the repository's maximum priority from the web service: {e}")
+    for slave in api_connection.Slaves.GetSlaveInfoSettings():
+        settings = slave.get("Settings", {})
+        slaveInfo = slave.get("Info", {})
+        name = slaveInfo.get("Name", settings.get("Name", ""))
+        slaveGroups = settings.get("Grps", [])
+        if isinstance(slaveGroups, str):
+            slaveGroups = slaveGroups.split(",")
+        inGroup = False
+        for group in slaveGroups:
+            group = group.strip().lower()
+            if group in info["GroupMachines"]:
+                info["GroupMachines"][group].append(name)
+                inGroup = True
+        if inGroup:
+            info["Workers"][name] = getWorkerFromWebServiceInfo(slaveInfo, settings)
+    return info
+
+def getWorkerFromWebServiceInfo(slaveInfo, settings):
+    # type: (Dict, Dict) -> Dict
+    worker = {
+        "State": WORKER_STATES.get(slaveInfo.get("Stat", 0), "Unknown"),
+        "Enabled": bool(settings.get("Enable", True)),
+        "HeartbeatAge": None,
+        "Gpus": None,
+        "FreeMemory": None,
+    }
+    # Web service keys of SlaveInfo and SlaveSettings
+    statusDate = slaveInfo.get("StatDate")
+    if statusDate:
+        try:
+            # e.g. "2024-05-30T10:11:12.123Z"
+            heartbeat = datetime.datetime.strptime(statusDate[:19], "%Y-%m-%dT%H:%M:%S").replace(tzinfo=datetime.timezone.utc)
+            worker["HeartbeatAge"] = (datetime.datetime.now(datetime.timezone.utc) - heartbeat).total_seconds()
+        except ValueError:
+            pass
+    # Deadline only knows a worker's GPUs when its GPU affinity is set
+    if settings.get("GpuAffOvr") and settings.get("GpuAff"):
+        worker["Gpus"] = len(settings["GpuAff"])
+    if slaveInfo.get("RAMFree") is not None:
+        worker["FreeMemory"] = int(slaveInfo["RAMFree"])
+    return worker
+
+def rankCopyCatMachines(info, group=COPYCAT_GROUP):
+    # type: (Dict, str) -> Tuple[List[str], Dict[str, str]]
+    """Drops workers that can't train right now and orders the rest idle first, then by capability.
+
+    Returns the usable machines, best first, and the reason each dropped machine was left out.
+    Machines without any worker data (legacy deadlinecommand fallback) are kept in their original order.
+    """
+    workers = info.get("Workers", {})
+    # Heartbeat ages were measured when the info was grabbed, the cache may be older than that
+    cacheAge = max(0.0, time.time() - info.get("Timestamp", time.time()))
+    usable = []
+    dropped = {}
+    for index, machine in enumerate(info["GroupMachines"].get(group.lower(), [])):
+        worker = workers.get(machine)
+        if worker is None:
+            usable.append((0, 0, 0, index, machine))
+            continue
+        if not worker.get("Enabled", True):
+            dropped[machine] = "disabled"
+        elif worker.get("State", "Unknown").lower() in UNUSABLE_WORKER_STATES:
+            dropped[machine] = worker["State"].lower()
+        elif worker.get("HeartbeatAge") is not None and worker["HeartbeatAge"] + cacheAge > MAX_HEARTBEAT_AGE:
+            dropped[machine] = f"no heartbeat for {int(worker['HeartbeatAge'] + cacheAge)} seconds"
+        else:
+            busy = worker.get("State", "").lower() in BUSY_WORKER_STATES
+            usable.append((busy, -(worker.get("Gpus") or 0), -(worker.get("FreeMemory") or 0), index, machine))
+
+    usable.sort()
+    return [entry[-1] for entry in usable], dropped
+
+def getGpusPerMachine(info, machines):
+    # type: (Dict, List[str]) -> Optional[int]
+    """Fewest GPUs any of the machines has, None when the farm info doesn't know."""
+    counts = [info.get("Workers", {}).get(machine, {}).get("Gpus") for machine in machines]
+    counts = [count for count in counts if count]
+    return min(counts) if counts else None
+
+def queryFarmInfoFromDeadlineCommand(groups):
+    # type: (List[str]) -> Dict
+    scriptFile = os.path.join(os.path.dirname(FARM_INFO_CACHE_FILE), "copycat_farm_info.py")
+    os.makedirs(os.path.dirname(scriptFile), exist_ok=True)
+    with open(scriptFile, "w") as f:
+        f.write(FARM_INFO_SCRIPT)
+
+    output = CallDeadlineCommand(["-ExecuteScriptNoGui", scriptFile] + list(groups))
+    for line in output.splitlines():
+        if line.startswith(FARM_INFO_MARKER):
+            return json.loads(line[len(FARM_INFO_MARKER):])
+
+    # Older Deadline versions can not run the batch script, fall back to one call per query.
+    print("Batched farm query failed, falling back to separate deadlinecommand calls:\n" + output)
+    submissionInfo = getJSONResponseFromDeadline(["-GetSubmissionInfo", "Pools", "Groups", "MaxPriority"])
+    info = {
+        "Pools": submissionInfo["Pools"],
+        "Groups": submissionInfo["Groups"],
+        "MaxPriority": submissionInfo.get("MaxPriority", 100),
+        "GroupMachines": {},
+        "Workers": {},
+    }
+    for group in groups:
+        info["GroupMachines"][group.lower()] = getJSONResponseFromDeadline(["-GetSlaveNamesInGroup", group])
+    return info
+
+def reportMissingWorkerData(info):
+    # type: (Dict) -> None
+    """Says which workers can't be ranked or checked because Deadline didn't report their GPU count, free memory or status date."""
+    workers = info.get("Workers", {})
+    for key, what in (("Gpus", "GPU count (set their GPU affinity)"), ("FreeMemory", "free memory"), ("HeartbeatAge", "last status update")):
+        missing = sorted(name for name, worker in workers.items() if worker.get(key) is None)
+        if missing:
+            print(f"Deadline reported no {what} for {', '.join(missing)}, it is not used to pick machines")
+
+def queryFarmInfo(groups):
+    # type: (List[str]) -> Dict
+    info = None
+    if isWebServiceConfigured():
+        try:
+            info = queryFarmInfoFromWebService(groups)
+        except Exception:
+            print("Unable to get farm info from web service, using deadlinecommand:\n\n" + traceback.format_exc())
+    if info is None:
+        info = queryFarmInfoFromDeadlineCommand(groups)
+    reportMissingWorkerData(info)
+    return info
+
+class FarmInfoCache(object):
+    """Pools, groups, max priority and group members stored on disk with a TTL."""
+
+    def __init__(self, path=FARM_INFO_CACHE_FILE, ttl=FARM_INFO_CACHE_TTL, groups=(COPYCAT_GROUP,)):
+        self.path = path
+        self.ttl = ttl
+        self.groups = list(groups)
+        self._lock = threading.Lock()
+        self._refreshThread = None # type: Optional[threading.Thread]
+
+    def load(self):
+        # type: () -> Optional[Dict]
+        try:
+            with open(self.path, "r") as f:
+                info = json.load(f)
+        except (IOError, OSError, ValueError):
+            return None
+        if not all(group.lower() in info.get("GroupMachines", {}) for group in self.groups):
+            return None
+        return info
+
+    def isFresh(self, info):
+        # type: (Optional[Dict]) -> bool
+        return bool(info) and (time.time() - info.get("Timestamp", 0)) < self.ttl
+
+    def save(self, info):
+        # type: (Dict) -> None
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmpPath = self.path + ".tmp"
+        with open(tmpPath, "w") as f:
+            json.dump(info, f)
+        os.replace(tmpPath, self.path)
+
+    def invalidate(self):
+        # type: () -> None
+        with self._lock:
+            if os.path.exists(self.path):
+                os.remove(self.path)
+
+    def fetch(self):
+        # type: () -> Dict
+        info = queryFarmInfo(self.groups)
+        info["Timestamp"] = time.time()
+        with self._lock:
+            self.save(info)
+        return info
+
+    def get(self):
+        # type: () -> Dict
+        """Returns cached info when there is any (even stale), otherwise blocks on Deadline."""
+        info = self.load()
+        if info is None:
+            info = self.fetch()
+        return info
+
+    def refreshAsync(self, callback):
+        # type: (Callable[[Dict], None]) -> None
+        if self._refreshThread and self._refreshThread.is_alive():
+            return
+
+        def refresh():
+            try:
+                callback(self.fetch())
+            except Exception:
+                print("Unable to refresh farm info:\n\n" + traceback.format_exc())
+
+        self._refreshThread = threading.Thread(target=refresh, name="CopyCatFarmInfoRefresh")
+        self._refreshThread.daemon = True
+        self._refreshThread.start()
+
+def getFarmInfoCache():
+    # type: () -> FarmInfoCache
+    global _farmInfoCache
+    if _farmInfoCache is None:
+        _farmInfoCache = FarmInfoCache()
+    return _farmInfoCache
+
+def invalidateFarmInfoCache():
+    # type: () -> None
+    getFarmInfoCache().invalidate()
+
+def CallDeadlineCommand(arguments, hideWindow=True):
+    # type: (List[str], bool) -> str
+    deadlineCommand = GetDeadlineCommand() # type: str
+
+    startupinfo = None # type: ignore # this is only a windows option
+    if hideWindow and os.name == 'nt':
+        # Python 2.6 has subprocess.STARTF_USESHOWWINDOW, and Python 2.7 has subprocess._subprocess.STARTF_USESHOWWINDOW, so check for both.
+        if hasattr(subprocess, '_subprocess') and hasattr(subprocess._subprocess, 'STARTF_USESHOWWINDOW'): # type: ignore # this is only a windows option
+            startupinfo = subprocess.STARTUPINFO() # type: ignore # this is only a windows option
+            startupinfo.dwFlags |= subprocess._subprocess.STARTF_USESHOWWINDOW # type: ignore # this is only a windows option
+        elif hasattr(subprocess, 'STARTF_USESHOWWINDOW'):
+            startupinfo = subprocess.STARTUPINFO() # type: ignore # this is only a windows option
+            startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW # type: ignore # this is only a windows option
+
+    # The child inherits our environment as is, it only needs a copy when PATH has to be changed.
+    environment = None # type: Optional[Dict[str, str]]
+
+    # Need to set the PATH, cuz windows seems to load DLLs from the PATH earlier that cwd....
+    if os.name == 'nt':
+        deadlineCommandDir = os.path.dirname(deadlineCommand)
+        if not deadlineCommandDir == "" :
+            environment = dict(os.environ)
+            environment['PATH'] = deadlineCommandDir + os.pathsep + os.environ['PATH']
+
+    arguments.insert(0, deadlineCommand)
+    output = "" # type: Union[bytes, str]
+
+    # Specifying PIPE for all handles to workaround a Python bug on Windows. The unused handles are then closed immediatley afterwards.
+    proc = subprocess.Popen(arguments, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE, startupinfo=startupinfo, env=environment)
+    output, errors = proc.communicate()
+
+    if sys.version_info[0] > 2 and type(output) is bytes:
+        output = output.decode()
+    return output # type: ignore
+
+def GetDeadlineCommand():
+    # type: () -> str
+    global _deadlineCommand
+    if _deadlineCommand is not None:
+        return _deadlineCommand
+
+    deadlineBin = "" # type: str
+    try:
+        deadlineBin = os.environ['DEADLINE_PATH']
+    except KeyError:
+        #if the error is a key error it means that DEADLINE_PATH is not set. however Deadline command may be in the PATH or on OSX it could be in the file /Users/Shared/Thinkbox/DEADLINE_PATH
+        pass
+
+    # On OSX, we look for the DEADLINE_PATH file if the environment variable does not exist.
+    if deadlineBin == "" and  os.path.exists("/Users/Shared/Thinkbox/DEADLINE_PATH"):
+        with open("/Users/Shared/Thinkbox/DEADLINE_PATH") as f:
+            deadlineBin = f.read().strip()
+
+    _deadlineCommand = os.path.join(deadlineBin, "deadlinecommand") # type: str
+
+    return _deadlineCommand
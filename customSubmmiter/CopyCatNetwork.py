@@ -0,0 +1,324 @@
+import os
+import json
+import ipaddress
+import socket
+import time
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor, TimeoutError, wait
+
+try:
+    from typing import Callable, Dict, Iterable, List, Optional, Tuple
+except ImportError:
+    pass
+
+RESOLVE_TIMEOUT = 2.0 # seconds allowed per host before the submitter stops waiting for it
+RESOLVE_CACHE_TTL = 600
+RESOLVE_WORKERS = 16
+
+# A probed link is flagged as slow when it is worse than these limits, or much worse than the typical link
+PROBE_MAX_RTT = 0.001 # seconds
+PROBE_MIN_BANDWIDTH = 200e6 # bytes per second
+PROBE_WAIT_TIMEOUT = 900
+
+_resolver = None
+
+def resolveHost(hostname):
+    # type: (str) -> Dict[str, Optional[str]]
+    """Looks up both address families with a single getaddrinfo call."""
+    entry = {"ipv4": None, "ipv6": None} # type: Dict[str, Optional[str]]
+    hasLoopbackIpv6 = False
+    for family, _, _, _, sockaddr in socket.getaddrinfo(hostname, None):
+        address = str(sockaddr[0])
+        if family == socket.AF_INET and entry["ipv4"] is None:
+            entry["ipv4"] = address
+        elif family == socket.AF_INET6:
+            if address == "::1": # Exclude loopback address (::1)
+                hasLoopbackIpv6 = True
+            elif entry["ipv6"] is None:
+                entry["ipv6"] = address
+
+    if entry["ipv6"] is None and hasLoopbackIpv6:
+        entry["ipv6"] = "::1"
+    return entry
+
+class HostResolver(object):
+    """Resolves worker names on a thread pool so Nuke's UI thread never waits on DNS.
+
+    Results for both address families are cached per host. Hosts that don't answer within
+    the timeout are reported as unresolved, their lookup keeps running and fills the cache later.
+    """
+
+    def __init__(self, timeout=RESOLVE_TIMEOUT, ttl=RESOLVE_CACHE_TTL, maxWorkers=RESOLVE_WORKERS):
+        self.timeout = timeout
+        self.ttl = ttl
+        self._executor = ThreadPoolExecutor(max_workers=maxWorkers, thread_name_prefix="CopyCatResolver")
+        self._lock = threading.Lock()
+        self._cache = {} # type: Dict[str, Dict]
+        self._pending = {} # type: Dict[str, object]
+
+    def get(self, hostname):
+        # type: (str) -> Optional[Dict[str, Optional[str]]]
+        with self._lock:
+            entry = self._cache.get(hostname.lower())
+        if entry and time.time() - entry["Timestamp"] < self.ttl:
+            return entry
+        return None
+
+    def _lookup(self, hostname):
+        try:
+            entry = resolveHost(hostname)
+        except Exception as e:
+            print(f"Error resolving {hostname}: {e}")
+            entry = {"ipv4": None, "ipv6": None}
+        entry["Timestamp"] = time.time()
+        with self._lock:
+            self._cache[hostname.lower()] = entry
+            self._pending.pop(hostname.lower(), None)
+        return entry
+
+    def _submit(self, hostname):
+        with self._lock:
+            future = self._pending.get(hostname.lower())
+            if future is None:
+                future = self._executor.submit(self._lookup, hostname)
+                self._pending[hostname.lower()] = future
+        return future
+
+    def resolve(self, hostname, timeout=None):
+        # type: (str, Optional[float]) -> Optional[Dict[str, Optional[str]]]
+        """Blocking lookup limited to the timeout, returns None if the host did not answer in time."""
+        entry = self.get(hostname)
+        if entry:
+            return entry
+        try:
+            return self._submit(hostname).result(self.timeout if timeout is None else timeout)
+        except TimeoutError:
+            print(f"Resolving {hostname} timed out")
+            return None
+
+    def resolveAll(self, hostnames, timeout=None):
+        # type: (Iterable[str], Optional[float]) -> Dict[str, Optional[Dict[str, Optional[str]]]]
+        """Cached entries right away, the other hosts looked up together and waited on once, for the timeout in total."""
+        entries = {}
+        futures = {}
+        for hostname in hostnames:
+            entries[hostname] = self.get(hostname)
+            if entries[hostname] is None:
+                futures[hostname] = self._submit(hostname)
+        if futures:
+            done, _ = wait(list(futures.values()), timeout=self.timeout if timeout is None else timeout)
+            for hostname, future in futures.items():
+                if future in done:
+                    entries[hostname] = future.result()
+                else:
+                    print(f"Resolving {hostname} timed out")
+        return entries
+
+    def resolveAsync(self, hostnames, callback=None):
+        # type: (Iterable[str], Optional[Callable[[str, Optional[Dict]], None]]) -> None
+        """Resolves all hosts at once, callback(hostname, entry) is called from a worker thread."""
+        futures = {}
+        for hostname in hostnames:
+            hostname = str(hostname).strip()
+            if not hostname:
+                continue
+            entry = self.get(hostname)
+            if entry:
+                if callback:
+                    callback(hostname, entry)
+            else:
+                futures[hostname] = self._submit(hostname)
+
+        if not futures or not callback:
+            return
+
+        def report():
+            done, notDone = wait(list(futures.values()), timeout=self.timeout)
+            for hostname, future in futures.items():
+                try:
+                    callback(hostname, future.result() if future in done else None)
+                except Exception:
+                    print(traceback.format_exc())
+
+        thread = threading.Thread(target=report, name="CopyCatResolverReport")
+        thread.daemon = True
+        thread.start()
+
+def getResolver():
+    # type: () -> HostResolver
+    global _resolver
+    if _resolver is None:
+        _resolver = HostResolver()
+    return _resolver
+
+def loadProbeMatrix(directory):
+    # type: (str) -> Dict[str, Dict[str, Dict]]
+    """Reads the rows written by the CopyCat plugin's network probe into matrix[source][destination], with the plugin's own reader."""
+    # CopyCatSubmission imports this module, so it can't be imported at the top
+    from CopyCatSubmission import importPluginModule
+    return importPluginModule("CopyCatNetProbe").loadProbeMatrix(directory)
+
+def findSlowPairs(matrix):
+    # type: (Dict[str, Dict[str, Dict]]) -> List[Tuple[str, str, str]]
+    results = [result for row in matrix.values() for result in row.values() if "Error" not in result]
+    if not results:
+        medianRtt, medianBandwidth = 0.0, 0.0
+    else:
+        medianRtt = sorted(result["Rtt"] for result in results)[len(results) // 2]
+        medianBandwidth = sorted(result["Bandwidth"] for result in results)[len(results) // 2]
+
+    slowPairs = []
+    for source in sorted(matrix):
+        for destination, result in sorted(matrix[source].items()):
+            if "Error" in result:
+                slowPairs.append((source, destination, "unreachable: " + result["Error"]))
+            elif result["Rtt"] > PROBE_MAX_RTT or result["Rtt"] > 2.0 * medianRtt:
+                slowPairs.append((source, destination, f"rtt {result['Rtt'] * 1000.0:.3f} ms"))
+            elif result["Bandwidth"] < PROBE_MIN_BANDWIDTH or result["Bandwidth"] < 0.5 * medianBandwidth:
+                slowPairs.append((source, destination, f"{result['Bandwidth'] / 1e6:.1f} MB/s"))
+    return slowPairs
+
+def formatProbeMatrix(matrix):
+    # type: (Dict[str, Dict[str, Dict]]) -> str
+    machines = sorted(set(matrix) | set(destination for row in matrix.values() for destination in row))
+    width = max([len(machine) for machine in machines] + [18])
+    lines = ["RTT (ms) / throughput (MB/s), rows are the measuring machine", " " * width + "".join(machine.rjust(width + 2) for machine in machines)]
+    for source in machines:
+        cells = []
+        for destination in machines:
+            result = matrix.get(source, {}).get(destination)
+            if source == destination:
+                cells.append("-")
+            elif result is None:
+                cells.append("?")
+            elif "Error" in result:
+                cells.append("unreachable")
+            else:
+                cells.append(f"{result['Rtt'] * 1000.0:.3f} / {result['Bandwidth'] / 1e6:.0f}")
+        lines.append(source.ljust(width) + "".join(cell.rjust(width + 2) for cell in cells))
+
+    slowPairs = findSlowPairs(matrix)
+    if slowPairs:
+        lines.append("")
+        lines.append("Slow links:")
+        lines.extend(f"  {source} -> {destination}: {reason}" for source, destination, reason in slowPairs)
+    return "\n".join(lines)
+
+def waitForProbeMatrix(directory, machines, callback, timeout=PROBE_WAIT_TIMEOUT):
+    # type: (str, List[str], Callable[[Dict[str, Dict[str, Dict]]], None], float) -> None
+    """Waits in the background until every machine wrote its probe results, then calls callback(matrix)."""
+    def poll():
+        deadline = time.time() + timeout
+        expected = set(machine.strip().lower() for machine in machines if machine.strip())
+        matrix = {}
+        while time.time() < deadline:
+            matrix = loadProbeMatrix(directory)
+            if expected.issubset(matrix):
+                break
+            time.sleep(5)
+        callback(matrix)
+
+    thread = threading.Thread(target=poll, name="CopyCatProbeResults")
+    thread.daemon = True
+    thread.start()
+
+def loadTopologyMap(path):
+    # type: (str) -> Dict[str, List[str]]
+    """Reads {"worker001": "switchA/rack3", ...}, outermost level first, into machine -> levels.
+
+    Levels can also be given as a list, ["switchA", "rack3"].
+    """
+    with open(path, "r") as f:
+        entries = json.load(f)
+    topology = {}
+    for machine, location in entries.items():
+        levels = location if isinstance(location, list) else str(location).split("/")
+        topology[machine.strip().lower()] = [str(level).strip() for level in levels if str(level).strip()]
+    return topology
+
+def topologyDistance(topology):
+    # type: (Dict[str, List[str]]) -> Callable[[str, str], float]
+    """Machines further apart the higher up their locations split, unknown machines are furthest."""
+    depth = max([len(levels) for levels in topology.values()] + [1])
+    def distance(first, second):
+        firstLevels, secondLevels = topology.get(first.lower()), topology.get(second.lower())
+        if firstLevels is None or secondLevels is None:
+            return float(depth + 1)
+        shared = 0
+        for firstLevel, secondLevel in zip(firstLevels, secondLevels):
+            if firstLevel != secondLevel:
+                break
+            shared += 1
+        return float(depth - shared)
+    return distance
+
+def probeDistance(matrix):
+    # type: (Dict[str, Dict[str, Dict]]) -> Callable[[str, str], float]
+    """Round trip time measured by the network probe, in both directions, unreachable pairs are furthest."""
+    def rtt(source, destination):
+        result = matrix.get(source.lower(), {}).get(destination.lower())
+        if not result or "Error" in result:
+            return None
+        return result["Rtt"]
+    def distance(first, second):
+        measured = [value for value in (rtt(first, second), rtt(second, first)) if value is not None]
+        return sum(measured) / len(measured) if measured else float("inf")
+    return distance
+
+def subnetDistance(addresses, prefixLength=24):
+    # type: (Dict[str, str], int) -> Callable[[str, str], float]
+    """0 for machines on the same subnet, 1 otherwise, when nothing better is known."""
+    networks = {}
+    for machine, address in addresses.items():
+        if address:
+            length = prefixLength if ipaddress.ip_address(address).version == 4 else 64
+            networks[machine.lower()] = ipaddress.ip_network(f"{address}/{length}", strict=False)
+    def distance(first, second):
+        firstNetwork, secondNetwork = networks.get(first.lower()), networks.get(second.lower())
+        return 0.0 if firstNetwork is not None and firstNetwork == secondNetwork else 1.0
+    return distance
+
+def bestConnectedMachine(machines, distance):
+    # type: (List[str], Callable[[str, str], float]) -> str
+    """The machine closest to all the others, on ties the earliest (the list is best GPUs first)."""
+    return min(machines, key=lambda machine: (sum(distance(machine, other) for other in machines if other != machine), machines.index(machine)))
+
+def orderMachinesByTopology(machines, distance, mainMachine=None):
+    # type: (List[str], Callable[[str, str], float], Optional[str]) -> List[str]
+    """Main machine first, then every next rank the machine closest to the previous one.
+
+    Ranks next to each other end up on the same switch or rack and the order crosses to the next
+    group only once the current one is used up, so the sync traffic crosses as few slow links as
+    possible. Without a main machine the best connected one is used.
+    """
+    remaining = list(machines)
+    if not remaining:
+        return []
+    if mainMachine is None or mainMachine.lower() not in [machine.lower() for machine in remaining]:
+        mainMachine = bestConnectedMachine(remaining, distance)
+    current = next(machine for machine in remaining if machine.lower() == mainMachine.lower())
+    ordered = [current]
+    remaining.remove(current)
+    while remaining:
+        # Ties go to the machine closer to the main machine, then to the earlier one
+        current = min(remaining, key=lambda machine: (distance(current, machine), distance(ordered[0], machine), remaining.index(machine)))
+        ordered.append(current)
+        remaining.remove(current)
+    return ordered
+
+def machineDistance(machines, probeDirectory="", topologyFile="", useIpv6=False):
+    # type: (List[str], str, str, bool) -> Tuple[Callable[[str, str], float], str]
+    """The best known distance between the machines: probe results covering them, a topology map, or their subnets."""
+    names = [machine.lower() for machine in machines]
+    if probeDirectory:
+        matrix = loadProbeMatrix(probeDirectory)
+        if all(name in matrix for name in names):
+            return probeDistance(matrix), f"network probe in {probeDirectory}"
+    topologyFile = topologyFile or os.environ.get("COPYCAT_TOPOLOGY_FILE", "")
+    if topologyFile:
+        return topologyDistance(loadTopologyMap(topologyFile)), f"topology map {topologyFile}"
+    # The dialog calls this on Nuke's UI thread, it must not wait on the machines one after another
+    entries = getResolver().resolveAll(machines)
+    addresses = dict((machine, (entries[machine] or {}).get("ipv6" if useIpv6 else "ipv4")) for machine in machines)
+    return subnetDistance(addresses), "subnets of the machines"
@@ -0,0 +1,504 @@
+"""
+Submission of CopyCat training jobs without Nuke's UI.
+
+Builds the same job and plugin info as the submitter dialog from a Nuke script, the name of its
+CopyCat node and the training settings, and submits them over one web service connection, so
+pipeline tools and overnight batches can queue any number of training runs from plain Python:
+
+    python CopyCatSubmission.py /shows/abc/train.nk CopyCat1 --machines gpu01,gpu02 --sync-interval 4
+    python CopyCatSubmission.py --jobs overnight.json
+"""
+import os
+import re
+import sys
+import json
+import time
+import uuid
+import argparse
+import ipaddress
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+except ImportError:
+    pass
+
+from CopyCatDeadline import COPYCAT_GROUP, CallDeadlineCommand, connect_to_api, getFarmInfoCache, getGpusPerMachine, rankCopyCatMachines
+from CopyCatNetwork import getResolver, machineDistance, orderMachinesByTopology
+
+# Every setting of a training job, the keys are the job and plugin info keys they end up in
+DEFAULT_SETTINGS = {
+    "Name": "",
+    "Comment": "",
+    "Department": "",
+    "Pool": "copycat",
+    "SecondaryPool": "none",
+    "Group": COPYCAT_GROUP,
+    "Priority": 50,
+    "OutputDirectory": "",
+    "SceneFile": "",
+    "UseSceneStore": False,
+    "SceneStore": "",
+    "Version": "",
+    "CopyCatNode": "",
+    "MainMachine": "",
+    "MainMachineIP": "",
+    "UseIPv6": False,
+    "Port": 3000,
+    "NetworkInterface": "",
+    "TrainingSlaves": [],
+    "RankOrder": "list",
+    "TopologyFile": "",
+    "RanksPerWorker": 1,
+    "Elastic": False,
+    "MinWorldSize": 0, # 0 is half the world size
+    "RendezvousDirectory": "",
+    "SyncInterval": 1,
+    "AutoSyncInterval": False,
+    "ProbeDirectory": "",
+    "UseGpu": True,
+    "UseSpecificGpu": False,
+    "GpuOverride": 0,
+    "CacheDatasets": False,
+    "ForceFreshStart": False,
+    "BatchMode": False,
+    "Whitelist": "",
+    "JobDependencies": "",
+} # type: Dict[str, Any]
+
+# Jobs sent to the web service at once, each over its own pooled connection
+SUBMIT_WORKERS = 4
+_submitExecutor = None
+
+_NUKE_VERSION = re.compile(r"^version (\d+)\.(\d+)")
+
+def getMachineList(machines):
+    # type: (Union[str, List[str]]) -> List[str]
+    if isinstance(machines, str):
+        machines = machines.split(",")
+    return [str(machine).strip() for machine in machines if str(machine).strip() != ""]
+
+def buildJobInfo(settings):
+    # type: (Dict[str, Any]) -> Dict[str, Any]
+    # One task per rank, every worker runs its ranks as concurrent tasks
+    machines = getMachineList(settings["TrainingSlaves"])
+    ranksPerWorker = int(settings.get("RanksPerWorker", 1))
+    jobInfo = {
+        "Plugin": "CopyCat",
+        "Name": settings["Name"],
+        "Comment": settings["Comment"],
+        "Department": settings["Department"],
+        "Pool": settings["Pool"],
+        "SecondaryPool": settings["SecondaryPool"],
+        "Group": settings["Group"],
+        "Frames": f"1-{len(machines) * ranksPerWorker}",
+        "ConcurrentTasks": ranksPerWorker,
+        "OutputDirectory": settings["OutputDirectory"],
+        "Priority": int(settings["Priority"]),
+    } # type: Dict[str, Any]
+    for key in ("Whitelist", "JobDependencies"):
+        if settings.get(key):
+            jobInfo[key] = settings[key]
+    return jobInfo
+
+def buildPluginInfo(settings):
+    # type: (Dict[str, Any]) -> Dict[str, Any]
+    machines = getMachineList(settings["TrainingSlaves"])
+    pluginInfo = {
+        "BatchMode": bool(settings.get("BatchMode", False)),
+        "BatchModeIsMovie": False,
+        "ContinueOnError": False,
+        "EnforceRenderOrder": False,
+        "UseGpu": bool(settings["UseGpu"]),
+        "UseSpecificGpu": bool(settings["UseSpecificGpu"]),
+        "GpuOverride": int(settings["GpuOverride"]) if settings["UseSpecificGpu"] else 0,
+        "SceneFile": settings["SceneFile"],
+        "Version": settings["Version"],
+        "MainMachine": settings["MainMachine"],
+        "Port": int(settings["Port"]),
+        "TrainingSlaves": ",".join(machines),
+        "RanksPerWorker": int(settings.get("RanksPerWorker", 1)),
+        "WorldSize": len(machines) * int(settings.get("RanksPerWorker", 1)),
+        "CopyCatNode": settings["CopyCatNode"],
+        "SyncInterval": int(settings["SyncInterval"]),
+        "AutoSyncInterval": bool(settings["AutoSyncInterval"]),
+        "UseIPv6": bool(settings["UseIPv6"]),
+        "MainMachineIP": settings["MainMachineIP"],
+        "CacheDatasets": bool(settings["CacheDatasets"]),
+        "ForceFreshStart": bool(settings.get("ForceFreshStart", False)),
+    } # type: Dict[str, Any]
+    if settings["ProbeDirectory"]:
+        pluginInfo["ProbeDirectory"] = settings["ProbeDirectory"]
+    if settings.get("NetworkInterface"):
+        pluginInfo["NetworkInterface"] = settings["NetworkInterface"]
+    if settings.get("Elastic"):
+        pluginInfo["Elastic"] = True
+        pluginInfo["MinWorldSize"] = int(settings.get("MinWorldSize", 0)) or max(1, len(machines) * int(settings.get("RanksPerWorker", 1)) // 2)
+        # Every job needs its own directory, or ranks of different jobs would join the same world
+        pluginInfo["RendezvousDirectory"] = settings.get("RendezvousDirectory") or os.path.join(settings["OutputDirectory"], "copycat_rendezvous", time.strftime("%Y%m%d_%H%M%S") + "_" + uuid.uuid4().hex[:8])
+    return pluginInfo
+
+def rankGpus(settings, localRank):
+    # type: (Dict[str, Any], int) -> List[str]
+    """GPUs of a rank as far as the job decides them, empty leaves it to the Worker's GPU affinity."""
+    if not settings["UseGpu"]:
+        return []
+    if int(settings.get("RanksPerWorker", 1)) > 1:
+        return [str(localRank)]
+    if settings["UseSpecificGpu"]:
+        return [str(settings["GpuOverride"])]
+    return []
+
+def buildRankManifest(settings):
+    # type: (Dict[str, Any]) -> Optional[Dict[str, Any]]
+    """Every rank of the job with its machine, GPUs and interface. None for elastic jobs, their ranks are handed out when they start."""
+    if settings.get("Elastic"):
+        return None
+    CopyCatManifest = importPluginModule("CopyCatManifest")
+    return CopyCatManifest.buildManifest(getMachineList(settings["TrainingSlaves"]), settings["MainMachineIP"], int(settings["Port"]), int(settings.get("RanksPerWorker", 1)),
+                                         lambda machine, localRank: rankGpus(settings, localRank), settings.get("NetworkInterface", ""))
+
+def writeRankManifest(settings, pluginInfo):
+    # type: (Dict[str, Any], Dict[str, Any]) -> Optional[str]
+    """Writes the rank manifest next to the job's output and names it in the plugin info, returns its path to send as auxiliary file.
+
+    Raises ValueError when the ranks don't add up (the same machine twice, two ranks on one GPU...).
+    """
+    manifest = buildRankManifest(settings)
+    if manifest is None:
+        return None
+    CopyCatManifest = importPluginModule("CopyCatManifest")
+    problems = CopyCatManifest.validateManifest(manifest)
+    if problems:
+        raise ValueError("The ranks of the job don't add up: " + "; ".join(problems))
+    path = os.path.join(settings["OutputDirectory"], "copycat_manifests", time.strftime("%Y%m%d_%H%M%S") + "_" + uuid.uuid4().hex[:8] + ".json")
+    CopyCatManifest.writeManifest(manifest, path)
+    # Deadline copies auxiliary files to the job's data directory, the plugin finds it there by name
+    pluginInfo["RankManifest"] = os.path.basename(path)
+    return path
+
+def storeScene(settings, pluginInfo):
+    # type: (Dict[str, Any], Dict[str, Any]) -> bool
+    """Puts the scene in the scene store and points the plugin info at the stored copy.
+
+    Returns False when the job has to send the scene itself as auxiliary file: the store is turned off
+    or can't be written.
+    """
+    if not settings.get("UseSceneStore", False):
+        return False
+    CopyCatCache = importPluginModule("CopyCatCache")
+    store = CopyCatCache.SceneStore(settings.get("SceneStore") or os.environ.get("COPYCAT_SCENE_STORE") or os.path.join(settings["OutputDirectory"], "copycat_scenes"))
+    try:
+        storedScene, digest = store.addScene(settings["SceneFile"])
+    except (IOError, OSError) as e:
+        print(f"The scene could not be put in the scene store, sending it with the job: {e}")
+        return False
+    pluginInfo["SceneFile"] = storedScene
+    # The plugin checks the stored copy wasn't changed before training on it
+    pluginInfo["SceneHash"] = digest
+    return True
+
+def validateSettings(settings):
+    # type: (Dict[str, Any]) -> Optional[str]
+    """Returns what is wrong with the settings, None if they can be submitted."""
+    machines = getMachineList(settings["TrainingSlaves"])
+    if not settings["SceneFile"]:
+        return "No Nuke script provided"
+    if not settings["CopyCatNode"]:
+        return "No CopyCat node provided"
+    if not settings["Version"]:
+        return "No Nuke version provided"
+    if not settings["OutputDirectory"]:
+        return "No output directory in CopyCat node provided"
+    if not machines:
+        return "No machines for job"
+    if int(settings.get("RanksPerWorker", 1)) < 1:
+        return "Ranks per worker must be at least 1"
+    if settings.get("Elastic") and not 0 <= int(settings.get("MinWorldSize", 0)) <= len(machines) * int(settings.get("RanksPerWorker", 1)):
+        return "Min world size must be between 0 (the full world) and the world size"
+    if settings["MainMachine"].strip().lower() != machines[0].lower():
+        return "MainMachine must be the first machine in the list"
+    if not settings["MainMachineIP"]:
+        return "No main machine IP"
+    try:
+        address = ipaddress.ip_address(settings["MainMachineIP"])
+    except ValueError:
+        return f"{settings['MainMachineIP']} is not an IP address"
+    if settings["UseIPv6"] and not isinstance(address, ipaddress.IPv6Address):
+        return "Please provide main machine IPv6 address"
+    if not settings["UseIPv6"] and not isinstance(address, ipaddress.IPv4Address):
+        return "Please provide main machine IPv4 address"
+    return None
+
+def importPluginModule(name):
+    """The .nk reader and training estimates ship with the plugin, they are loaded from the repository when they are not on the path."""
+    if name not in sys.modules:
+        try:
+            __import__(name)
+        except ImportError:
+            if os.environ.get("DEADLINE_REPOSITORY"):
+                pluginDirectory = os.path.join(os.environ["DEADLINE_REPOSITORY"], "custom", "plugins", "CopyCat")
+            else:
+                pluginDirectory = CallDeadlineCommand(["-GetRepositoryPath", "custom/plugins/CopyCat"]).strip()
+            if pluginDirectory not in sys.path:
+                sys.path.append(pluginDirectory)
+            __import__(name)
+    return sys.modules[name]
+
+def readCopyCatNode(sceneFile, nodeName):
+    # type: (str, str) -> Dict[str, str]
+    """Knob values of the CopyCat node, raises ValueError if the script has no such CopyCat node."""
+    CopyCatScene = importPluginModule("CopyCatScene")
+    node = CopyCatScene.findNode(CopyCatScene.readScriptLines(sceneFile), nodeName)
+    if node is None:
+        raise ValueError(f"{sceneFile} has no node named {nodeName}")
+    if node.Class != "CopyCat":
+        raise ValueError(f"{nodeName} in {sceneFile} is a {node.Class} node, not CopyCat")
+    return dict((name, node.knob(name)) for name in node.Knobs)
+
+def detectNukeVersion(sceneFile):
+    # type: (str) -> str
+    """Major.minor version from the script's header, empty if the header has none."""
+    with open(sceneFile, "r", encoding="utf-8", errors="replace") as f:
+        for index, line in enumerate(f):
+            match = _NUKE_VERSION.match(line)
+            if match:
+                return f"{match.group(1)}.{match.group(2)}"
+            if index > 20:
+                break
+    return ""
+
+def prepareSettings(sceneFile, nodeName, **overrides):
+    # type: (str, str, Any) -> Dict[str, Any]
+    """Fills in what the dialog would: job name, output directory, Nuke version, machines and main machine IP.
+
+    Any setting passed in overrides wins over the detected value.
+    """
+    unknown = set(overrides) - set(DEFAULT_SETTINGS)
+    if unknown:
+        raise ValueError("Unknown CopyCat settings: " + ", ".join(sorted(unknown)))
+
+    settings = dict(DEFAULT_SETTINGS)
+    settings.update(overrides)
+    settings["SceneFile"] = os.path.abspath(sceneFile)
+    settings["CopyCatNode"] = nodeName
+    knobs = readCopyCatNode(settings["SceneFile"], nodeName)
+
+    if not settings["Name"]:
+        settings["Name"] = os.path.basename(sceneFile)
+    if not settings["OutputDirectory"]:
+        settings["OutputDirectory"] = knobs.get("dataDirectory", "")
+    if not settings["Version"]:
+        settings["Version"] = detectNukeVersion(settings["SceneFile"])
+
+    machines = getMachineList(settings["TrainingSlaves"])
+    farmInfo = None
+    if not machines:
+        farmInfo = getFarmInfoCache().get()
+        machines, dropped = rankCopyCatMachines(farmInfo, settings["Group"])
+        for machine in sorted(dropped):
+            print(f"CopyCat machine {machine} is left out: {dropped[machine]}")
+    if int(settings["RanksPerWorker"]) == 0:
+        # One rank per GPU, as many as the machine with the fewest GPUs has
+        settings["RanksPerWorker"] = getGpusPerMachine(farmInfo or getFarmInfoCache().get(), machines) or 1
+    if settings["RankOrder"] == "topology" and len(machines) > 2:
+        distance, source = machineDistance(machines, settings["ProbeDirectory"], settings["TopologyFile"], settings["UseIPv6"])
+        machines = orderMachinesByTopology(machines, distance, settings["MainMachine"] or None)
+        print(f"Ranks ordered by the {source}: {','.join(machines)}")
+    if not settings["MainMachine"] and machines:
+        settings["MainMachine"] = machines[0]
+    # The main machine has to be rank 0
+    mainMachine = settings["MainMachine"].strip().lower()
+    machines = [machine for machine in machines if machine.lower() == mainMachine] + [machine for machine in machines if machine.lower() != mainMachine]
+    settings["TrainingSlaves"] = machines
+
+    if not settings["MainMachineIP"] and settings["MainMachine"]:
+        entry = getResolver().resolve(settings["MainMachine"])
+        if entry:
+            settings["MainMachineIP"] = (entry["ipv6"] if settings["UseIPv6"] else entry["ipv4"]) or ""
+    return settings
+
+def submitJob(jobInfo, pluginInfo, auxFiles, connection=None):
+    # type: (Dict, Dict, Union[str, List[str]], Any) -> str
+    """Submits over the web service and returns the job ID, raises WebServiceError when it can't be reached."""
+    if connection is None:
+        connection = connect_to_api()
+    job = connection.Jobs.SubmitJob(jobInfo, pluginInfo, auxFiles)
+    # The API returns the error message instead of the job when the submission fails
+    if not isinstance(job, dict):
+        raise RuntimeError(f"Deadline refused the job: {job}")
+    return job["_id"]
+
+def _getSubmitExecutor():
+    global _submitExecutor
+    if _submitExecutor is None:
+        _submitExecutor = ThreadPoolExecutor(max_workers=SUBMIT_WORKERS, thread_name_prefix="CopyCatSubmit")
+    return _submitExecutor
+
+def runAsync(function, callback=None):
+    # type: (Callable[[], Any], Optional[Callable[[Any, Optional[str]], None]]) -> Any
+    """Runs function() on the submit threads and returns the future, callback(result, error) is called from that thread."""
+    def report(result, error):
+        if callback:
+            try:
+                callback(result, error)
+            except Exception:
+                print(traceback.format_exc())
+
+    def run():
+        try:
+            result = function()
+        except Exception as e:
+            report(None, str(e))
+            raise
+        report(result, None)
+        return result
+    return _getSubmitExecutor().submit(run)
+
+def submitJobAsync(jobInfo, pluginInfo, auxFiles, callback=None, connection=None):
+    # type: (Dict, Dict, Union[str, List[str]], Optional[Callable[[Optional[str], Optional[str]], None]], Any) -> Any
+    """Submits on a background thread and returns the future, callback(job ID, error) is called from that thread."""
+    return runAsync(lambda: submitJob(jobInfo, pluginInfo, auxFiles, connection), callback)
+
+class CopyCatSubmitter(object):
+    """Submits any number of CopyCat jobs through one web service connection."""
+
+    def __init__(self, connection=None):
+        self._connection = connection
+
+    def connection(self):
+        if self._connection is None:
+            self._connection = connect_to_api()
+        return self._connection
+
+    def submit(self, settings):
+        # type: (Dict[str, Any]) -> str
+        error = validateSettings(settings)
+        if error:
+            raise ValueError(f"{settings['Name'] or settings['SceneFile']}: {error}")
+        pluginInfo = buildPluginInfo(settings)
+        auxFiles = [] if storeScene(settings, pluginInfo) else [settings["SceneFile"]]
+        manifest = writeRankManifest(settings, pluginInfo)
+        if manifest:
+            auxFiles.append(manifest)
+        return submitJob(buildJobInfo(settings), pluginInfo, auxFiles, self.connection())
+
+    def _submitReported(self, settings):
+        try:
+            return settings, self.submit(settings), None
+        except Exception as e:
+            print(traceback.format_exc())
+            return settings, None, str(e)
+
+    def submitAsync(self, settings, callback=None):
+        # type: (Dict[str, Any], Optional[Callable[[Dict[str, Any], Optional[str], Optional[str]], None]]) -> Any
+        """Submits on a background thread and returns the future, callback(settings, job ID, error) is called from that thread."""
+        def run():
+            result = self._submitReported(settings)
+            if callback:
+                try:
+                    callback(*result)
+                except Exception:
+                    print(traceback.format_exc())
+            return result
+        return _getSubmitExecutor().submit(run)
+
+    def submitMany(self, settingsList):
+        # type: (List[Dict[str, Any]]) -> List[Tuple[Dict[str, Any], Optional[str], Optional[str]]]
+        """Submits every job even if some fail, returns (settings, job ID, error) for each of them in order.
+
+        Up to SUBMIT_WORKERS jobs are sent at once over the pooled connections.
+        """
+        return [future.result() for future in [self.submitAsync(settings) for settings in settingsList]]
+
+def submitCopyCat(sceneFile, nodeName, **settings):
+    # type: (str, str, Any) -> str
+    """Submits a single training job, returns its job ID."""
+    return CopyCatSubmitter().submit(prepareSettings(sceneFile, nodeName, **settings))
+
+def parseArguments(argv=None):
+    parser = argparse.ArgumentParser(description="Submit CopyCat training jobs to Deadline without opening Nuke.")
+    parser.add_argument("scene", nargs="?", help="Nuke script to train")
+    parser.add_argument("node", nargs="?", help="name of the CopyCat node")
+    parser.add_argument("--jobs", help="JSON file with a list of jobs, each with SceneFile, CopyCatNode and any other setting")
+    parser.add_argument("--name", dest="Name")
+    parser.add_argument("--comment", dest="Comment")
+    parser.add_argument("--department", dest="Department")
+    parser.add_argument("--pool", dest="Pool")
+    parser.add_argument("--secondary-pool", dest="SecondaryPool")
+    parser.add_argument("--group", dest="Group")
+    parser.add_argument("--priority", dest="Priority", type=int)
+    parser.add_argument("--output", dest="OutputDirectory", help="defaults to the node's dataDirectory")
+    parser.add_argument("--use-scene-store", dest="UseSceneStore", action="store_true", default=None, help="train on a copy of the scene stored by its content instead of sending it with every job")
+    parser.add_argument("--scene-store", dest="SceneStore", help="shared folder for --use-scene-store, defaults to COPYCAT_SCENE_STORE or copycat_scenes in the output directory")
+    parser.add_argument("--nuke-version", dest="Version", help="major.minor, defaults to the script's version")
+    parser.add_argument("--machines", dest="TrainingSlaves", help="comma separated, defaults to the available machines of the group")
+    parser.add_argument("--main-machine", dest="MainMachine", help="defaults to the first machine")
+    parser.add_argument("--main-ip", dest="MainMachineIP", help="defaults to the resolved address of the main machine")
+    parser.add_argument("--ipv6", dest="UseIPv6", action="store_true", default=None)
+    parser.add_argument("--port", dest="Port", type=int)
+    parser.add_argument("--interface", dest="NetworkInterface", help="interface name, address or subnet the ranks train on, defaults to the fastest one reaching the main machine")
+    parser.add_argument("--rank-order", dest="RankOrder", choices=("list", "topology"), help="topology keeps machines that are close together on neighbouring ranks")
+    parser.add_argument("--topology-file", dest="TopologyFile", help="JSON mapping machines to their switch/rack, for --rank-order topology")
+    parser.add_argument("--ranks-per-worker", dest="RanksPerWorker", type=int, help="CopyCat ranks per machine, one per GPU, 0 uses every GPU of the machines")
+    parser.add_argument("--sync-interval", dest="SyncInterval", type=int)
+    parser.add_argument("--auto-sync-interval", dest="AutoSyncInterval", action="store_true", default=None)
+    parser.add_argument("--probe-directory", dest="ProbeDirectory")
+    parser.add_argument("--no-gpu", dest="UseGpu", action="store_false", default=None)
+    parser.add_argument("--gpu", dest="GpuOverride", type=int, help="GPU to use on every worker")
+    parser.add_argument("--elastic", dest="Elastic", action="store_true", default=None, help="re-form the world with the ranks that are left when a worker drops out")
+    parser.add_argument("--min-world-size", dest="MinWorldSize", type=int, help="fewest ranks an elastic job trains with, defaults to half the world size")
+    parser.add_argument("--fresh-start", dest="ForceFreshStart", action="store_true", default=None, help="never resume from a checkpoint of the job")
+    parser.add_argument("--cache-datasets", dest="CacheDatasets", action="store_true", default=None)
+    parser.add_argument("--batch-mode", dest="BatchMode", action="store_true", default=None, help="keep a warm Nuke per worker thread for all tasks of the job")
+    parser.add_argument("--dry-run", action="store_true", help="print the job and plugin info instead of submitting")
+    args = parser.parse_args(argv)
+    if not args.jobs and not (args.scene and args.node):
+        parser.error("either a scene and a node or --jobs is required")
+    return args
+
+def main(argv=None):
+    args = parseArguments(argv)
+    # Settings given on the command line apply to every job
+    common = dict((key, value) for key, value in vars(args).items() if key in DEFAULT_SETTINGS and value is not None)
+    if "GpuOverride" in common:
+        common["UseSpecificGpu"] = True
+    if "SceneStore" in common:
+        common["UseSceneStore"] = True
+
+    jobs = []
+    if args.jobs:
+        with open(args.jobs, "r") as f:
+            jobs = json.load(f)
+    if args.scene:
+        jobs.append({"SceneFile": args.scene, "CopyCatNode": args.node})
+
+    settingsList = []
+    for job in jobs:
+        overrides = dict(common)
+        overrides.update(job)
+        sceneFile = overrides.pop("SceneFile")
+        nodeName = overrides.pop("CopyCatNode")
+        try:
+            settingsList.append(prepareSettings(sceneFile, nodeName, **overrides))
+        except Exception as e:
+            print(f"Skipping {nodeName} in {sceneFile}: {e}")
+
+    failed = len(jobs) - len(settingsList)
+    if args.dry_run:
+        for settings in settingsList:
+            error = validateSettings(settings)
+            print(json.dumps({"JobInfo": buildJobInfo(settings), "PluginInfo": buildPluginInfo(settings), "RankManifest": None if error else buildRankManifest(settings), "Error": error}, indent=2))
+        return 1 if failed else 0
+
+    for settings, jobId, error in CopyCatSubmitter().submitMany(settingsList):
+        if error:
+            failed += 1
+            print(f"FAILED {settings['Name']}: {error}")
+        else:
+            print(f"Submitted {settings['Name']} as {jobId}")
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,250 @@
+"""
+Hyperparameter sweeps of a CopyCat node.
+
+Every combination of a parameter grid gets its own copy of the Nuke script with the CopyCat knobs
+set and its own dataDirectory. The machines of the CopyCat group are split into slots that train
+variants at the same time, each slot trains its variants one after another (the next job depends
+on the previous one), and variants are packed so the slots finish at about the same time:
+
+    python CopyCatSweep.py /shows/abc/train.nk CopyCat1 --param modelSize=Small,Large --param epochs=5000,10000
+"""
+import os
+import re
+import sys
+import json
+import time
+import argparse
+import itertools
+import traceback
+
+try:
+    from typing import Any, Dict, List, Optional, Tuple
+except ImportError:
+    pass
+
+from CopyCatSubmission import DEFAULT_SETTINGS, CopyCatSubmitter, buildJobInfo, buildPluginInfo, getMachineList, importPluginModule, prepareSettings, readCopyCatNode
+from CopyCatDeadline import getFarmInfoCache, rankCopyCatMachines
+
+_UNSAFE_CHARACTERS = re.compile(r"[^\w.-]+")
+_PLAIN_KNOB_VALUE = re.compile(r"^[\w./:+-]+$")
+
+def expandGrid(grid):
+    # type: (Dict[str, List[Any]]) -> List[Dict[str, Any]]
+    """Every combination of the grid's values, in a stable order."""
+    names = sorted(grid)
+    return [dict(zip(names, values)) for values in itertools.product(*(grid[name] for name in names))]
+
+def variantName(params):
+    # type: (Dict[str, Any]) -> str
+    return "_".join(_UNSAFE_CHARACTERS.sub("-", f"{name}-{params[name]}") for name in sorted(params))
+
+def formatKnobValue(value):
+    # type: (Any) -> str
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    value = str(value)
+    return value if _PLAIN_KNOB_VALUE.match(value) else "{" + value + "}"
+
+def writeVariantScene(sceneFile, nodeName, knobValues, variantScene):
+    # type: (str, str, Dict[str, Any], str) -> None
+    """Copies the script with the given knobs of the CopyCat node replaced, or added when they are at their default."""
+    CopyCatScene = importPluginModule("CopyCatScene")
+    lines = CopyCatScene.readScriptLines(sceneFile)
+    node = CopyCatScene.findNode(lines, nodeName)
+    if node is None:
+        raise ValueError(f"{sceneFile} has no node named {nodeName}")
+
+    indent = lines[node.StartLine][:len(lines[node.StartLine]) - len(lines[node.StartLine].lstrip())] + " "
+    addedLines = []
+    for name in sorted(knobValues):
+        knobLine = f"{indent}{name} {formatKnobValue(knobValues[name])}"
+        if name in node.KnobLines:
+            lines[node.KnobLines[name]] = knobLine
+        else:
+            addedLines.append(knobLine)
+    # Knobs at their default value are not in the script, they go just before the node's closing brace
+    lines[node.EndLine:node.EndLine] = addedLines
+
+    os.makedirs(os.path.dirname(variantScene), exist_ok=True)
+    with open(variantScene + ".tmp", "w", encoding="utf-8", errors="surrogateescape") as f:
+        f.write("\n".join(lines) + "\n")
+    os.replace(variantScene + ".tmp", variantScene)
+
+def estimateVariantCost(knobs, params):
+    # type: (Dict[str, str], Dict[str, Any]) -> float
+    """Relative training time of a variant, from its epochs, model size and crop size."""
+    CopyCatTraining = importPluginModule("CopyCatTraining")
+    values = dict(knobs)
+    values.update(params)
+    try:
+        epochs = float(values.get("epochs", 1))
+        cropSize = float(values.get("cropSize", CopyCatTraining.REFERENCE_CROP_SIZE))
+    except ValueError:
+        epochs, cropSize = 1.0, CopyCatTraining.REFERENCE_CROP_SIZE
+    # Steps per epoch shrink as the batch grows, so the batch size cancels out
+    return epochs * CopyCatTraining.estimateStepSeconds(str(values.get("modelSize", "Medium")), 1, cropSize)
+
+def splitMachines(machines, variantCount, machinesPerVariant=1):
+    # type: (List[str], int, int) -> List[List[str]]
+    """Splits the machines, best first, into one slot per concurrent variant.
+
+    Machines are dealt out in turn so every slot gets one of the best machines as its main machine.
+    """
+    slotCount = max(1, min(variantCount, len(machines) // max(1, machinesPerVariant)))
+    return [slot for slot in (machines[index::slotCount] for index in range(slotCount)) if slot]
+
+def packVariants(variants, costs, slots):
+    # type: (List[Dict[str, Any]], List[float], List[List[str]]) -> List[List[int]]
+    """Longest variants first, each to the slot that would finish it earliest. Returns the variant indices per slot."""
+    loads = [0.0] * len(slots)
+    order = [[] for _ in slots] # type: List[List[int]]
+    for index in sorted(range(len(variants)), key=lambda index: -costs[index]):
+        # Data parallel training is close to linear for the few machines of a slot
+        slot = min(range(len(slots)), key=lambda slot: (loads[slot] + costs[index]) / len(slots[slot]))
+        loads[slot] += costs[index]
+        order[slot].append(index)
+    return order
+
+def planSweep(sceneFile, nodeName, grid, machines=None, machinesPerVariant=1, sweepDirectory=None, **overrides):
+    # type: (str, str, Dict[str, List[Any]], Optional[List[str]], int, Optional[str], Any) -> List[List[Dict[str, Any]]]
+    """Writes the variant scripts and returns the settings of their jobs per slot, in the order each slot trains them."""
+    sceneFile = os.path.abspath(sceneFile)
+    knobs = readCopyCatNode(sceneFile, nodeName)
+    variants = expandGrid(grid)
+    if not variants:
+        raise ValueError("The parameter grid is empty")
+
+    machines = getMachineList(machines or [])
+    if not machines:
+        machines, dropped = rankCopyCatMachines(getFarmInfoCache().get(), overrides.get("Group", DEFAULT_SETTINGS["Group"]))
+        for machine in sorted(dropped):
+            print(f"CopyCat machine {machine} is left out: {dropped[machine]}")
+    if not machines:
+        raise ValueError("No machines available for the sweep")
+
+    sceneName = os.path.splitext(os.path.basename(sceneFile))[0]
+    sweepName = f"{sceneName}_sweep_{time.strftime('%Y%m%d_%H%M%S')}"
+    if sweepDirectory is None:
+        sweepDirectory = os.path.join(os.path.dirname(sceneFile), sweepName)
+    outputDirectory = overrides.pop("OutputDirectory", "") or knobs.get("dataDirectory", "")
+    if not outputDirectory:
+        raise ValueError(f"No output directory in CopyCat node {nodeName} provided")
+
+    slots = splitMachines(machines, len(variants), machinesPerVariant)
+    costs = [estimateVariantCost(knobs, params) for params in variants]
+    plan = []
+    for slotMachines, indices in zip(slots, packVariants(variants, costs, slots)):
+        slotJobs = []
+        for index in indices:
+            params = variants[index]
+            name = variantName(params)
+            knobValues = dict(params)
+            # Each variant writes its checkpoints and previews to its own directory
+            knobValues.setdefault("dataDirectory", os.path.join(outputDirectory, sweepName, name).replace("\\", "/"))
+            variantScene = os.path.join(sweepDirectory, f"{sceneName}_{name}.nk")
+            writeVariantScene(sceneFile, nodeName, knobValues, variantScene)
+
+            jobOverrides = dict(overrides)
+            jobOverrides.update({
+                "Name": f"{overrides.get('Name') or sceneName} [{name}]",
+                "OutputDirectory": knobValues["dataDirectory"],
+                "TrainingSlaves": slotMachines,
+                "MainMachine": slotMachines[0],
+                # Only the slot's machines may pick up its tasks, ranks are taken from their position in the list
+                "Whitelist": ",".join(slotMachines),
+            })
+            settings = prepareSettings(variantScene, nodeName, **jobOverrides)
+            settings["SweepCost"] = costs[index]
+            slotJobs.append(settings)
+        plan.append(slotJobs)
+    return plan
+
+def submitSweep(plan, submitter=None):
+    # type: (List[List[Dict[str, Any]]], Optional[CopyCatSubmitter]) -> List[Tuple[Dict[str, Any], Optional[str], Optional[str]]]
+    """Submits every variant, each depending on the previous variant of its slot. Returns (settings, job ID, error) per variant."""
+    submitter = submitter or CopyCatSubmitter()
+    results = []
+    for slotJobs in plan:
+        previousJobId = None
+        for settings in slotJobs:
+            if previousJobId:
+                settings["JobDependencies"] = previousJobId
+            try:
+                previousJobId = submitter.submit(settings)
+                results.append((settings, previousJobId, None))
+            except Exception as e:
+                print(traceback.format_exc())
+                results.append((settings, None, str(e)))
+    return results
+
+def formatPlan(plan):
+    # type: (List[List[Dict[str, Any]]]) -> str
+    lines = []
+    for index, slotJobs in enumerate(plan):
+        machines = getMachineList(slotJobs[0]["TrainingSlaves"])
+        load = sum(settings["SweepCost"] for settings in slotJobs) / len(machines)
+        lines.append(f"Slot {index + 1}: {','.join(machines)} (relative time {load:.1f})")
+        lines.extend(f"    {settings['Name']}" for settings in slotJobs)
+    return "\n".join(lines)
+
+def parseParam(value):
+    # type: (str) -> Tuple[str, List[Any]]
+    """knob=value1,value2 with numbers converted, so both 5000 and Large can be given."""
+    name, _, values = value.partition("=")
+    if not name or not values:
+        raise argparse.ArgumentTypeError(f"expected knob=value1,value2 and got {value}")
+    parsed = []
+    for item in values.split(","):
+        try:
+            parsed.append(json.loads(item))
+        except ValueError:
+            parsed.append(item.strip())
+    return name.strip(), parsed
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Submit a hyperparameter sweep of a CopyCat node to Deadline.")
+    parser.add_argument("scene", help="Nuke script to train")
+    parser.add_argument("node", help="name of the CopyCat node")
+    parser.add_argument("--param", action="append", type=parseParam, default=[], help="knob=value1,value2, can be repeated")
+    parser.add_argument("--grid", help="JSON file mapping knob names to lists of values")
+    parser.add_argument("--machines", help="comma separated, defaults to the available machines of the group")
+    parser.add_argument("--machines-per-variant", type=int, default=1, help="fewest machines a variant trains on")
+    parser.add_argument("--sweep-directory", help="where the variant scripts are written, defaults to next to the script")
+    parser.add_argument("--group")
+    parser.add_argument("--pool")
+    parser.add_argument("--priority", type=int)
+    parser.add_argument("--ranks-per-worker", type=int, help="CopyCat ranks per machine, one per GPU, 0 uses every GPU of the machines")
+    parser.add_argument("--dry-run", action="store_true", help="write the variant scripts and print the plan without submitting")
+    args = parser.parse_args(argv)
+
+    grid = {}
+    if args.grid:
+        with open(args.grid, "r") as f:
+            grid.update(json.load(f))
+    grid.update(dict(args.param))
+    if not grid:
+        parser.error("no parameters to sweep, use --param or --grid")
+
+    overrides = {}
+    for key, value in (("Group", args.group), ("Pool", args.pool), ("Priority", args.priority), ("RanksPerWorker", args.ranks_per_worker)):
+        if value is not None:
+            overrides[key] = value
+
+    plan = planSweep(args.scene, args.node, grid, args.machines, args.machines_per_variant, args.sweep_directory, **overrides)
+    print(formatPlan(plan))
+    if args.dry_run:
+        for settings in (settings for slotJobs in plan for settings in slotJobs):
+            print(json.dumps({"JobInfo": buildJobInfo(settings), "PluginInfo": buildPluginInfo(settings)}, indent=2))
+        return 0
+
+    failed = 0
+    for settings, jobId, error in submitSweep(plan):
+        if error:
+            failed += 1
+            print(f"FAILED {settings['Name']}: {error}")
+        else:
+            print(f"Submitted {settings['Name']} as {jobId}")
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
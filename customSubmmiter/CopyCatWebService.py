@@ -0,0 +1,190 @@
+import json
+import time
+import socket
+import threading
+import http.client
+from queue import LifoQueue, Empty
+from urllib.parse import urlencode, urlsplit
+
+try:
+    from typing import Any, Dict, List, Optional, Union
+except ImportError:
+    pass
+
+WEBSERVICE_TIMEOUT = 30.0 # seconds per request, submissions with large auxiliary files take longer
+WEBSERVICE_SUBMIT_TIMEOUT = 300.0
+WEBSERVICE_RETRIES = 3
+WEBSERVICE_BACKOFF = 0.5 # seconds before the first retry, doubled for every next one
+WEBSERVICE_POOL_SIZE = 4 # idle keep-alive connections kept per client
+
+# Answers worth another try, the web service or a proxy in front of it is busy or restarting
+RETRY_STATUSES = (502, 503, 504)
+
+class WebServiceError(Exception):
+    """The web service could not be reached or refused the request."""
+
+    def __init__(self, message, status=None):
+        super(WebServiceError, self).__init__(message)
+        self.status = status
+
+class WebServiceClient(object):
+    """Talks to the Deadline web service over a small pool of keep-alive connections.
+
+    Safe to share between threads, every request borrows a connection and puts it back when the
+    answer has been read. Requests that fail on the way are retried with backoff; a request that
+    was sent and may have been acted on (a job submission) is only retried when the server closed
+    an idle connection before reading it.
+    """
+
+    def __init__(self, host, port=None, timeout=WEBSERVICE_TIMEOUT, retries=WEBSERVICE_RETRIES, backoff=WEBSERVICE_BACKOFF, poolSize=WEBSERVICE_POOL_SIZE):
+        # DeadlineCon takes a bare host name, a full URL works too
+        url = urlsplit(host if "://" in host else "http://" + host)
+        self.https = url.scheme == "https"
+        self.host = url.hostname or ""
+        self.port = int(port or url.port or (443 if self.https else 8081))
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self._idle = LifoQueue(maxsize=poolSize)
+        self.Jobs = _Jobs(self)
+        self.Pools = _Pools(self)
+        self.Groups = _Groups(self)
+        self.Slaves = _Slaves(self)
+        self.Misc = _Misc(self)
+
+    def __repr__(self):
+        return f"WebServiceClient({'https' if self.https else 'http'}://{self.host}:{self.port})"
+
+    def _connect(self, timeout):
+        if self.https:
+            return http.client.HTTPSConnection(self.host, self.port, timeout=timeout)
+        return http.client.HTTPConnection(self.host, self.port, timeout=timeout)
+
+    def _borrow(self, timeout):
+        try:
+            connection = self._idle.get_nowait()
+            connection.timeout = timeout
+            if connection.sock is not None:
+                connection.sock.settimeout(timeout)
+            return connection, True
+        except Empty:
+            return self._connect(timeout), False
+
+    def _giveBack(self, connection):
+        try:
+            self._idle.put_nowait(connection)
+        except Exception:
+            connection.close()
+
+    def close(self):
+        """Closes the idle connections, the client opens new ones when it is used again."""
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except Empty:
+                return
+
+    def request(self, method, path, body=None, query=None, timeout=None, idempotent=None):
+        # type: (str, str, Any, Optional[Dict], Optional[float], Optional[bool]) -> Any
+        """Sends the request and returns the decoded JSON answer, raises WebServiceError when it fails."""
+        if query:
+            path += "?" + urlencode(query)
+        if idempotent is None:
+            idempotent = method in ("GET", "PUT", "DELETE")
+        data = json.dumps(body).encode("utf-8") if body is not None else None
+        headers = {"Content-Type": "application/json; charset=utf-8", "Connection": "keep-alive"}
+        timeout = self.timeout if timeout is None else timeout
+
+        attempt = 0
+        while True:
+            connection, reused = self._borrow(timeout)
+            sent = False
+            try:
+                connection.request(method, path, body=data, headers=headers)
+                sent = True
+                response = connection.getresponse()
+                payload = response.read()
+            except (OSError, http.client.HTTPException) as e:
+                connection.close()
+                # A closed keep-alive connection fails before the server read the request
+                stale = reused and isinstance(e, (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError))
+                if attempt < self.retries and (idempotent or not sent or stale):
+                    attempt += 1
+                    if not stale:
+                        time.sleep(self.backoff * 2 ** (attempt - 1))
+                    continue
+                reason = "timed out" if isinstance(e, socket.timeout) else str(e) or type(e).__name__
+                raise WebServiceError(f"{method} {path} on {self} failed: {reason}")
+
+            if response.will_close:
+                connection.close()
+            else:
+                self._giveBack(connection)
+            text = payload.decode("utf-8", "replace")
+            if response.status in RETRY_STATUSES and idempotent and attempt < self.retries:
+                attempt += 1
+                time.sleep(self.backoff * 2 ** (attempt - 1))
+                continue
+            if response.status >= 400:
+                raise WebServiceError(f"{method} {path} on {self} returned {response.status}: {text.strip() or response.reason}", response.status)
+            try:
+                return json.loads(text) if text.strip() else None
+            except ValueError:
+                # Some endpoints answer with plain text
+                return text
+
+class _Jobs(object):
+    def __init__(self, client):
+        self.client = client
+
+    def SubmitJob(self, info, plugin, aux=None, idOnly=False):
+        # type: (Dict, Dict, Union[str, List[str], None], bool) -> Dict
+        if aux is None:
+            aux = []
+        elif not isinstance(aux, list):
+            aux = [aux]
+        return self.client.request("POST", "/api/jobs", {"JobInfo": info, "PluginInfo": plugin, "AuxFiles": aux, "IdOnly": idOnly}, timeout=WEBSERVICE_SUBMIT_TIMEOUT)
+
+class _Pools(object):
+    def __init__(self, client):
+        self.client = client
+
+    def GetPoolNames(self):
+        return self.client.request("GET", "/api/pools") or []
+
+class _Groups(object):
+    def __init__(self, client):
+        self.client = client
+
+    def GetGroupNames(self):
+        return self.client.request("GET", "/api/groups") or []
+
+class _Slaves(object):
+    def __init__(self, client):
+        self.client = client
+
+    def GetSlaveInfoSettings(self, names=None):
+        query = {"Data": "infosettings"}
+        if names:
+            query["Name"] = ",".join(names)
+        return self.client.request("GET", "/api/slaves", query=query) or []
+
+class _Misc(object):
+    def __init__(self, client):
+        self.client = client
+
+    def GetMaximumPriority(self):
+        return int(self.client.request("GET", "/api/maximumpriority"))
+
+_clients = {} # type: Dict[tuple, WebServiceClient]
+_clientsLock = threading.Lock()
+
+def getWebServiceClient(host, port=None):
+    # type: (str, Any) -> WebServiceClient
+    """One shared client per web service, so its connections are reused by every submission."""
+    key = (host, str(port or ""))
+    with _clientsLock:
+        client = _clients.get(key)
+        if client is None:
+            client = _clients[key] = WebServiceClient(host, port)
+        return client
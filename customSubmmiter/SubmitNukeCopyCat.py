@@ -1,11 +1,7 @@
 import os
-import sys
-import subprocess
+import time
 import nuke
 import nukescripts
-import json
-import traceback
-import socket
 import ipaddress
 
 try:
@@ -13,33 +9,27 @@ try:
 except ImportError:
     pass
 
-CUSTOM_DEADLINE_API_LOCATION = "" #path/to/your/api/python-folder -> custoom api folder
-DEADLINE_WEBSERVICE_URL = "" #URL for your web service -> https://docs.thinkboxsoftware.com/products/deadline/10.1/1_User%20Manual/manual/standalone-python.html
-DEADLINE_WEBSERVICE_PORT = "" #port
+from CopyCatDeadline import CallDeadlineCommand, getFarmInfoCache, rankCopyCatMachines
+from CopyCatNetwork import bestConnectedMachine, formatProbeMatrix, getResolver, machineDistance, orderMachinesByTopology, waitForProbeMatrix
+from CopyCatSubmission import buildJobInfo, buildPluginInfo, runAsync, storeScene, submitJob, writeRankManifest
 
 CopyCatDialog = None 
 machines = []
 
 def get_ip(hostname):
-    try:
-        ip_address = socket.gethostbyname(hostname)
-        return str(ip_address)
-    except Exception as e:
-        print(f"Error getting local IP address: {e}")
+    entry = getResolver().resolve(hostname)
+    if not entry or not entry["ipv4"]:
+        print(f"Error getting IP address of {hostname}")
         return None
+    return entry["ipv4"]
 
 #IPv6 is set here but for now plugin works on IPv4
 def get_ipv6(hostname):
-    try:      
-        ipv6 = socket.getaddrinfo(hostname, None, socket.AF_INET6)
-        
-        for entry in ipv6:
-            if entry[4][0] != "::1":  # Exclude loopback address (::1)
-                return str(entry[4][0])
-        return "::1"
-    except Exception as e:
-        print(f"Error getting local IPv6 address: {e}")
+    entry = getResolver().resolve(hostname)
+    if not entry or not entry["ipv6"]:
+        print(f"Error getting IPv6 address of {hostname}")
         return None
+    return entry["ipv6"]
 
 class CopyCatStandaloneDialog(nukescripts.PythonPanel):
 
@@ -60,6 +50,10 @@ class CopyCatStandaloneDialog(nukescripts.PythonPanel):
         self.maximumPriority = int(self.submissionInfo.get("MaxPriority", 100))        
         self.initUI()
 
+        # The dialog is built from the cached farm info, refresh it in the background if it's stale
+        if not self.farmInfoCache.isFresh(self.submissionInfo):
+            self.refreshFarmInfo()
+
     def initUI(self):
         global machines
         # Separator
@@ -118,17 +112,15 @@ class CopyCatStandaloneDialog(nukescripts.PythonPanel):
 
         ## CopyCat main machine ##
         machines = self.getCopyCatMachines() #type: list
-        self.mainMachine = nuke.Enumeration_Knob("Main_CopyCat_Machine", "Main Machine", machines)
+        self.mainMachine = nuke.Enumeration_Knob("Main_CopyCat_Machine", "Main Machine", machines + self.unusableMachines)
         self.addKnob(self.mainMachine)
-        self.mainMachine.setTooltip("Main CopyCat machine")
+        self.mainMachine.setTooltip("Main CopyCat machine. Available machines are listed first, best first, followed by machines that are offline, stalled or disabled.")
+        if machines:
+            self.mainMachine.setValue(machines[0])
 
         self.manMachineIp= nuke.String_Knob("Copy_Cat_mainMachine_ip", "IP")
         self.addKnob(self.manMachineIp)
-        ipv4 = get_ip(self.mainMachine.value())
-        if not ipv4:
-            print("Subbmiter did not get IP, please set it on your own.")
-            ipv4 = ""
-        self.manMachineIp.setValue(str(ipv4))
+        self.manMachineIp.setValue("")
         self.manMachineIp.setTooltip("IP of Main CopyCat machine")
 
         self.useIpV6 = nuke.Boolean_Knob("Use_IPv6", "Use IPv6")
@@ -136,18 +128,53 @@ class CopyCatStandaloneDialog(nukescripts.PythonPanel):
         self.addKnob(self.useIpV6)
         self.setTooltip("Use IPv6 instead IPv4")
 
+        # Resolve every CopyCat machine in the background, the IP knob is filled when the main machine answers
+        self.resolver = getResolver()
+        self.resolver.resolveAsync(machines)
+        self.updateMainMachineIp()
+
         self.port = nuke.Int_Knob("CopyCat port", "Port")        
         self.addKnob(self.port)
         self.port.setTooltip("CopyCat port for communication with main machine")
         self.port.setValue(3000) #default by Foundry
 
+        self.networkInterface = nuke.String_Knob("CopyCat_NetworkInterface", "Network interface")
+        self.networkInterface.clearFlag(nuke.STARTLINE)
+        self.addKnob(self.networkInterface)
+        self.networkInterface.setTooltip("Interface every rank trains on, by name (ens1f0), address or subnet (10.20.0.0/16), comma separated for several. Leave blank to use the fastest interface that reaches the main machine.")
+        self.networkInterface.setValue("")
+
         self.syncInterval = nuke.Int_Knob("CopyCat Sync interval", "SyncInterval")
         self.addKnob(self.syncInterval)
         self.syncInterval.setTooltip("Sync he interval at which gradients are shared between processes. By default, synchronization happens every 1 step. \
                                      You can increase this value for better network latency")
         self.syncInterval.setValue(1)
 
+        self.autoSyncInterval = nuke.Boolean_Knob("CopyCat_AutoSyncInterval", "Auto")
+        self.autoSyncInterval.clearFlag(nuke.STARTLINE)
+        self.addKnob(self.autoSyncInterval)
+        self.autoSyncInterval.setTooltip("Let the plugin derive the sync interval from the link speed between the machines (network probe results if you probed the network), the world size and the CopyCat node's model and batch settings.")
+        self.autoSyncInterval.setValue(False)
+        self.probeDirectory = ""
+
         ## machines for traning ##
+        self.ranksPerWorker = nuke.Int_Knob("CopyCat_RanksPerWorker", "Ranks per worker")
+        self.addKnob(self.ranksPerWorker)
+        self.ranksPerWorker.setTooltip("Number of CopyCat ranks every machine runs, one per GPU. Each rank is a concurrent task pinned to its own GPU. The machines' Concurrent Task Limit must allow it.")
+        self.ranksPerWorker.setValue(1)
+
+        self.elastic = nuke.Boolean_Knob("CopyCat_Elastic", "Elastic")
+        self.addKnob(self.elastic)
+        self.elastic.setTooltip("If a machine drops out, the ranks that are left train on with a smaller world instead of the job stalling, and other machines of the group can take over the failed tasks at the next restart.")
+        self.elastic.setValue(False)
+
+        self.minWorldSize = nuke.Int_Knob("CopyCat_MinWorldSize", "Min world size")
+        self.minWorldSize.clearFlag(nuke.STARTLINE)
+        self.addKnob(self.minWorldSize)
+        self.minWorldSize.setTooltip("The fewest ranks an elastic job trains with, 0 is half the world size.")
+        self.minWorldSize.setValue(0)
+        self.minWorldSize.setEnabled(False)
+
         self.worldsize = nuke.Int_Knob("CopyCat_world_size", "World size")        
         self.addKnob(self.worldsize)
         self.worldsize.setTooltip("Use the World Size to specify copyCat World Size environment variable")
@@ -161,9 +188,20 @@ class CopyCatStandaloneDialog(nukescripts.PythonPanel):
         self.port.clearFlag(nuke.STARTLINE)
         self.machineList.setTooltip("List of machines that will be used for job")
         self.machineList.setValue("")
-        self.getMachinesInOrder()
         self.machineListButton = nuke.PyScript_Knob("CopyCat_Machines_Browse", "Browse")
         self.addKnob(self.machineListButton)    
+        self.topologyOrder = nuke.Boolean_Knob("CopyCat_TopologyOrder", "Order by topology")
+        self.topologyOrder.clearFlag(nuke.STARTLINE)
+        self.addKnob(self.topologyOrder)
+        self.topologyOrder.setTooltip("Order the machines so neighbouring ranks are close together, from the network probe results, the topology map in COPYCAT_TOPOLOGY_FILE or the machines' subnets. Checking it also picks the best connected machine as main machine.")
+        self.topologyOrder.setValue(False)
+        self.getMachinesInOrder()
+        self.probeNetworkButton = nuke.PyScript_Knob("CopyCat_ProbeNetwork", "Probe Network")
+        self.addKnob(self.probeNetworkButton)
+        self.probeNetworkButton.setTooltip("Submit a short job that measures round trip time and throughput between the machines for job and show the results before the training job goes out.")
+        self.refreshFarmInfoButton = nuke.PyScript_Knob("Deadline_RefreshFarmInfo", "Refresh Farm Info")
+        self.addKnob(self.refreshFarmInfoButton)
+        self.refreshFarmInfoButton.setTooltip("Drop the cached pools, groups and CopyCat machines and grab them again from Deadline.")
 
         # Separator
         self.separator5 = nuke.Text_Knob("Deadline_Separator5", "")
@@ -198,12 +236,40 @@ class CopyCatStandaloneDialog(nukescripts.PythonPanel):
         self.useSpecificGpu.setValue(False)
         self.useSpecificGpu.setEnabled(True)   
 
+        # Dataset cache
+        self.cacheDatasets = nuke.Boolean_Knob("CopyCat_CacheDatasets", "Cache Training Data On Workers")
+        self.cacheDatasets.setFlag(nuke.STARTLINE)
+        self.addKnob(self.cacheDatasets)
+        self.cacheDatasets.setTooltip("If this option is enabled, the sequences feeding the CopyCat node are copied to a local cache on every Worker before training, instead of every rank reading them from network storage on every epoch.")
+        self.cacheDatasets.setValue(False)
+
+        # Resume
+        self.forceFreshStart = nuke.Boolean_Knob("CopyCat_ForceFreshStart", "Force Fresh Start")
+        self.forceFreshStart.setFlag(nuke.STARTLINE)
+        self.addKnob(self.forceFreshStart)
+        self.forceFreshStart.setTooltip("Requeued or failed tasks resume training from the latest checkpoint the job wrote to the data directory. If this option is enabled they always start from step 0.")
+        self.forceFreshStart.setValue(False)
+
+        # Warm Nuke
+        self.batchMode = nuke.Boolean_Knob("CopyCat_BatchMode", "Batch Mode (Warm Nuke)")
+        self.batchMode.setFlag(nuke.STARTLINE)
+        self.addKnob(self.batchMode)
+        self.batchMode.setTooltip("If this option is enabled, every Worker thread starts Nuke once for the job and trains all the tasks of the job it picks up in it. Every rank is one task and Nuke quits with the job, so this only skips Nuke's startup, plugin scanning and license checkout when a thread retries or picks up a requeued task.")
+        self.batchMode.setValue(False)
+
         # Submit Scene
         self.submitScene = nuke.Boolean_Knob("Deadline_SubmitScene", "Submit Nuke Script File With Job")
         self.submitScene.setFlag(nuke.STARTLINE)
         self.addKnob(self.submitScene)
         self.submitScene.setTooltip("If this option is enabled, the Nuke script file will be submitted with the job, and then copied locally to the Worker machine during rendering.")
         self.submitScene.setValue(True)   
+
+        # Scene Store
+        self.useSceneStore = nuke.Boolean_Knob("CopyCat_UseSceneStore", "Store Script By Content")
+        self.useSceneStore.setFlag(nuke.STARTLINE)
+        self.addKnob(self.useSceneStore)
+        self.useSceneStore.setTooltip("If this option is enabled, the Nuke script is copied once per content into the scene store (COPYCAT_SCENE_STORE, or copycat_scenes in the data directory) and the job trains on that copy, so resubmitting an unchanged script doesn't send it again. The copy's project directory is set to the script's folder so relative Read/Write paths still work, but expressions using the script's own path, like [file dirname [value root.name]], point at the store.")
+        self.useSceneStore.setValue(False)
     
     def knobChanged(self, knob):
         if knob == self.machineListButton:
@@ -213,6 +279,19 @@ class CopyCatStandaloneDialog(nukescripts.PythonPanel):
             if output != "Action was cancelled by user":
                 self.machineList.setValue(output)
         
+        if knob == self.probeNetworkButton:
+            self.submitNetworkProbe()
+
+        if knob == self.elastic:
+            self.minWorldSize.setEnabled(self.elastic.value())
+
+        if knob == self.autoSyncInterval:
+            self.syncInterval.setEnabled(not self.autoSyncInterval.value())
+
+        if knob == self.refreshFarmInfoButton:
+            self.farmInfoCache.invalidate()
+            self.refreshFarmInfo()
+
         if knob == self.useGpu:
             self.useSpecificGpu.setEnabled(self.useGpu.value())
 
@@ -221,17 +300,72 @@ class CopyCatStandaloneDialog(nukescripts.PythonPanel):
                 self.chooseGpu.setEnabled(self.useSpecificGpu.value())   
 
         if knob == self.useIpV6:            
-            ipv6 = get_ipv6(self.mainMachine.value())
-            if not ipv6:
-                ipv6 = ""
-            self.manMachineIp.setValue(ipv6)
+            self.updateMainMachineIp()
         
         if knob == self.mainMachine:
             self.getMachinesInOrder()
+            self.updateMainMachineIp()
+
+        if knob == self.topologyOrder and self.topologyOrder.value() and machines:
+            distance, source = machineDistance(machines, self.probeDirectory, "", self.useIpV6.value())
+            self.mainMachine.setValue(bestConnectedMachine(machines, distance))
+            print(f"Main machine {self.mainMachine.value()} is the best connected by the {source}")
+            self.getMachinesInOrder()
+            self.updateMainMachineIp()
+            self.setWorldSize()
         
-        if knob == self.machineList:
+        if knob == self.machineList or knob == self.ranksPerWorker:
             self.setWorldSize()
 
+    def updateMainMachineIp(self):
+        self.resolver.resolveAsync([self.mainMachine.value()], lambda hostname, entry: nuke.executeInMainThread(self.setMainMachineIp, args=(hostname, entry)))
+
+    def setMainMachineIp(self, hostname, entry):
+        # type: (str, Optional[Dict]) -> None
+        # Ignore late answers for a machine that is no longer selected
+        if hostname != self.mainMachine.value():
+            return
+        address = None
+        if entry:
+            address = entry["ipv6"] if self.useIpV6.value() else entry["ipv4"]
+        if not address:
+            print("Subbmiter did not get IP, please set it on your own.")
+            address = ""
+        self.manMachineIp.setValue(str(address))
+
+    def submitNetworkProbe(self):
+        jobInfo = self.getJobInfoDict()
+        if not jobInfo:
+            return
+        # The probe measures machines, not ranks, so it always runs one task per machine
+        settings = self.getSettings()
+        settings["RanksPerWorker"] = 1
+        jobInfo = buildJobInfo(settings)
+        pluginInfo = buildPluginInfo(settings)
+
+        probeDirectory = os.path.join(jobInfo['OutputDirectory'], "copycat_probe", time.strftime("%Y%m%d_%H%M%S"))
+        jobInfo['Name'] = jobInfo['Name'] + " (network probe)"
+        pluginInfo['ProbeNetwork'] = True
+        pluginInfo['ProbeDirectory'] = probeDirectory
+        SubmitJob(jobInfo, pluginInfo, settings=settings)
+        # The training job passes the results on to the plugin, used for the automatic sync interval
+        self.probeDirectory = probeDirectory
+
+        print(f"Network probe submitted, waiting for results in {probeDirectory}")
+        waitForProbeMatrix(probeDirectory, pluginInfo['TrainingSlaves'].split(","), lambda matrix: nuke.executeInMainThread(self.showProbeMatrix, args=(matrix,)))
+
+    def showProbeMatrix(self, matrix):
+        if not matrix:
+            nuke.message("The network probe did not return any results.")
+            return
+        self.probeMatrix = matrix
+        if self.topologyOrder.value():
+            # Measured links beat the topology map or the subnets
+            self.getMachinesInOrder()
+        result = formatProbeMatrix(matrix)
+        print(result)
+        nuke.message(result)
+
     def getMachinesInOrder(self):
         global machines
         if machines:                   
@@ -239,52 +373,65 @@ class CopyCatStandaloneDialog(nukescripts.PythonPanel):
             if main_machine in machines:
                 machines.remove(main_machine)
                 machines.insert(0, main_machine)
+            if self.topologyOrder.value() and len(machines) > 2:
+                distance, source = machineDistance(machines, self.probeDirectory, "", self.useIpV6.value())
+                machines[:] = orderMachinesByTopology(machines, distance, main_machine)
+                print(f"Ranks ordered by the {source}")
             result = ','.join(str(machine) for machine in machines)
             self.machineList.setValue(result)             
 
     def setWorldSize(self):
         tmplist = self.machineList.value().split(",")
         tmplist = [machine for machine in tmplist if machine.strip() != ""]
-        self.worldsize.setValue(len(tmplist))        
+        self.worldsize.setValue(len(tmplist) * max(1, self.ranksPerWorker.value()))        
+
+    def getSettings(self):
+        # type: () -> Dict[str, Any]
+        return {
+            "Name": self.jobName.value(),
+            "Comment": self.comment.value(),
+            "Department": self.department.value(),
+            "Pool": self.pool.value(),
+            "SecondaryPool": self.secondarypool.value(),
+            "Group": self.group.value(),
+            "Priority": self.priority.value(),
+            "OutputDirectory": self.getOutputDirFromNode(),
+            "SceneFile": nuke.Root().name(),
+            "Version": f"{self._nukeVersionMajor}.{self._nukeVersionMinor}",
+            "CopyCatNode": self.nodeTorender.value(),
+            "MainMachine": self.mainMachine.value(),
+            "MainMachineIP": self.manMachineIp.value(),
+            "UseIPv6": self.useIpV6.value(),
+            "Port": self.port.value(),
+            "NetworkInterface": self.networkInterface.value().strip(),
+            "TrainingSlaves": self.machineList.value(),
+            "RanksPerWorker": max(1, int(self.ranksPerWorker.value())),
+            "Elastic": bool(self.elastic.value()),
+            "MinWorldSize": int(self.minWorldSize.value()),
+            "SyncInterval": int(self.syncInterval.value()),
+            "AutoSyncInterval": bool(self.autoSyncInterval.value()),
+            "ProbeDirectory": self.probeDirectory,
+            "UseGpu": bool(self.useGpu.value()),
+            "UseSpecificGpu": self.useSpecificGpu.value(),
+            "GpuOverride": int(self.chooseGpu.value()),
+            "CacheDatasets": bool(self.cacheDatasets.value()),
+            "ForceFreshStart": bool(self.forceFreshStart.value()),
+            "BatchMode": bool(self.batchMode.value()),
+            "UseSceneStore": bool(self.useSceneStore.value()),
+        }
 
     def getJobInfoDict(self):
-        global machines
-        self._jobInfo['Plugin'] = "CopyCat"
-        self._jobInfo['Name'] = self.jobName.value()
-        self._jobInfo['Comment'] = self.comment.value()
-        self._jobInfo['Department'] = self.department.value()
-        self._jobInfo['Pool'] = self.pool.value()
-        self._jobInfo['SecondaryPool'] = self.secondarypool.value()
-        self._jobInfo['Group'] = self.group.value()
-        self._jobInfo['Frames'] = f"1-{str(len(machines))}"
-        # Output       
-        output = self.getOutputDirFromNode()
-        if output == "":
+        # Output
+        if self.getOutputDirFromNode() == "":
             nuke.message("No output directory in CopyCat node provided!\nCanceling submission...")
             return None
-        self._jobInfo['OutputDirectory'] = output
-        self._jobInfo['Priority'] = self.priority.value()
+        # Built by CopyCatSubmission so jobs submitted without Nuke are identical
+        self._jobInfo.update(buildJobInfo(self.getSettings()))
+
+        return self._jobInfo
     
-    def getPluginInfo(self):                        
-        self._pluginInfo["BatchMode"] = False            
-        self._pluginInfo["BatchModeIsMovie"] = False
-        self._pluginInfo["ContinueOnError"] = False
-        self._pluginInfo["EnforceRenderOrder"] =  False        
-        self._pluginInfo["UseGpu"] = bool(self.useGpu.value())  
-        self._pluginInfo["UseSpecificGpu"] = self.useSpecificGpu.value()         
-        self._pluginInfo["GpuOverride"] = 0 if not self.useSpecificGpu.value() else int(self.chooseGpu.value())
-        self._pluginInfo['SceneFile'] = nuke.Root().name()        
-        self._pluginInfo["Version"] = f"{self._nukeVersionMajor}.{self._nukeVersionMinor}"   
-        #main machine
-        self._pluginInfo['MainMachine'] = self.mainMachine.value()
-        self._pluginInfo['Port'] = self.port.value()
-        #rendering machines        
-        self._pluginInfo['TrainingSlaves'] = self.machineList.value() 
-        self._pluginInfo['WorldSize'] = self.worldsize.value()
-        self._pluginInfo['CopyCatNode'] = self.nodeTorender.value()
-        self._pluginInfo['SyncInterval'] = int(self.syncInterval.value())
-        self._pluginInfo['UseIPv6'] = self.useIpV6.value()
-        self._pluginInfo['MainMachineIP'] = self.manMachineIp.value()
+    def getPluginInfo(self):
+        self._pluginInfo.update(buildPluginInfo(self.getSettings()))
 
         return self._pluginInfo
 
@@ -310,16 +457,46 @@ class CopyCatStandaloneDialog(nukescripts.PythonPanel):
 
     def getSubbmitionInfo(self):
         print("Grabbing submitter info...")
-        self.submissionInfo = {}
-        args = ["-GetSubmissionInfo", "Pools", "Groups", "MaxPriority", "UserHomeDir", "RepoDir:custom/submission/Nuke/Main", "RepoDir:submission/Integration/Main"]        
-        output = getJSONResponseFromDeadline(args)# type: Dict
-        self.submissionInfo = output
+        self.farmInfoCache = getFarmInfoCache()
+        self.submissionInfo = self.farmInfoCache.get() # type: Dict
 
     def getCopyCatMachines(self):
-        machines = {}
-        args = ["-GetSlaveNamesInGroup", "copycat"]
-        machines = getJSONResponseFromDeadline(args)         
-        return machines 
+        # Offline, stalled and disabled workers are left out, the rest is ordered idle and best first
+        machines, dropped = rankCopyCatMachines(self.submissionInfo)
+        self.unusableMachines = sorted(dropped)
+        for machine in self.unusableMachines:
+            print(f"CopyCat machine {machine} is left out: {dropped[machine]}")
+        return machines
+
+    def refreshFarmInfo(self):
+        self.farmInfoCache.refreshAsync(lambda info: nuke.executeInMainThread(self.applyFarmInfo, args=(info,)))
+
+    def applyFarmInfo(self, info):
+        # type: (Dict) -> None
+        global machines
+        self.submissionInfo = info
+        # Missing when the web service didn't tell, the limit the dialog has is kept
+        self.maximumPriority = int(info.get("MaxPriority") or self.maximumPriority)
+        self.priority.setTooltip("A job can have a numeric priority ranging from 0 to " + str(self.maximumPriority) + ", where 0 is the lowest priority.")
+
+        for knob, values in ((self.pool, info["Pools"]), (self.secondarypool, info["Pools"]), (self.group, info["Groups"])):
+            current = knob.value()
+            knob.setValues(values)
+            if current in values:
+                knob.setValue(current)
+
+        # Only replace the machine list when the user has not edited it by hand
+        listWasGenerated = self.machineList.value() == ','.join(str(machine) for machine in machines)
+        mainMachine = self.mainMachine.value()
+        machines = self.getCopyCatMachines()
+        self.mainMachine.setValues(machines + self.unusableMachines)
+        if mainMachine in machines or not machines:
+            self.mainMachine.setValue(mainMachine)
+        elif listWasGenerated:
+            self.mainMachine.setValue(machines[0])
+        if listWasGenerated:
+            self.getMachinesInOrder()
+            self.setWorldSize()
 
     def ShowDialog(self):
         # type: () -> bool        
@@ -339,24 +516,6 @@ def getNukeVersion():
         int(nuke.env.get('NukeVersionRelease', '0')),
     )
 
-def getJSONResponseFromDeadline(arguments: list) -> Any:        
-    result = {}
-    json_arg = ["-prettyJSON"]
-    cmd  = json_arg + arguments
-    try:
-        result = json.loads(CallDeadlineCommand(cmd)) # type: Dict
-    except:
-        print("Unable to get submitter info from Deadline:\n\n" + traceback.format_exc())
-        raise
-
-    if result[ "ok" ]:
-        result = result[ "result" ] 
-    else:
-        print("DeadlineCommand returned a bad result and was unable to grab the submitter info.\n\n" + result[ "result" ])
-        raise Exception(result[ "result" ])
-
-    return result #type: Optional[dict | list]
-
 def GetMachineListFromDeadline():
     # type: () -> None
     global CopyCatDialog
@@ -407,21 +566,33 @@ def SubmitToDeadline():
 
     jobInfo = {}
     pluginInfo = {}
-    firstMachine = machines[0].strip().lower()
+    if not machines:
+        print("No machine of the CopyCat group can take the job right now, they are offline, stalled or disabled.")
 
     success = False # type: bool
     while not success:
         success = CopyCatDialog.ShowDialog()
         if not success:            
             return
+
+        listedMachines = [machine.strip() for machine in CopyCatDialog.machineList.value().split(",") if machine.strip() != ""]
+        if not listedMachines:
+            nuke.message("No usable CopyCat machine is available, every machine of the CopyCat group is offline, stalled or disabled.\nAdd machines to Machines for job to submit anyway.")
+            return
         
-        if CopyCatDialog.mainMachine.value().strip().lower() != firstMachine:   
+        if CopyCatDialog.mainMachine.value().strip().lower() != listedMachines[0].lower():   
             reordermachines = nuke.ask("Your MainMachine is not first machine in list, if you proceed machines will be reordered.")
             if reordermachines:
                 CopyCatDialog.getMachinesInOrder()
             else:
                 return
 
+        if CopyCatDialog.manMachineIp.value() == "":
+            # The lookup may still be running, give it one more chance before asking the user
+            mainMachine = CopyCatDialog.mainMachine.value()
+            address = get_ipv6(mainMachine) if CopyCatDialog.useIpV6.value() else get_ip(mainMachine)
+            CopyCatDialog.manMachineIp.setValue(address or "")
+
         if CopyCatDialog.manMachineIp.value() == "":
             nuke.message("Please provide main machine IP")
             return
@@ -448,31 +619,10 @@ def SubmitToDeadline():
         if not pluginInfo:
             nuke.message("Plugin dict for CopyCat are not generated. The submission has been canceled.")
             return
-        
 
-        SubmitJob(jobInfo, pluginInfo)
-
-def connect_to_api():
-    if os.path.isdir(CUSTOM_DEADLINE_API_LOCATION):
-        deadline_api = CUSTOM_DEADLINE_API_LOCATION
-    else: 
-        deadline_api = os.path.join(os.environ['DEADLINE_REPOSITORY'], "api", "python") #if not it will use DEADLINE_REPOSITORY env var and pic api from there
-    deadline_web_url = DEADLINE_WEBSERVICE_URL
-    deadline_port = DEADLINE_WEBSERVICE_PORT
-
-    #append api to sys
-    sys.path.append(deadline_api)
-    deadline_connect = None
-    try:
-        import Deadline.DeadlineConnect as Connect
-        deadline_connect = Connect.DeadlineCon(deadline_web_url, deadline_port)
-    except Exception as e:
-        print(f"ERROR:{e}")  
-    
-    return deadline_connect
+        SubmitJob(jobInfo, pluginInfo, CopyCatDialog.getSettings(), rankManifest=True)
 
-def SubmitJob(jobInfo, pluginInfo):
-    api_connection = connect_to_api()
+def SubmitJob(jobInfo, pluginInfo, settings=None, rankManifest=False):
     AuxFile = nuke.root().name() # Auxiliary 
     # For job Auxiliary files, because we use web service, the Web Service machine executes deadline submit 
     # Command instead your PC. So if you are set it up on Linux machine you will need to modify also paths
@@ -482,61 +632,24 @@ def SubmitJob(jobInfo, pluginInfo):
     # AuxFile = AuxFile.replace('\\', '/')  # Replace backslashes with forward slashes
     # AuxFile = f"/mnt/y{AuxFile}"  # Prep linux base path, Y: is mapped to /mnt/y
 
-    #subbmit over web api
-    if api_connection:
-        api_connection.Jobs.SubmitJob(jobInfo, pluginInfo, AuxFile)
+    def submit():
+        # A scene that is already in the scene store is not sent again
+        auxFiles = [] if settings and storeScene(settings, pluginInfo) else [AuxFile]
+        if rankManifest:
+            try:
+                manifest = writeRankManifest(settings, pluginInfo)
+            except (ValueError, IOError, OSError) as e:
+                raise RuntimeError(f"The rank manifest could not be written. The submission has been canceled.\n{e}")
+            if manifest:
+                auxFiles.append(manifest)
+        return submitJob(jobInfo, pluginInfo, auxFiles)
+
+    #subbmit over web api in the background, Nuke stays usable while the scene is stored, the ranks are written and the job is sent
+    print(f"Submitting {jobInfo['Name']}...")
+    runAsync(submit, lambda jobId, error: nuke.executeInMainThread(reportSubmission, args=(jobInfo['Name'], jobId, error)))
+
+def reportSubmission(name, jobId, error):
+    if error:
+        nuke.message(f"{name} could not be submitted to Deadline.\n{error}")
     else:
-        print("Connection with API is not established")        
-
-def CallDeadlineCommand(arguments, hideWindow=True):
-    # type: (List[str], bool) -> str
-    deadlineCommand = GetDeadlineCommand() # type: str
-    
-    startupinfo = None # type: ignore # this is only a windows option
-    if hideWindow and os.name == 'nt':
-        # Python 2.6 has subprocess.STARTF_USESHOWWINDOW, and Python 2.7 has subprocess._subprocess.STARTF_USESHOWWINDOW, so check for both.
-        if hasattr(subprocess, '_subprocess') and hasattr(subprocess._subprocess, 'STARTF_USESHOWWINDOW'): # type: ignore # this is only a windows option
-            startupinfo = subprocess.STARTUPINFO() # type: ignore # this is only a windows option
-            startupinfo.dwFlags |= subprocess._subprocess.STARTF_USESHOWWINDOW # type: ignore # this is only a windows option
-        elif hasattr(subprocess, 'STARTF_USESHOWWINDOW'):
-            startupinfo = subprocess.STARTUPINFO() # type: ignore # this is only a windows option
-            startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW # type: ignore # this is only a windows option
-    
-    environment = {} # type: Dict[str, str]
-    for key in os.environ.keys():
-        environment[key] = str(os.environ[key])
-        
-    # Need to set the PATH, cuz windows seems to load DLLs from the PATH earlier that cwd....
-    if os.name == 'nt':
-        deadlineCommandDir = os.path.dirname(deadlineCommand)
-        if not deadlineCommandDir == "" :
-            environment['PATH'] = deadlineCommandDir + os.pathsep + os.environ['PATH']
-    
-    arguments.insert(0, deadlineCommand)
-    output = "" # type: Union[bytes, str]
-    
-    # Specifying PIPE for all handles to workaround a Python bug on Windows. The unused handles are then closed immediatley afterwards.
-    proc = subprocess.Popen(arguments, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE, startupinfo=startupinfo, env=environment)
-    output, errors = proc.communicate()
-
-    if sys.version_info[0] > 2 and type(output) is bytes:
-        output = output.decode()
-    return output # type: ignore
-
-def GetDeadlineCommand():
-    # type: () -> str
-    deadlineBin = "" # type: str
-    try:
-        deadlineBin = os.environ['DEADLINE_PATH']
-    except KeyError:
-        #if the error is a key error it means that DEADLINE_PATH is not set. however Deadline command may be in the PATH or on OSX it could be in the file /Users/Shared/Thinkbox/DEADLINE_PATH
-        pass
-        
-    # On OSX, we look for the DEADLINE_PATH file if the environment variable does not exist.
-    if deadlineBin == "" and  os.path.exists("/Users/Shared/Thinkbox/DEADLINE_PATH"):
-        with open("/Users/Shared/Thinkbox/DEADLINE_PATH") as f:
-            deadlineBin = f.read().strip()
-
-    deadlineCommand = os.path.join(deadlineBin, "deadlinecommand") # type: str
-    
-    return deadlineCommand
\ No newline at end of file
+        print(f"Submitted {name} as {jobId}")
@@ -3,11 +3,17 @@
 from __future__ import absolute_import
 import re
 import os
+import sys
+import time
 import socket
+import tempfile
+import threading
 
-from System import Environment
+from System import DateTime, Environment
 from System.Diagnostics import ProcessStartInfo, Process, ProcessPriorityClass
 from System.IO import Path, Directory, File
+from System.Net.NetworkInformation import NetworkInterface, NetworkInterfaceType, OperationalStatus
+from System.Net.Sockets import AddressFamily
 
 from Deadline.Plugins import DeadlinePlugin, PluginType
 from Deadline.Scripting import SystemUtils, PathUtils, RepositoryUtils
@@ -15,6 +21,19 @@ from Deadline.Scripting import SystemUtils, PathUtils, RepositoryUtils
 from FranticX.Processes import ManagedProcess
 from six.moves import range
 
+# Helper modules are shipped next to this file in the plugin folder
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import CopyCatCache
+import CopyCatInterfaces
+import CopyCatLog
+import CopyCatManifest
+import CopyCatMetrics
+import CopyCatNetProbe
+import CopyCatRendezvous
+import CopyCatScene
+import CopyCatTrace
+import CopyCatTraining
+
 ######################################################################
 ## This is the function that Deadline calls to get an instance of the
 ## main DeadlinePlugin class.
@@ -37,6 +56,28 @@ def get_local_ipv4():
         print(f"Error getting local IP address: {e}")
         return None
 
+def get_network_interfaces(useIpv6=False):
+    """Up, non loopback interfaces with their addresses of the family, subnet and link speed."""
+    family = AddressFamily.InterNetworkV6 if useIpv6 else AddressFamily.InterNetwork
+    interfaces = []
+    for nic in NetworkInterface.GetAllNetworkInterfaces():
+        if nic.OperationalStatus != OperationalStatus.Up or nic.NetworkInterfaceType == NetworkInterfaceType.Loopback:
+            continue
+        try:
+            speed = nic.Speed
+        except Exception:
+            speed = -1
+        for unicast in nic.GetIPProperties().UnicastAddresses:
+            if unicast.Address.AddressFamily != family:
+                continue
+            try:
+                prefixLength = unicast.PrefixLength
+            except Exception:
+                # Not implemented everywhere, the mask tells the same for IPv4
+                prefixLength = bin(int.from_bytes(bytes(unicast.IPv4Mask.GetAddressBytes()), "big")).count("1") if not useIpv6 else 64
+            interfaces.append(CopyCatInterfaces.Interface(nic.Name, str(unicast.Address.ToString()).split("%")[0], int(prefixLength), speed))
+    return interfaces
+
 #IPv6 is set here but for now plugin works on IPv4
 def get_local_ipv6():
     try:
@@ -53,6 +94,14 @@ def get_local_ipv6():
         return None
 
 
+# Waits between flushes of Nuke's output while polling for READY FOR INPUT, they double up to the max
+READY_WAIT_MIN_SECONDS = 0.005
+READY_WAIT_MAX_SECONDS = 0.1
+# How often the process, popups and cancel are checked meanwhile
+READY_CHECK_SECONDS = 0.5
+# Environment of a rank, handed to the warm Nuke of a batch mode job for every task
+COPYCAT_ENVIRONMENT = ( "COPYCAT_MAIN_ADDR", "COPYCAT_MAIN_PORT", "COPYCAT_LOCAL_ADDR", "COPYCAT_RANK", "COPYCAT_WORLD_SIZE", "COPYCAT_SYNC_INTERVAL", "EDDY_DEVICE_LIST" )
+
 ######################################################################
 ## This is the main DeadlinePlugin class for the Nuke plugin.
 ######################################################################
@@ -63,26 +112,49 @@ class CopyCatPlugin (DeadlinePlugin):
     ProcessName = "CopyCat Nuke"
     
     ## Utility functions
-    def WritePython( self, statement ):
+    def WritePython( self, statement, timeout=None ):
         self.FlushMonitoredManagedProcessStdout( self.ProcessName )
         self.WriteStdinToMonitoredManagedProcess( self.ProcessName, statement )
-        self.WaitForProcess()
+        self.WaitForProcess( timeout )
     
-    def WaitForProcess( self ):
+    def WaitForProcess( self, timeout=None ):
+        """Polls for Nuke's READY FOR INPUT.
+
+        Deadline only runs the stdout handlers while the output is flushed, so this still polls: the output
+        is flushed between waits on the handler's event that double from 5 to 100 ms while Nuke is busy. The
+        process, popups and cancel are checked a few times a second. timeout defaults to ReadyForInputTimeout
+        from the plugin configuration, which startup and commands always have, 0 waits as long as it takes."""
         self.FlushMonitoredManagedProcessStdout( self.ProcessName )
+        self.Process.ResetReadyForInput()
         self.WriteStdinToMonitoredManagedProcess( self.ProcessName, self.Process.ReadyForInputCommand() )
-        while not self.Process.IsReadyForInput():
-            self.VerifyMonitoredManagedProcess( self.ProcessName )
+
+        if timeout is None:
+            timeout = self.GetIntegerConfigEntryWithDefault( "ReadyForInputTimeout", 300 ) or 300
+        deadline = time.time() + timeout if timeout > 0 else None
+        delay = READY_WAIT_MIN_SECONDS
+        nextCheck = 0.0
+        while True:
             self.FlushMonitoredManagedProcessStdout( self.ProcessName )
-            
-            blockingDialogMessage = self.CheckForMonitoredManagedProcessPopups( self.ProcessName )
-            if( blockingDialogMessage != "" ):
-                self.FailRender( blockingDialogMessage )
-            
-            if self.IsCanceled():
-                self.FailRender( "Received cancel task command" )
-            
-            SystemUtils.Sleep( 100 )
+            if self.Process.WaitForReadyForInput( delay ):
+                break
+
+            now = time.time()
+            if now >= nextCheck:
+                nextCheck = now + READY_CHECK_SECONDS
+                self.VerifyMonitoredManagedProcess( self.ProcessName )
+
+                blockingDialogMessage = self.CheckForMonitoredManagedProcessPopups( self.ProcessName )
+                if( blockingDialogMessage != "" ):
+                    self.FailRender( blockingDialogMessage )
+
+                if self.IsCanceled():
+                    self.FailRender( "Received cancel task command" )
+
+                self.CheckElasticWorld()
+
+            if deadline is not None and now > deadline:
+                self.FailRender( f"Nuke was not ready for input within {timeout} seconds" )
+            delay = min( delay * 2, READY_WAIT_MAX_SECONDS )
         
         self.Process.ResetReadyForInput()
         
@@ -178,6 +250,12 @@ class CopyCatPlugin (DeadlinePlugin):
 
     def __init__( self ):
         super().__init__()
+        self.ResumeCheckpoint = ""
+        self.RendezvousSeconds = 0.0
+        self.ElasticRendezvous = None
+        self.ElasticWorldLost = ""
+        self.RankManifestEntry = None
+        self.Tracer = CopyCatTrace.PhaseTracer()
         self.StartJobCallback += self.NukeSetup
         self.RenderTasksCallback += self.RenderCopyCat
         self.EndJobCallback += self.EndJob
@@ -202,25 +280,34 @@ class CopyCatPlugin (DeadlinePlugin):
         self.PluginType = PluginType.Advanced
     
     def NukeSetup( self ):
+        self.Tracer.name = f"{self.GetSlaveName()} thread {self.GetThreadNumber()}"
         # This fixes a library conflict issue on non-Windows systems.
         if not SystemUtils.IsRunningOnWindows():
-            self.scrubLibPaths()
+            with self.Tracer.phase( "scrubLibPaths" ):
+                self.scrubLibPaths()
         
         if self.GetBooleanConfigEntryWithDefault( "PrepForOFX", True ):
             # Ensure that OFX plugins will work
             try:
-                self.prepForOFX()
+                with self.Tracer.phase( "prepForOFX" ):
+                    self.prepForOFX()
             except:
                 self.LogWarning( "Prepping of OFX cache failed" )
         
         self.Version = float( self.GetPluginInfoEntry( "Version" ) )
 
+        if self.GetBooleanPluginInfoEntryWithDefault( "ProbeNetwork", False ):
+            # Probe jobs don't start Nuke, so there is nothing else to set up
+            return
+
         if self.Version >= 14.1:
-            self.SetupCopyCatEnv()
+            with self.Tracer.phase( "SetupCopyCatEnv" ):
+                self.SetupCopyCatEnv()
         else:
             self.FailRender(f"Nuke version {str(self.Version)} is currently not supported for CopyCat." )
         
         # Since we now support minor versions, we should default to the *.0 version if the *.X version they're using isn't supported yet.
+        self.Tracer.begin( "Nuke version lookup" )
         versionNotSupported = "this version is not supported yet"
         nukeExeList = self.GetConfigEntryWithDefault( "RenderExecutable" + str(self.Version).replace( ".", "_" ), versionNotSupported )
         if nukeExeList == versionNotSupported:
@@ -232,12 +319,224 @@ class CopyCatPlugin (DeadlinePlugin):
                 self.FailRender( "Nuke major version " + str(int(self.Version)) + " is currently not supported." )
             else:
                 self.LogWarning( "Nuke minor version " + str(oldVersion) + " is currently not supported, so version " + str(self.Version) + " will be used instead." )
+        self.Tracer.end( "Nuke version lookup", Version=self.Version )
+
+        self.BatchMode = self.GetBooleanPluginInfoEntryWithDefault( "BatchMode", False )
+        if self.BatchMode:
+            self.StartWarmNuke()
+
+    def StartWarmNuke( self ):
+        """Starts the Nuke that trains every task of this job on this Worker thread, it quits in EndJob."""
+        self.LogInfo( "Batch mode: starting a warm Nuke for the tasks of this job" )
+        with self.Tracer.phase( "warm Nuke startup" ):
+            self.Process = CopyCatProcess( self, self.Version, batchMode=True )
+            self.StartMonitoredManagedProcess( self.ProcessName, self.Process )
+            self.WaitForProcess()
+            pluginDirectory = os.path.dirname( os.path.abspath( __file__ ) )
+            self.WritePython( f"import sys; sys.path.insert( 0, {pluginDirectory!r} ); import CopyCatBatch" )
+
+    def TrainInWarmNuke( self ):
+        """Trains this task's scene in the warm Nuke, with this task's rank and world."""
+        self.Process.PrepareTask()
+        try:
+            environment = {}
+            for name in COPYCAT_ENVIRONMENT:
+                value = self.GetProcessEnvironmentVariable( name )
+                if value:
+                    environment[name] = value
+            task = { "SceneFile": self.Process.TempSceneFilename.replace( "\\", "/" ), "CopyCatNode": self.GetPluginInfoEntry( "CopyCatNode" ), "Environment": environment }
+            # Training gets its own limit, the ready timeout is meant for startup and commands
+            timeout = self.GetIntegerConfigEntryWithDefault( "BatchTrainingTimeout", 0 )
+            self.WritePython( f"CopyCatBatch.train( {task!r} )", timeout=timeout )
+        finally:
+            self.Process.FinishTask()
 
     def RenderCopyCat( self ):        
-        self.Process = CopyCatProcess( self, self.Version )        
-        self.RunManagedProcess( self.Process )
+        if self.GetBooleanPluginInfoEntryWithDefault( "ProbeNetwork", False ):
+            self.RunNetworkProbe()
+            return
+
+        try:
+            rendezvousStart = time.time()
+            with self.Tracer.phase( "rendezvous" ):
+                if self.GetBooleanPluginInfoEntryWithDefault( "Elastic", False ):
+                    self.JoinElasticWorld()
+                else:
+                    self.WaitForAllRanks()
+            self.RendezvousSeconds = time.time() - rendezvousStart
+            trained = False
+            if self.BatchMode:
+                self.TrainInWarmNuke()
+            elif self.ElasticRendezvous is not None:
+                self.Process = CopyCatProcess( self, self.Version )
+                self.RunElasticProcess()
+            else:
+                self.Process = CopyCatProcess( self, self.Version )        
+                self.RunManagedProcess( self.Process )
+            trained = True
+        finally:
+            # The next generation of an elastic job may form once this world stops beating
+            if self.ElasticRendezvous is not None:
+                self.ElasticRendezvous.stopHeartbeat( finished=trained )
+                self.ElasticRendezvous = None
+            # Also when the task fails, a rank that never got to train is what the timeline is for
+            self.WriteTrace()
+
+    def WriteTrace( self ):
+        """Writes this rank's phases and merges them with the other ranks' into the job's timeline."""
+        traceDirectory = self.GetConfigEntryWithDefault( "PhaseTraceDirectory", "" ).strip()
+        if traceDirectory == "":
+            return
+        jobDirectory = os.path.join( RepositoryUtils.CheckPathMapping( traceDirectory ), self.GetJob().JobId )
+        self.Tracer.rank = getattr( self, "Rank", 0 )
+        self.Tracer.name = f"rank {self.Tracer.rank} {self.GetSlaveName()} thread {self.GetThreadNumber()}"
+        try:
+            self.Tracer.write( os.path.join( jobDirectory, f"{self.GetSlaveName().lower()}_{self.GetThreadNumber()}.json" ) )
+            CopyCatTrace.writeTimeline( jobDirectory )
+        except (IOError, OSError) as e:
+            self.LogWarning( f"Unable to write the phase trace to {jobDirectory}: {e}" )
+
+    def WaitForAllRanks( self ):
+        """Holds this rank until every rank of the world is running, so Nuke is never started for an incomplete world."""
+        timeout = self.GetIntegerConfigEntryWithDefault( "RendezvousTimeout", 600 )
+        if timeout <= 0 or self.WorldSize <= 1:
+            if self.WorldSize > 1:
+                self.LogWarning( "The rendezvous is disabled, every rank picks the checkpoint to resume from on its own" )
+            self.SetResumePoint( self.FindResumeCheckpoint() )
+            return
+        # The rendezvous uses the port after CopyCat's own
+        port = self.MainPort + 1
+        self.LogInfo( f"Waiting up to {timeout} seconds for all {self.WorldSize} ranks on {self.MainMachineIp}:{port}..." )
+        try:
+            if self.Rank == 0:
+                # Rank 0 picks the checkpoint once the world is complete, every rank resumes from the same one
+                server = CopyCatRendezvous.RendezvousServer( self.MainMachineIp, port, self.WorldSize, log=self.LogInfo )
+                release = server.wait( timeout, release=self.FindResumeCheckpoint )
+            else:
+                release = CopyCatRendezvous.register( self.MainMachineIp, port, self.Rank, self.WorldSize, self.GetSlaveName(), self.LocalAddress, timeout )
+        except CopyCatRendezvous.RendezvousError as e:
+            self.FailRender( f"CopyCat rendezvous failed: {e}" )
+        self.LogInfo( "All ranks are present, starting Nuke" )
+        self.SetResumePoint( release )
+
+    def FindResumeCheckpoint( self ):
+        """Latest complete checkpoint this job wrote to the CopyCat node's data directory."""
+        if self.GetBooleanPluginInfoEntryWithDefault( "ForceFreshStart", False ) or not self.GetBooleanConfigEntryWithDefault( "ResumeFromCheckpoint", True ):
+            self.LogInfo( "Resuming from checkpoints is turned off, training starts from step 0" )
+            return {"Checkpoint": ""}
+        dataDirectory = ( self.GetCopyCatNodeKnobs() or {} ).get( "dataDirectory", "" )
+        if dataDirectory == "":
+            return {"Checkpoint": ""}
+        dataDirectory = RepositoryUtils.CheckPathMapping( dataDirectory )
+
+        # Older checkpoints in the directory belong to earlier trainings, only the ones written since the job was submitted count
+        jobAge = ( DateTime.UtcNow - self.GetJob().JobSubmitDateTime.ToUniversalTime() ).TotalSeconds
+        latest = CopyCatTraining.findLatestCheckpoint( dataDirectory, time.time() - jobAge )
+        if latest is None:
+            self.LogInfo( f"No checkpoint of this job in {dataDirectory}, training starts from step 0" )
+            return {"Checkpoint": ""}
+        step, path, reasons = latest
+        for reason in reasons:
+            self.LogWarning( reason )
+        # Only the file name is shared, every rank finds it in its own (path mapped) data directory
+        return {"Checkpoint": os.path.basename( path ), "CheckpointStep": step}
+
+    def SetResumePoint( self, release ):
+        self.ResumeCheckpoint = release.get( "Checkpoint", "" )
+        if self.ResumeCheckpoint:
+            self.LogInfo( f"Resuming training from checkpoint {self.ResumeCheckpoint} (step {release.get('CheckpointStep')})" )
+
+    def JoinElasticWorld( self ):
+        """Forms the world from the ranks that are running now, rank, world size and main address come from the rendezvous."""
+        directory = self.GetPluginInfoEntryWithDefault( "RendezvousDirectory", "" )
+        if directory == "":
+            self.FailRender( "Elastic training needs a Rendezvous Directory on shared storage" )
+        machines = [machine.strip() for machine in self.GetPluginInfoEntry( "TrainingSlaves" ).split( "," ) if machine.strip() != ""]
+        # The rendezvous can't be turned off in elastic mode, it is what hands out the ranks
+        timeout = self.GetIntegerConfigEntryWithDefault( "RendezvousTimeout", 600 ) or 600
+        rendezvous = CopyCatRendezvous.ElasticRendezvous( RepositoryUtils.CheckPathMapping( directory ), self.GetSlaveName(), self.GetThreadNumber(), self.LocalAddress,
+                                                          self.WorldSize, self.GetIntegerPluginInfoEntryWithDefault( "MinWorldSize", 0 ) or None,
+                                                          self.GetIntegerConfigEntryWithDefault( "ElasticJoinWindow", 60 ), machines,
+                                                          release=self.FindResumeCheckpoint, log=self.LogInfo )
+        try:
+            world = rendezvous.join( timeout )
+        except CopyCatRendezvous.RendezvousError as e:
+            self.FailRender( f"CopyCat elastic rendezvous failed: {e}" )
+        rendezvous.startHeartbeat( world["Generation"], world["Members"], onPeerLost=self.LoseElasticWorld )
+        self.ElasticRendezvous = rendezvous
+
+        self.Rank = world["Rank"]
+        self.WorldSize = world["WorldSize"]
+        self.MainMachineIp = world["MainAddress"]
+        self.LogInfo( f"Elastic world generation {world['Generation']}: rank {self.Rank} of {self.WorldSize}, main address {self.MainMachineIp}" )
+        self.SetProcessEnvironmentVariable( "COPYCAT_MAIN_ADDR", self.MainMachineIp )
+        self.SetProcessEnvironmentVariable( "COPYCAT_RANK", str( self.Rank ) )
+        self.SetProcessEnvironmentVariable( "COPYCAT_WORLD_SIZE", str( self.WorldSize ) )
+        self.SetResumePoint( world )
+        if self.GetBooleanPluginInfoEntryWithDefault( "AutoSyncInterval", False ):
+            worldMachines = sorted( set( member["Machine"] for member in world["Members"] ) )
+            self.SetProcessEnvironmentVariable( "COPYCAT_SYNC_INTERVAL", str( self.GetAutoSyncInterval( worldMachines, self.WorldSize ) ) )
+
+    def LoseElasticWorld( self, reason ):
+        """Called from the heartbeat once another rank is lost, the task fails at the next check of the Nuke that waits for it."""
+        self.ElasticWorldLost = reason
+
+    def CheckElasticWorld( self ):
+        """Fails an elastic task whose world lost a rank or whose training went quiet, a rank stuck waiting on a dead peer would hold the next generation back."""
+        if self.ElasticRendezvous is None:
+            return
+        if self.ElasticWorldLost:
+            self.FailRender( f"The elastic world lost a rank, {self.ElasticWorldLost}" )
+        timeout = self.GetIntegerConfigEntryWithDefault( "ElasticOutputTimeout", 900 )
+        quiet = time.time() - self.Process.LastTrainingOutput
+        if timeout > 0 and self.Process.LastTrainingOutput > 0 and quiet > timeout:
+            self.FailRender( f"CopyCat printed no training step for {int( quiet )} seconds, the elastic world is assumed stuck" )
+
+    def RunElasticProcess( self ):
+        """Trains like RunManagedProcess, but polls Nuke so CheckElasticWorld can fail the task while it runs."""
+        self.StartMonitoredManagedProcess( self.ProcessName, self.Process )
+        try:
+            while not self.WaitForMonitoredManagedProcessToExit( self.ProcessName, int( READY_CHECK_SECONDS * 1000 ) ):
+                self.FlushMonitoredManagedProcessStdout( self.ProcessName )
+                blockingDialogMessage = self.CheckForMonitoredManagedProcessPopups( self.ProcessName )
+                if( blockingDialogMessage != "" ):
+                    self.FailRender( blockingDialogMessage )
+                if self.IsCanceled():
+                    self.FailRender( "Received cancel task command" )
+                self.CheckElasticWorld()
+            self.FlushMonitoredManagedProcessStdout( self.ProcessName )
+        finally:
+            self.ShutdownMonitoredManagedProcess( self.ProcessName )
+        # There is no exit code to check here, Nuke rendered the CopyCat node once it printed its frame
+        if not self.Process.FrameDone:
+            self.FailRender( "Nuke exited before CopyCat finished training" )
+
+    def RunNetworkProbe( self ):
+        """Measures RTT and throughput from this machine to every other training machine."""
+        self.LogInfo("Running CopyCat network probe...")
+        thisMachine = self.GetSlaveName().lower()
+        machines = [machine.strip().lower() for machine in self.GetPluginInfoEntry("TrainingSlaves").split(",") if machine.strip() != ""]
+        if thisMachine not in machines:
+            self.FailRender(f"{thisMachine} is not one of the machines to probe: {','.join(machines)}")
+
+        family = socket.AF_INET6 if self.GetBooleanPluginInfoEntryWithDefault("UseIPv6", False) else socket.AF_INET
+        peers = {}
+        for machine in machines:
+            try:
+                peers[machine] = socket.getaddrinfo(machine, None, family)[0][4][0]
+            except OSError as e:
+                self.FailRender(f"Unable to resolve {machine}: {e}")
+
+        resultDirectory = RepositoryUtils.CheckPathMapping( self.GetPluginInfoEntry("ProbeDirectory") )
+        port = self.GetIntegerPluginInfoEntryWithDefault("Port", 3000)
+        timeout = self.GetIntegerConfigEntryWithDefault("ProbeTimeout", 300)
+        CopyCatNetProbe.runProbe(thisMachine, peers, port, resultDirectory, log=self.LogInfo, timeout=timeout, family=family)
+        self.LogInfo(f"Network probe results written to {resultDirectory}")
     
     def EndJob( self ):        
+        if not self.BatchMode:
+            return
+        # Deadline ends the plugin's processes with the job anyway, the next job starts a fresh Nuke
         self.FlushMonitoredManagedProcessStdoutNoHandling( self.ProcessName )
         self.WriteStdinToMonitoredManagedProcess( self.ProcessName, "quit()" )
         self.FlushMonitoredManagedProcessStdoutNoHandling( self.ProcessName )
@@ -254,31 +553,72 @@ class CopyCatPlugin (DeadlinePlugin):
         port = self.GetIntegerPluginInfoEntryWithDefault("Port", 3000)
         othermachines = self.GetPluginInfoEntry("TrainingSlaves") 
         syncInterval = self.GetIntegerPluginInfoEntryWithDefault("SyncInterval", 1) 
-        rank = 0 # Main machine rank
+        # Every worker runs one rank per GPU as concurrent tasks, the thread number is the local rank
+        ranksPerWorker = max(1, self.GetIntegerPluginInfoEntryWithDefault("RanksPerWorker", 1))
+        localRank = self.GetThreadNumber()
+        rank = localRank # Main machine ranks
         othermachineslist = othermachines.split(",")  
+        elastic = self.GetBooleanPluginInfoEntryWithDefault("Elastic", False)
+
+        thisMachine = self.GetSlaveName().lower()    
+
+        if localRank >= ranksPerWorker:
+            self.FailRender(f"Task runs on thread {localRank} but the job has {ranksPerWorker} ranks per worker, set Concurrent Tasks to {ranksPerWorker}")
+
+        manifestName = self.GetPluginInfoEntryWithDefault("RankManifest", "").strip()
+        if manifestName != "" and not elastic:
+            # The submitter numbered the ranks, TrainingSlaves is only read by jobs without a manifest
+            manifest = self.LoadRankManifest(manifestName, worldSize, ranksPerWorker, mainMachineIp, port)
+            try:
+                self.RankManifestEntry = manifest.lookup(thisMachine, localRank)
+            except CopyCatManifest.ManifestError as e:
+                self.FailRender(str(e))
+            othermachineslist = manifest.machines()
+            mainmachine = manifest.MainMachine.lower()
 
         # Check world size before render, if is not set coreectly (for example you are added new machine via monitor) 
         # this will correct it and run process with proper world size
-        if (worldSize != len(othermachineslist)):
-            worldSize = len(othermachineslist)
+        if self.RankManifestEntry is None and worldSize != len(othermachineslist) * ranksPerWorker:
+            worldSize = len(othermachineslist) * ranksPerWorker
 
-        ipAddress = get_local_ipv4() if not useIpv6 else get_local_ipv6()
-        thisMachine = self.GetSlaveName().lower()    
+        if self.GetBooleanPluginInfoEntryWithDefault("AutoSyncInterval", False):
+            syncInterval = self.GetAutoSyncInterval(othermachineslist, worldSize)
+
+        ipAddress = self.GetLocalAddress(mainMachineIp, useIpv6)
         print(f"Current Machine IP: {ipAddress}")  
         print(f"Current Machine Name: {thisMachine}")   
+        if self.RankManifestEntry is not None:
+            rank = self.RankManifestEntry["Rank"]
         # main machine is rank 0 so if not main machine give it different rank
-        if thisMachine != mainmachine:
+        elif thisMachine != mainmachine:
             print("this is not main machine")
             print(f"othermachineslist: {othermachineslist}")
+            machineIndex = None
             for index, machineName in enumerate(othermachineslist):
                 if machineName.strip().lower() == thisMachine:   
                     print("setting rank for this machine")                 
-                    rank = index       
+                    machineIndex = index
+            if machineIndex is not None:
+                rank = machineIndex * ranksPerWorker + localRank
+            elif not elastic:
+                self.FailRender(f"{thisMachine} is not one of the training machines: {othermachines}")
+        if elastic:
+            # Substitute workers are welcome, every rank gets its number from the elastic rendezvous
+            self.LogInfo(f"Elastic training with up to {worldSize} ranks, local rank {localRank} of {ranksPerWorker} on {thisMachine}")
+        else:
+            self.LogInfo(f"Rank {rank} of {worldSize}, local rank {localRank} of {ranksPerWorker} on {thisMachine}")
 
         #when this machine is mainmachine check it IP
-        if thisMachine == mainmachine and ipAddress != mainMachineIp:
+        if thisMachine == mainmachine and not CopyCatInterfaces.sameAddress(ipAddress, mainMachineIp):
             self.FailRender("Your Main Machine IP is incorrect! Please check main machine IP!")
     
+        # Kept for the rendezvous before Nuke starts
+        self.Rank = rank
+        self.WorldSize = worldSize
+        self.MainMachineIp = str(mainMachineIp)
+        self.MainPort = port
+        self.LocalAddress = str(ipAddress)
+
         self.SetProcessEnvironmentVariable("COPYCAT_MAIN_ADDR", str(mainMachineIp))  
         self.SetProcessEnvironmentVariable("COPYCAT_RANK", str(rank))
         self.SetProcessEnvironmentVariable("COPYCAT_LOCAL_ADDR", str(ipAddress))
@@ -287,13 +627,107 @@ class CopyCatPlugin (DeadlinePlugin):
         self.SetProcessEnvironmentVariable("COPYCAT_SYNC_INTERVAL", str(syncInterval))        
         self.LogInfo(f"CopyCat Environment is set...")
 
+    def LoadRankManifest(self, name, worldSize, ranksPerWorker, mainMachineIp, port):
+        """The job's rank manifest from its auxiliary files, fails the task when it doesn't match the job."""
+        paths = [path for path in self.GetAuxiliaryFilenames() if os.path.basename(path) == name]
+        if not paths:
+            self.FailRender(f"The job has no auxiliary file {name}, the rank manifest of the job is missing")
+        try:
+            manifest = CopyCatManifest.loadManifest(paths[0])
+        except CopyCatManifest.ManifestError as e:
+            self.FailRender(str(e))
+        # Plugin info edited in the Monitor after submission no longer describes the world the manifest was made for
+        for entry, jobValue, manifestValue in (("WorldSize", worldSize, manifest.WorldSize), ("RanksPerWorker", ranksPerWorker, manifest.manifest.get("RanksPerWorker", 1)), ("Port", port, manifest.Port)):
+            if int(jobValue) != int(manifestValue):
+                self.FailRender(f"The job's {entry} is {jobValue} but the rank manifest has {manifestValue}, resubmit the job to change it")
+        if not CopyCatInterfaces.sameAddress(mainMachineIp, manifest.MainAddress):
+            self.FailRender(f"The job's MainMachineIP is {mainMachineIp} but the rank manifest has {manifest.MainAddress}, resubmit the job to change it")
+        self.LogInfo(f"Rank manifest {name}: {manifest.WorldSize} ranks on {len(manifest.machines())} machines")
+        return manifest
+
+    def GetLocalAddress(self, mainMachineIp, useIpv6):
+        """Address of the fastest interface reaching the main machine, or of the interface given in NetworkInterface."""
+        preference = self.GetPluginInfoEntryWithDefault("NetworkInterface", "").strip()
+        if self.RankManifestEntry is not None:
+            preference = self.RankManifestEntry.get("Interface", "").strip()
+        try:
+            interfaces = get_network_interfaces(useIpv6)
+        except Exception as e:
+            if preference != "":
+                self.FailRender(f"Unable to list the network interfaces for {preference}: {e}")
+            self.LogWarning(f"Unable to list the network interfaces, using the default route: {e}")
+            return get_local_ipv4() if not useIpv6 else get_local_ipv6()
+
+        for interface in interfaces:
+            self.LogInfo(f"Network interface {CopyCatInterfaces.describe(interface)}")
+        try:
+            interface, reason = CopyCatInterfaces.chooseInterface(interfaces, mainMachineIp, preference, CopyCatInterfaces.routedAddress(mainMachineIp))
+        except CopyCatInterfaces.InterfaceError as e:
+            self.FailRender(str(e))
+        self.LogInfo(f"Training on {CopyCatInterfaces.describe(interface)}: {reason}")
+        return interface.Address
+
+    def GetSceneFilename(self):
+        sceneFilename = self.GetPluginInfoEntryWithDefault( "SceneFile", self.GetDataFilename() )
+        return RepositoryUtils.CheckPathMapping( sceneFilename )
+
+    def GetCopyCatNodeKnobs(self):
+        copycatNode = self.GetPluginInfoEntry("CopyCatNode")
+        try:
+            knobs = CopyCatScene.readNodeKnobs(self.GetSceneFilename(), copycatNode)
+        except (IOError, OSError) as e:
+            self.LogWarning(f"Unable to read the Nuke script: {e}")
+            return None
+        if knobs is None:
+            self.LogWarning(f"CopyCat node {copycatNode} was not found in the Nuke script")
+        return knobs
+
+    def GetAutoSyncInterval(self, machines, worldSize):
+        """Derives COPYCAT_SYNC_INTERVAL from the link speed between the ranks and the CopyCat node settings.
+        Every rank has to end up with the same value, so only data shared by all of them is used."""
+        latency = float( self.GetConfigEntryWithDefault("AssumedLinkLatency", "0.1") ) / 1000.0
+        bandwidth = float( self.GetConfigEntryWithDefault("AssumedLinkBandwidth", "1250") ) * 1e6
+        source = "link speed assumed in the plugin configuration"
+
+        probeDirectory = self.GetPluginInfoEntryWithDefault("ProbeDirectory", "")
+        if probeDirectory != "":
+            matrix = CopyCatNetProbe.loadProbeMatrix( RepositoryUtils.CheckPathMapping(probeDirectory) )
+            link = CopyCatTraining.slowestLinkFromProbe(matrix, [machine.strip().lower() for machine in machines])
+            if link:
+                latency, bandwidth = link
+                source = f"network probe in {probeDirectory}"
+            else:
+                self.LogWarning(f"Network probe in {probeDirectory} does not cover every pair of machines, it is ignored")
+
+        knobs = self.GetCopyCatNodeKnobs() or {}
+        modelSize = knobs.get("modelSize", "Medium")
+        try:
+            batchSize = int(knobs.get("batchSize", 4))
+            cropSize = int(knobs.get("cropSize", 256))
+        except ValueError:
+            batchSize, cropSize = 4, 256
+
+        syncInterval, reasons = CopyCatTraining.chooseSyncInterval(latency, bandwidth, worldSize, modelSize, batchSize, cropSize)
+        self.LogInfo(f"Auto sync interval {syncInterval}, based on the {source}:")
+        for reason in reasons:
+            self.LogInfo("    " + reason)
+        return syncInterval
+
 class CopyCatProcess (ManagedProcess):
     deadlinePlugin = None
     
     TempSceneFilename = ""
+    TempSceneIsCopy = False
     Version = -1.0
     BatchMode = False
-    ReadyForInput = False
+    ReadyForInput = None
+    TrainingProgress = None
+    LastTrainingUpdate = 0.0
+    # When the task was prepared or CopyCat last printed a step, 0 before the task is prepared
+    LastTrainingOutput = 0.0
+    FrameDone = False
+    Metrics = None
+    DatasetCache = None
 
     #Utility functions
     def pathMappingWithFilePermissionFix( self, inFileName, outFileName, stringsToReplace, newStrings ):
@@ -301,11 +735,13 @@ class CopyCatProcess (ManagedProcess):
         if SystemUtils.IsRunningOnLinux() or SystemUtils.IsRunningOnMac():
             os.chmod( outFileName, os.stat( inFileName ).st_mode )
             
-    def __init__( self, deadlinePlugin, version):
+    def __init__( self, deadlinePlugin, version, batchMode=False ):
         super().__init__()
         self.deadlinePlugin = deadlinePlugin
         
         self.Version = version
+        self.BatchMode = batchMode
+        self.ReadyForInput = threading.Event()
         
         self.InitializeProcessCallback += self.InitializeProcess
         self.RenderExecutableCallback += self.RenderExecutable
@@ -314,6 +750,10 @@ class CopyCatProcess (ManagedProcess):
         self.PostRenderTasksCallback += self.PostRenderTasks
     
     def Cleanup(self):
+        if self.Metrics is not None:
+            self.Metrics.close()
+            self.Metrics = None
+        self.ReleaseDatasets()
         for stdoutHandler in self.StdoutHandlers:
             del stdoutHandler.HandleCallback
         
@@ -331,14 +771,8 @@ class CopyCatProcess (ManagedProcess):
         self.StdoutHandling = True
         
         # Set the stdout handlers.
-        self.AddStdoutHandlerCallback( "READY FOR INPUT" ).HandleCallback +=  self.HandleReadyForInput
-        self.AddStdoutHandlerCallback( ".*ERROR:.*" ).HandleCallback += self.HandleError
-        self.AddStdoutHandlerCallback( ".*Error:.*" ).HandleCallback += self.HandleError
-        self.AddStdoutHandlerCallback( ".*Error :.*" ).HandleCallback += self.HandleError
-        self.AddStdoutHandlerCallback( "Eddy\\[ERROR\\]" ).HandleCallback += self.HandleError
-        #self.AddStdoutHandler( ".* seconds to execute", self.HandleProgress )
-        #self.AddStdoutHandler( ".* took [0-9]*\\.[0-9]* seconds", self.HandleProgress )
-        self.AddStdoutHandlerCallback( "Frame [0-9]+ \\(([0-9]+) of ([0-9]+)\\)" ).HandleCallback += self.HandleProgress
+        # One handler for errors, readiness, frame progress and training lines, so each line is matched once
+        self.AddStdoutHandlerCallback( CopyCatLog.HANDLER_PATTERN ).HandleCallback += self.HandleLine
 
         # Handle QuickTime popup dialog
         # "QuickTime does not support the current Display Setting.  Please change it and restart this application."
@@ -346,9 +780,25 @@ class CopyCatProcess (ManagedProcess):
         self.AddPopupHandler( "Nicht.*", "OK" )
     
     def PreRenderTasks( self ):
+        # The warm Nuke of batch mode starts once per job, its tasks are prepared by the plugin
+        if not self.BatchMode:
+            self.PrepareTask()
+
+    def PrepareTask( self ):
+        """Maps the scene, stages the datasets, configures resume and starts following progress for a task."""
+        tracer = self.deadlinePlugin.Tracer
+        tracer.begin( "scene path mapping" )
         sceneFilename = self.deadlinePlugin.GetPluginInfoEntryWithDefault( "SceneFile", self.deadlinePlugin.GetDataFilename() )
         sceneFilename = RepositoryUtils.CheckPathMapping( sceneFilename )
 
+        # A scene from the scene store must still have the content it was submitted with
+        sceneHash = self.deadlinePlugin.GetPluginInfoEntryWithDefault( "SceneHash", "" ).strip()
+        if sceneHash != "":
+            if not os.path.isfile( sceneFilename ):
+                self.deadlinePlugin.FailRender( f"Stored scene {sceneFilename} is not readable on this worker" )
+            if not CopyCatCache.SceneStore.verifyScene( sceneFilename, sceneHash ):
+                self.deadlinePlugin.FailRender( f"Stored scene {sceneFilename} does not match the SHA-256 {sceneHash} it was submitted with" )
+
         enablePathMapping = self.deadlinePlugin.GetBooleanConfigEntryWithDefault( "EnablePathMapping", True )
         self.deadlinePlugin.LogInfo( "Enable Path Mapping: %s" % enablePathMapping )
         
@@ -374,15 +824,177 @@ class CopyCatProcess (ManagedProcess):
             
             # First, replace all TCL escapes ('\]') with '_TCL_ESCAPE_', then replace the '\' path separators with '/', and then swap back in the orignal TCL escapes.
             # This is so that we don't mess up any embedded TCL statements in the output path.
-            self.pathMappingWithFilePermissionFix( sceneFilename, self.TempSceneFilename, ("\\[","\\", "_TCL_ESCAPE_"), ("_TCL_ESCAPE_", "/", "\\[") )
+            if self.deadlinePlugin.GetBooleanConfigEntryWithDefault( "EnableSceneCache", True ):
+                # Retries and requeues reuse the scene mapped by an earlier task on this worker
+                self.TempSceneFilename = self.GetCachedMappedScene( sceneFilename )
+                self.TempSceneIsCopy = False
+            else:
+                self.pathMappingWithFilePermissionFix( sceneFilename, self.TempSceneFilename, ("\\[","\\", "_TCL_ESCAPE_"), ("_TCL_ESCAPE_", "/", "\\[") )
+                self.TempSceneIsCopy = True
         else:
             if SystemUtils.IsRunningOnWindows():
                 self.TempSceneFilename = sceneFilename.replace( "/", "\\" )
             else:
                 self.TempSceneFilename = sceneFilename.replace( "\\", "/" )        
+            self.TempSceneIsCopy = False
+
+        tracer.end( "scene path mapping" )
+
+        if self.deadlinePlugin.GetBooleanPluginInfoEntryWithDefault( "CacheDatasets", False ):
+            with tracer.phase( "dataset staging" ):
+                self.StageDatasets()
+
+        if self.deadlinePlugin.ResumeCheckpoint:
+            with tracer.phase( "resume checkpoint" ):
+                self.ConfigureResume()
+
+        knobs = self.deadlinePlugin.GetCopyCatNodeKnobs() or {}
+        try:
+            batchSize = int( knobs.get( "batchSize", 0 ) ) or None
+        except ValueError:
+            batchSize = None
+        self.TrainingProgress = CopyCatTraining.TrainingProgress( self.deadlinePlugin.WorldSize, batchSize )
+        self.LastTrainingOutput = time.time()
+        self.FrameDone = False
+        self.StartMetrics()
+        # Ends at the first training step, Nuke's startup, license checkout and CopyCat's own connection of the ranks
+        tracer.begin( "Nuke startup" )
+
+    def GetCachedMappedScene( self, sceneFilename ):
+        cacheDirectory = self.deadlinePlugin.GetConfigEntryWithDefault( "SceneCacheDirectory", "" ).strip()
+        if cacheDirectory == "":
+            cacheDirectory = os.path.join( tempfile.gettempdir(), "CopyCatSceneCache" )
+        maxEntries = self.deadlinePlugin.GetIntegerConfigEntryWithDefault( "SceneCacheMaxEntries", 20 )
+        maxAge = self.deadlinePlugin.GetIntegerConfigEntryWithDefault( "SceneCacheMaxAgeHours", 72 ) * 3600
+        cache = CopyCatCache.SceneCache( cacheDirectory, maxEntries, maxAge, log=self.deadlinePlugin.LogInfo )
+
+        # The active mapping rules are part of the key, as the mapped value of every path-like string in the script
+        pathValues = CopyCatScene.readPathStrings( CopyCatScene.readScriptLines( sceneFilename ) )
+        mappingFingerprint = "\n".join( RepositoryUtils.CheckPathMapping( value ) for value in pathValues )
+
+        def mapScene( inFileName, outFileName ):
+            # First, replace all TCL escapes ('\]') with '_TCL_ESCAPE_', then replace the '\' path separators with '/', and then swap back in the orignal TCL escapes.
+            self.pathMappingWithFilePermissionFix( inFileName, outFileName, ("\\[","\\", "_TCL_ESCAPE_"), ("_TCL_ESCAPE_", "/", "\\[") )
+
+        return cache.getMappedScene( sceneFilename, mappingFingerprint, mapScene )
+
+    def StageDatasets( self ):
+        """Copies the sequences read by the Read nodes feeding the CopyCat node to the worker's dataset cache,
+        and points those Read nodes in the temp scene at the local copies."""
+        cacheDirectory = self.deadlinePlugin.GetConfigEntryWithDefault( "DatasetCacheDirectory", "" ).strip()
+        if cacheDirectory == "":
+            self.deadlinePlugin.LogWarning( "Dataset caching is enabled for this job but the Dataset Cache Directory is not configured, reading from network storage" )
+            return
+        maxBytes = self.deadlinePlugin.GetIntegerConfigEntryWithDefault( "DatasetCacheSizeGB", 200 ) * 1e9
+
+        lines = CopyCatScene.readScriptLines( self.TempSceneFilename )
+        copycatNode = self.deadlinePlugin.GetPluginInfoEntry( "CopyCatNode" )
+        target = None
+        for node in CopyCatScene.readNodeGraph( lines ):
+            if node.Class == "CopyCat" and node.name() == copycatNode:
+                target = node
+                break
+        if target is None:
+            self.deadlinePlugin.LogWarning( f"CopyCat node {copycatNode} was not found in the Nuke script, datasets are not cached" )
+            return
+
+        # The staged sequences stay pinned in the cache until the task is finished
+        cache = self.DatasetCache = CopyCatCache.DatasetCache( cacheDirectory, maxBytes, log=self.deadlinePlugin.LogInfo )
+        changed = False
+        for readNode in CopyCatScene.findUpstreamNodes( target, "Read" ):
+            path = readNode.knob( "file", "" )
+            if path == "" or "[" in path or not os.path.isabs( path ):
+                self.deadlinePlugin.LogWarning( f"{readNode.name()} reads '{path}', only absolute paths without expressions are cached" )
+                continue
+            try:
+                first = int( readNode.knob( "first", "1" ) )
+                last = int( readNode.knob( "last", str(first) ) )
+                localPattern = cache.stageSequence( path, CopyCatScene.expandSequence( path, first, last ) )
+            except (IOError, OSError, ValueError) as e:
+                self.deadlinePlugin.LogWarning( f"Unable to cache {path} of {readNode.name()}: {e}" )
+                continue
+            if localPattern is None:
+                self.deadlinePlugin.LogWarning( f"No files found for {path} of {readNode.name()}" )
+                continue
+
+            fileLine = readNode.KnobLines["file"]
+            indent = lines[fileLine][:len(lines[fileLine]) - len(lines[fileLine].lstrip())]
+            lines[fileLine] = indent + 'file "' + localPattern.replace( "\\", "/" ) + '"'
+            changed = True
+
+        if not changed:
+            return
+        self.WriteTempScene( lines )
+        self.deadlinePlugin.LogInfo( "Temp scene points at the dataset cache" )
+
+    def ReleaseDatasets( self ):
+        """Lets the dataset cache evict the sequences this task trained on."""
+        if self.DatasetCache is not None:
+            self.DatasetCache.release()
+            self.DatasetCache = None
+
+    def ConfigureResume( self ):
+        """Points the CopyCat node of the temp scene at the checkpoint picked by rank 0."""
+        lines = CopyCatScene.readScriptLines( self.TempSceneFilename )
+        copycatNode = self.deadlinePlugin.GetPluginInfoEntry( "CopyCatNode" )
+        node = CopyCatScene.findNode( lines, copycatNode )
+        if node is None:
+            self.deadlinePlugin.FailRender( f"CopyCat node {copycatNode} was not found in the Nuke script, unable to resume from {self.deadlinePlugin.ResumeCheckpoint}" )
+        checkpoint = os.path.join( node.knob( "dataDirectory", "" ), self.deadlinePlugin.ResumeCheckpoint )
+        if not os.path.isfile( checkpoint ):
+            self.deadlinePlugin.FailRender( f"Checkpoint {checkpoint} picked by rank 0 is not readable on this worker" )
+
+        # Foundry doesn't document the knob for command line training, so it can be changed in the plugin configuration
+        knobName = self.deadlinePlugin.GetConfigEntryWithDefault( "ResumeCheckpointKnob", "checkpointFile" )
+        indent = lines[node.StartLine][:len(lines[node.StartLine]) - len(lines[node.StartLine].lstrip())] + " "
+        knobLine = indent + knobName + ' "' + checkpoint.replace( "\\", "/" ) + '"'
+        if knobName in node.KnobLines:
+            lines[node.KnobLines[knobName]] = knobLine
+        else:
+            lines.insert( node.EndLine, knobLine )
+        self.WriteTempScene( lines )
+        self.deadlinePlugin.LogInfo( f"Temp scene resumes from {checkpoint}" )
+
+    def StartMetrics( self ):
+        """Publishes this rank's metrics when the plugin configuration has a textfile directory or a port for them."""
+        textfileDirectory = self.deadlinePlugin.GetConfigEntryWithDefault( "MetricsTextfileDirectory", "" ).strip()
+        port = self.deadlinePlugin.GetIntegerConfigEntryWithDefault( "MetricsPort", 0 )
+        if textfileDirectory == "" and port <= 0:
+            return
+        plugin = self.deadlinePlugin
+        job = plugin.GetJob()
+        metrics = CopyCatMetrics.RankMetrics( job=job.JobId, job_name=job.JobName, rank=plugin.Rank, machine=plugin.GetSlaveName() )
+        textfile = None
+        if textfileDirectory != "":
+            textfile = os.path.join( RepositoryUtils.CheckPathMapping( textfileDirectory ), f"copycat_{job.JobId}_rank{plugin.Rank}.prom" )
+        # Ranks on the same machine each get their own port
+        if port > 0:
+            port += plugin.GetThreadNumber()
+        # The environment the rank's Nuke is started with, it finds the Nuke processes for memory and reads
+        processEnvironment = { "COPYCAT_MAIN_ADDR": str( plugin.MainMachineIp ), "COPYCAT_MAIN_PORT": str( plugin.MainPort ), "COPYCAT_RANK": str( plugin.Rank ) }
+        self.Metrics = CopyCatMetrics.MetricsExporter( metrics, textfile, port, processEnvironment,
+                                                       plugin.GetIntegerConfigEntryWithDefault( "MetricsInterval", CopyCatMetrics.METRICS_INTERVAL ), log=plugin.LogInfo )
+        self.Metrics.update( force=True, rank=plugin.Rank, world_size=plugin.WorldSize, rendezvous_wait_seconds=plugin.RendezvousSeconds )
+
+    def WriteTempScene( self, lines ):
+        if not self.TempSceneIsCopy:
+            # Never rewrite the original scene or the cached one, work on a copy in the task's temp directory
+            tempSceneDirectory = self.deadlinePlugin.CreateTempDirectory( "thread" + str(self.deadlinePlugin.GetThreadNumber()) )
+            self.TempSceneFilename = Path.Combine( tempSceneDirectory, Path.GetFileName( self.TempSceneFilename ) )
+            self.TempSceneIsCopy = True
+        with open( self.TempSceneFilename, "w", encoding="utf-8", errors="surrogateescape" ) as f:
+            f.write( "\n".join( lines ) + "\n" )
 
     def PostRenderTasks( self ):
-        if self.deadlinePlugin.GetBooleanConfigEntryWithDefault( "EnablePathMapping", True ):
+        if not self.BatchMode:
+            self.FinishTask()
+
+    def FinishTask( self ):
+        if self.Metrics is not None:
+            self.Metrics.close()
+            self.Metrics = None
+        self.ReleaseDatasets()
+        if self.TempSceneIsCopy:
             File.Delete( self.TempSceneFilename )
 
     ## Called by Deadline to get the render executable.
@@ -400,11 +1012,15 @@ class CopyCatProcess (ManagedProcess):
             self.deadlinePlugin.LogInfo( "An attempt will be made to render subsequent frames in the range if an error occurs" )
             renderarguments.append("--cont")    
 
-        renderarguments.append(f"-F 1") #dummy frame argument for CopyCat
+        if self.BatchMode:
+            # Nuke reads Python from stdin, CopyCatBatch trains the scene of each task
+            renderarguments.append("-t")
+        else:
+            renderarguments.append(f"-F 1") #dummy frame argument for CopyCat
 
-        copycatNode = self.deadlinePlugin.GetPluginInfoEntry("CopyCatNode")
-        renderarguments.append("-X") 
-        renderarguments.append(copycatNode) 
+            copycatNode = self.deadlinePlugin.GetPluginInfoEntry("CopyCatNode")
+            renderarguments.append("-X") 
+            renderarguments.append(copycatNode) 
               
         gpuOverrides = self.GetGpuOverrides()
             
@@ -418,7 +1034,8 @@ class CopyCatProcess (ManagedProcess):
         
         self.deadlinePlugin.SetProcessEnvironmentVariable( "EDDY_DEVICE_LIST", ",".join(gpuOverrides) )
         
-        renderarguments.append(self.TempSceneFilename)
+        if not self.BatchMode:
+            renderarguments.append(self.TempSceneFilename)
         renderarguments = ' '.join(renderarguments)
 
         return renderarguments
@@ -433,8 +1050,13 @@ class CopyCatProcess (ManagedProcess):
         if useSpecificGpu:
             gpusSelectDevices = self.deadlinePlugin.GetPluginInfoEntryWithDefault( "GpuOverride", "0"  )
         
-        # If the number of gpus per task is set, then need to calculate the gpus to use.
+        # With several ranks per worker every rank (concurrent task) gets its own GPU
         gpusPerTask = 0
+        if self.deadlinePlugin.GetIntegerPluginInfoEntryWithDefault( "RanksPerWorker", 1 ) > 1:
+            gpusPerTask = 1
+            if gpusSelectDevices != "":
+                self.deadlinePlugin.LogWarning( "GPU Override is ignored, the job runs one rank per GPU" )
+                gpusSelectDevices = ""
         resultGPUs = []
 
         if self.deadlinePlugin.OverrideGpuAffinity():
@@ -454,13 +1076,16 @@ class CopyCatProcess (ManagedProcess):
                 if len( resultGPUs ) == 0:
                     self.deadlinePlugin.FailRender( "The Worker does not have affinity for any of the GPUs specified in the job." )
             elif gpusPerTask > 0:
-                if gpusPerTask > len( overrideGPUs ):
-                    self.deadlinePlugin.LogWarning( "The Worker is overriding its GPU affinity and the Worker only has affinity for " + str( len( overrideGPUs ) ) + " Workers of the " + str( gpusPerTask ) + " requested." )
-                    resultGPUs = overrideGPUs
-                else:
-                    resultGPUs = list( overrideGPUs )[:gpusPerTask]
+                # Each thread takes its own share of the GPUs the Worker has affinity for
+                firstGpu = self.deadlinePlugin.GetThreadNumber() * gpusPerTask
+                resultGPUs = list( overrideGPUs )[firstGpu:firstGpu + gpusPerTask]
+                if len( resultGPUs ) == 0:
+                    self.deadlinePlugin.FailRender( "The Worker only has affinity for " + str( len( overrideGPUs ) ) + " GPUs, not enough for local rank " + str( self.deadlinePlugin.GetThreadNumber() ) + "." )
             else:
                 resultGPUs = overrideGPUs
+        elif self.deadlinePlugin.RankManifestEntry is not None and self.deadlinePlugin.RankManifestEntry.get( "Gpus" ):
+            # Checked by the submitter, no two ranks of this machine share a GPU
+            resultGPUs = self.deadlinePlugin.RankManifestEntry["Gpus"]
         elif gpusPerTask == 0 and gpusSelectDevices != "":
             resultGPUs = gpusSelectDevices.split( "," )
 
@@ -477,27 +1102,66 @@ class CopyCatProcess (ManagedProcess):
         
         return resultGPUs
     
-    def HandleError( self ):
+    def HandleLine( self ):
+        line = self.GetRegexMatch( 0 )
+        kinds = CopyCatLog.classifyLine( line )
+        if kinds is None:
+            return
+        if CopyCatLog.ERROR in kinds:
+            self.HandleError( line )
+        if CopyCatLog.READY in kinds:
+            self.HandleReadyForInput()
+        if CopyCatLog.FRAME in kinds:
+            self.HandleProgress( line, kinds.Frame, kinds.FrameCount )
+        if CopyCatLog.TRAINING in kinds:
+            self.HandleTrainingProgress( line )
+        if CopyCatLog.LICENSE in kinds:
+            self.deadlinePlugin.Tracer.instant( "license", Line=line[:200] )
+
+    def HandleError( self, line ):
         if( not self.deadlinePlugin.GetBooleanPluginInfoEntryWithDefault( "ContinueOnError", False ) ):
-            self.deadlinePlugin.FailRender( self.GetRegexMatch( 0 ) )
+            self.deadlinePlugin.FailRender( line )
         else:
             self.deadlinePlugin.LogWarning( "Skipping error detection as 'Continue On Error' is enabled." )
 
-    def HandleProgress( self ):
-        currFrame = int( self.GetRegexMatch( 1 ) )
-        totalFrames = int( self.GetRegexMatch( 2 ) )
+    def HandleProgress( self, line, currFrame, totalFrames ):
         if totalFrames != 0:
             self.deadlinePlugin.SetProgress( ( float(currFrame) / float(totalFrames) ) * 100.0 )
-        self.deadlinePlugin.SetStatusMessage( self.GetRegexMatch( 0 ) )
+        self.FrameDone = currFrame >= totalFrames
+        self.deadlinePlugin.SetStatusMessage( line )
+
+    def HandleTrainingProgress( self, line ):
+        if self.TrainingProgress is None or not self.TrainingProgress.parseLine( line ):
+            return
+        self.LastTrainingOutput = time.time()
+        tracer = self.deadlinePlugin.Tracer
+        if tracer.isOpen( "Nuke startup" ) and self.TrainingProgress.step is not None:
+            tracer.end( "Nuke startup" )
+            tracer.instant( CopyCatTrace.FIRST_STEP, Step=self.TrainingProgress.step )
+            self.deadlinePlugin.WriteTrace()
+        if self.Metrics is not None:
+            self.Metrics.update( self.TrainingProgress )
+        # CopyCat can print every step, the task is updated at most once a second
+        now = time.time()
+        if now - self.LastTrainingUpdate < 1.0:
+            return
+        self.LastTrainingUpdate = now
+        progress = self.TrainingProgress.progress()
+        if progress is not None:
+            self.deadlinePlugin.SetProgress( progress )
+        self.deadlinePlugin.SetStatusMessage( self.TrainingProgress.statusMessage() )
     
     def HandleReadyForInput( self ):
-        self.ReadyForInput = True
+        self.ReadyForInput.set()
     
     def IsReadyForInput( self ):
-        return self.ReadyForInput
+        return self.ReadyForInput.is_set()
+
+    def WaitForReadyForInput( self, timeout ):
+        return self.ReadyForInput.wait( timeout )
     
     def ResetReadyForInput( self ):
-        self.ReadyForInput = False
+        self.ReadyForInput.clear()
     
     def ReadyForInputCommand( self ):
         return "print( \"READY FOR INPUT\\n\" )"
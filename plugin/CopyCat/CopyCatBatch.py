@@ -0,0 +1,53 @@
+"""
+Runs inside the warm Nuke of a batch mode CopyCat job.
+
+The plugin starts Nuke once per job on a Worker thread (`Nuke -t`) and sends it one line of Python
+per task, `CopyCatBatch.train({...})`. Every task gets its own COPYCAT_* environment, opens its
+(path mapped) scene, trains the CopyCat node and clears the script again, so the next task starts
+from an empty Nuke without paying for startup, plugin scanning and license checkout again.
+
+Deadline ends the plugin's processes when a Worker leaves the job, so the warm Nuke does not outlive
+its job. Each rank is one task, which makes the tasks a thread trains here its retries and requeues.
+"""
+
+from __future__ import absolute_import
+import os
+import traceback
+
+import nuke
+
+_originalEnvironment = {}
+
+def _setEnvironment(environment):
+    for name, value in environment.items():
+        if name not in _originalEnvironment:
+            _originalEnvironment[name] = os.environ.get(name)
+        os.environ[name] = str(value)
+
+def reset():
+    """Clears the script and puts back the environment Nuke was started with."""
+    nuke.scriptClear()
+    for name, value in _originalEnvironment.items():
+        if value is None:
+            os.environ.pop(name, None)
+        else:
+            os.environ[name] = value
+    _originalEnvironment.clear()
+
+def train(task):
+    """Trains the CopyCat node of a task, task has SceneFile, CopyCatNode and Environment."""
+    try:
+        _setEnvironment(task.get("Environment", {}))
+        nuke.scriptClear()
+        nuke.scriptOpen(task["SceneFile"])
+        node = nuke.toNode(task["CopyCatNode"])
+        if node is None:
+            raise ValueError(f"CopyCat node {task['CopyCatNode']} was not found in {task['SceneFile']}")
+        print(f"Training {task['CopyCatNode']} of {task['SceneFile']} in the warm Nuke")
+        # Same as -X node -F 1 on the command line
+        nuke.execute(node, 1, 1)
+    except Exception:
+        # The plugin's stdout handler fails the task on this
+        print("ERROR: CopyCat training failed:\n" + traceback.format_exc())
+    finally:
+        reset()
@@ -0,0 +1,368 @@
+"""
+Caches used by the CopyCat plugin and submitter.
+
+DatasetCache keeps copies of the training sequences on a local disk so the ranks don't read the
+same frames from network storage on every epoch. Each sequence is stored under a key built from
+the path, size and modification time of its files, so a changed source gets a new entry. The
+least recently used entries are evicted once the cache grows over its size limit, except the ones
+a task on the worker has pinned because it is still training on them.
+
+SceneCache keeps the path mapped copies of Nuke scripts, keyed by the hash of the source script
+and of the mapping applied to it, so retries and requeues don't map the same script again.
+
+SceneStore is shared storage the submitter puts Nuke scripts in by the SHA-256 of their content,
+so resubmitting an unchanged script references the copy that is already there instead of sending
+the same bytes with every job. The copies keep the script's folder as their project directory.
+Jobs keep using their entry, nothing is ever evicted.
+"""
+
+from __future__ import absolute_import
+import os
+import json
+import time
+import errno
+import shutil
+import hashlib
+import threading
+import contextlib
+
+# Held locks and pins are touched every LOCK_HEARTBEAT_SECONDS, one that wasn't touched for
+# LOCK_STALE_SECONDS was left by a task that was killed
+LOCK_HEARTBEAT_SECONDS = 30
+LOCK_STALE_SECONDS = 300
+LOCK_TIMEOUT_SECONDS = 3600
+LOCK_POLL_SECONDS = 0.5
+_COMPLETE_MARKER = ".complete"
+_INDEX_FILE = "index.json"
+_PIN_SUFFIX = ".pin"
+
+class _Heartbeat(object):
+    """Touches a set of files every LOCK_HEARTBEAT_SECONDS until it is stopped."""
+
+    def __init__(self, paths=()):
+        self.paths = list(paths)
+        self._stop = threading.Event()
+        thread = threading.Thread(target=self._beat, name="CopyCatCacheHeartbeat")
+        thread.daemon = True
+        thread.start()
+
+    def _beat(self):
+        while not self._stop.wait(LOCK_HEARTBEAT_SECONDS):
+            for path in list(self.paths):
+                try:
+                    os.utime(path, None)
+                except OSError:
+                    pass
+
+    def stop(self):
+        self._stop.set()
+
+def _isStale(path):
+    try:
+        return time.time() - os.path.getmtime(path) > LOCK_STALE_SECONDS
+    except OSError:
+        return False
+
+@contextlib.contextmanager
+def fileLock(path, timeout=LOCK_TIMEOUT_SECONDS):
+    """Exclusive lock shared by every process on the worker (concurrent tasks use the same cache).
+
+    The lock is touched while it is held, so staging a large sequence never makes it look stale.
+    """
+    deadline = time.time() + timeout
+    while True:
+        try:
+            handle = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            os.write(handle, str(os.getpid()).encode())
+            os.close(handle)
+            break
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                raise
+            try:
+                # A task that was killed while holding the lock leaves it behind
+                if time.time() - os.path.getmtime(path) > LOCK_STALE_SECONDS:
+                    os.remove(path)
+                    continue
+            except OSError:
+                continue
+            if time.time() >= deadline:
+                raise
+            time.sleep(LOCK_POLL_SECONDS)
+    heartbeat = _Heartbeat([path])
+    try:
+        yield
+    finally:
+        heartbeat.stop()
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+def fileDigest(path):
+    """SHA-256 of the file's content."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+class DatasetCache(object):
+    def __init__(self, root, maxBytes, log=print):
+        self.root = root
+        self.maxBytes = maxBytes
+        self.log = log
+        self._pins = None # type: _Heartbeat
+        os.makedirs(root, exist_ok=True)
+
+    def _entryDirectory(self, key):
+        return os.path.join(self.root, key[:2], key)
+
+    def _loadIndex(self):
+        try:
+            with open(os.path.join(self.root, _INDEX_FILE), "r") as f:
+                return json.load(f)
+        except (IOError, OSError, ValueError):
+            return {}
+
+    def _saveIndex(self, index):
+        indexFile = os.path.join(self.root, _INDEX_FILE)
+        with open(indexFile + ".tmp", "w") as f:
+            json.dump(index, f)
+        os.replace(indexFile + ".tmp", indexFile)
+
+    def sequenceKey(self, pattern, files):
+        """Key of a sequence built from its pattern and the size and mtime of every frame."""
+        digest = hashlib.sha1(pattern.encode("utf-8"))
+        for path in files:
+            stat = os.stat(path)
+            digest.update(f"\0{os.path.basename(path)}\0{stat.st_size}\0{stat.st_mtime_ns}".encode("utf-8"))
+        return digest.hexdigest()
+
+    def stageSequence(self, pattern, files):
+        """Copies the existing frames of a sequence into the cache, returns the local pattern to read from."""
+        files = [path for path in files if os.path.isfile(path)]
+        if not files:
+            return None
+
+        key = self.sequenceKey(pattern, files)
+        directory = self._entryDirectory(key)
+        localPattern = os.path.join(directory, os.path.basename(pattern))
+
+        with fileLock(os.path.join(self.root, key + ".lock")):
+            if os.path.exists(os.path.join(directory, _COMPLETE_MARKER)):
+                self.log(f"Dataset cache hit for {pattern}")
+            else:
+                start = time.time()
+                shutil.rmtree(directory, ignore_errors=True)
+                os.makedirs(directory)
+                size = 0
+                for path in files:
+                    target = os.path.join(directory, os.path.basename(path))
+                    shutil.copyfile(path, target + ".part")
+                    os.replace(target + ".part", target)
+                    size += os.path.getsize(target)
+                open(os.path.join(directory, _COMPLETE_MARKER), "w").close()
+                self.log(f"Dataset cache staged {len(files)} files ({size / 1e6:.1f} MB) of {pattern} in {time.time() - start:.1f} s")
+            # Pinned before the lock is released, so no other task can evict it in between
+            self._pin(key)
+
+        self._touch(key, directory)
+        return localPattern
+
+    def _pin(self, key):
+        pinFile = os.path.join(self.root, f"{key}.{os.getpid()}_{id(self)}{_PIN_SUFFIX}")
+        open(pinFile, "w").close()
+        if self._pins is None:
+            self._pins = _Heartbeat()
+        self._pins.paths.append(pinFile)
+
+    def release(self):
+        """Unpins the entries staged through this cache, call it once training on them is done."""
+        if self._pins is None:
+            return
+        self._pins.stop()
+        for pinFile in self._pins.paths:
+            try:
+                os.remove(pinFile)
+            except OSError:
+                pass
+        self._pins = None
+
+    def _isPinned(self, key):
+        pinned = False
+        for name in os.listdir(self.root):
+            if name.startswith(key + ".") and name.endswith(_PIN_SUFFIX):
+                pinFile = os.path.join(self.root, name)
+                if _isStale(pinFile):
+                    # Left by a task that was killed while training
+                    try:
+                        os.remove(pinFile)
+                    except OSError:
+                        pass
+                else:
+                    pinned = True
+        return pinned
+
+    def _touch(self, key, directory):
+        with fileLock(os.path.join(self.root, _INDEX_FILE + ".lock")):
+            index = self._loadIndex()
+            if key not in index:
+                index[key] = {"Size": sum(os.path.getsize(os.path.join(directory, name)) for name in os.listdir(directory))}
+            index[key]["LastUsed"] = time.time()
+            self._evict(index, keep=key)
+            self._saveIndex(index)
+
+    def _evict(self, index, keep):
+        total = sum(entry["Size"] for entry in index.values())
+        for key in sorted(index, key=lambda key: index[key]["LastUsed"]):
+            if total <= self.maxBytes:
+                break
+            if key == keep:
+                continue
+            # Skip entries another task is staging right now, a task stages and pins under this lock
+            try:
+                with fileLock(os.path.join(self.root, key + ".lock"), timeout=0):
+                    if self._isPinned(key):
+                        continue
+                    self.log(f"Dataset cache evicting {key} ({index[key]['Size'] / 1e6:.1f} MB)")
+                    shutil.rmtree(self._entryDirectory(key), ignore_errors=True)
+            except OSError:
+                continue
+            total -= index[key]["Size"]
+            del index[key]
+
+class SceneCache(object):
+    def __init__(self, root, maxEntries, maxAgeSeconds, log=print):
+        self.root = root
+        self.maxEntries = maxEntries
+        self.maxAgeSeconds = maxAgeSeconds
+        self.log = log
+        os.makedirs(root, exist_ok=True)
+
+    def sceneKey(self, sceneFile, mappingFingerprint):
+        digest = hashlib.sha1(mappingFingerprint.encode("utf-8"))
+        with open(sceneFile, "rb") as f:
+            for block in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(block)
+        return digest.hexdigest()
+
+    def getMappedScene(self, sceneFile, mappingFingerprint, mapScene):
+        """Returns the cached mapped copy of sceneFile, calling mapScene(inFile, outFile) to create it when missing."""
+        key = self.sceneKey(sceneFile, mappingFingerprint)
+        directory = os.path.join(self.root, key)
+        mappedScene = os.path.join(directory, os.path.basename(sceneFile))
+
+        with fileLock(os.path.join(self.root, key + ".lock")):
+            if os.path.exists(mappedScene):
+                self.log(f"Using cached path mapped scene {mappedScene}")
+                os.utime(directory, None)
+            else:
+                os.makedirs(directory, exist_ok=True)
+                start = time.time()
+                mapScene(sceneFile, mappedScene + ".part")
+                os.replace(mappedScene + ".part", mappedScene)
+                self.log(f"Path mapped scene cached as {mappedScene} in {time.time() - start:.1f} s")
+
+        self.evict(keep=key)
+        return mappedScene
+
+    def evict(self, keep):
+        entries = []
+        for name in os.listdir(self.root):
+            path = os.path.join(self.root, name)
+            if name != keep and os.path.isdir(path) and not os.path.exists(path + ".lock"):
+                entries.append((os.path.getmtime(path), path))
+        entries.sort(reverse=True)
+
+        now = time.time()
+        # The entry in use is not in the list, so keep one less than the limit
+        for index, (lastUsed, path) in enumerate(entries):
+            if index >= self.maxEntries - 1 or now - lastUsed > self.maxAgeSeconds:
+                self.log(f"Removing stale path mapped scene {path}")
+                shutil.rmtree(path, ignore_errors=True)
+
+def _isAbsoluteProjectDirectory(value):
+    value = value.strip().strip('"').strip("{}").strip()
+    # An expression like [python {nuke.script_directory()}] would follow the script into the store
+    return "[" not in value and (value.startswith("/") or value.startswith("\\\\") or value[1:3] in (":/", ":\\"))
+
+def pinnedSceneBlocks(sceneFile, projectDirectory):
+    """The script's content with a project directory that isn't an absolute path replaced by projectDirectory.
+
+    Relative Read/Write paths resolve against the project directory, so they keep pointing next to
+    the original script when Nuke opens the copy somewhere else.
+    """
+    pinned = ' project_directory "%s"\n' % projectDirectory.replace("\\", "/").replace('"', '\\"').replace("[", "\\[")
+    with open(sceneFile, "rb") as f:
+        inRoot = False
+        for line in f:
+            text = line.decode("utf-8", "surrogateescape")
+            if not inRoot:
+                yield line
+                inRoot = text.strip() == "Root {"
+                continue
+            if text.rstrip() == "}":
+                if pinned:
+                    yield pinned.encode("utf-8", "surrogateescape")
+                yield line
+                break
+            if text.startswith(" project_directory "):
+                # An absolute project directory is kept, anything else is replaced at the end of Root
+                if _isAbsoluteProjectDirectory(text[len(" project_directory "):]):
+                    yield line
+                    pinned = None
+                continue
+            yield line
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            yield block
+
+class SceneStore(object):
+    def __init__(self, root, log=print):
+        self.root = root
+        self.log = log
+
+    def scenePath(self, digest, name):
+        # The script keeps its name, Nuke and the plugin's temp copies still show it
+        return os.path.join(self.root, digest[:2], digest, name)
+
+    def addScene(self, sceneFile):
+        """Returns the stored copy of sceneFile and its digest, copying it only when the store doesn't hold that content yet.
+
+        The copy's project directory is pinned to the script's own directory (see pinnedSceneBlocks),
+        so the digest covers that directory too.
+        """
+        projectDirectory = os.path.dirname(os.path.abspath(sceneFile))
+        digest = hashlib.sha256()
+        size = 0
+        for block in pinnedSceneBlocks(sceneFile, projectDirectory):
+            digest.update(block)
+            size += len(block)
+        digest = digest.hexdigest()
+        storedScene = self.scenePath(digest, os.path.basename(sceneFile))
+        def isStored():
+            return os.path.isfile(storedScene) and os.path.getsize(storedScene) == size
+        if isStored():
+            self.log(f"Scene already stored as {storedScene}")
+            return storedScene, digest
+
+        os.makedirs(os.path.dirname(storedScene), exist_ok=True)
+        with fileLock(os.path.join(os.path.dirname(storedScene), ".lock")):
+            # Another submission may have stored it meanwhile, a copy of the wrong size is replaced
+            if not isStored():
+                start = time.time()
+                with open(storedScene + ".part", "wb") as f:
+                    for block in pinnedSceneBlocks(sceneFile, projectDirectory):
+                        f.write(block)
+                # The script may have been saved again while it was hashed
+                if fileDigest(storedScene + ".part") != digest:
+                    os.remove(storedScene + ".part")
+                    raise IOError(f"{sceneFile} changed while it was copied to the scene store")
+                os.replace(storedScene + ".part", storedScene)
+                self.log(f"Scene stored as {storedScene} ({os.path.getsize(storedScene) / 1e6:.1f} MB in {time.time() - start:.1f} s)")
+        return storedScene, digest
+
+    @staticmethod
+    def verifyScene(sceneFile, digest):
+        """True when the scene still has the content it was stored with."""
+        return fileDigest(sceneFile) == digest.strip().lower()
@@ -0,0 +1,107 @@
+"""
+Picks the network interface a CopyCat rank trains on (COPYCAT_LOCAL_ADDR).
+
+Workers often have a slow management NIC next to the training fabric. Instead of the interface
+with the default route, the rank uses the fastest interface that reaches the main machine:
+the one that owns the main address on the main machine, otherwise the fastest one on the main
+address's subnet, otherwise the one the OS routes to the main address. A preference from the job
+(an interface name, an address or a subnet such as 10.20.0.0/16) narrows the choice first.
+"""
+
+from __future__ import absolute_import
+import socket
+import ipaddress
+import collections
+
+# Speed is in bits per second, 0 or less when the OS doesn't report it
+Interface = collections.namedtuple("Interface", ["Name", "Address", "PrefixLength", "Speed"])
+
+class InterfaceError(Exception):
+    pass
+
+def _address(value):
+    # IPv6 link local addresses come with a scope, "fe80::1%eth0"
+    return ipaddress.ip_address(str(value).split("%")[0].strip("[]"))
+
+def sameAddress(first, second):
+    try:
+        return _address(first) == _address(second)
+    except ValueError:
+        return str(first) == str(second)
+
+def _network(interface):
+    return ipaddress.ip_network(f"{_address(interface.Address)}/{interface.PrefixLength}", strict=False)
+
+def formatSpeed(speed):
+    if speed is None or speed <= 0:
+        return "unknown speed"
+    if speed >= 1e9:
+        return f"{speed / 1e9:g} Gb/s"
+    return f"{speed / 1e6:g} Mb/s"
+
+def describe(interface):
+    return f"{interface.Name} {interface.Address}/{interface.PrefixLength} ({formatSpeed(interface.Speed)})"
+
+def matchesPreference(interface, preference):
+    """preference is an interface name, an address or a subnet."""
+    preference = preference.strip()
+    if interface.Name.lower() == preference.lower():
+        return True
+    try:
+        if "/" in preference:
+            network = ipaddress.ip_network(preference, strict=False)
+            address = _address(interface.Address)
+            return address.version == network.version and address in network
+        return _address(interface.Address) == _address(preference)
+    except ValueError:
+        return False
+
+def routedAddress(destination, port=9):
+    """Local address the OS routes to destination through. Connecting a UDP socket sends nothing."""
+    try:
+        address = _address(destination)
+        family = socket.AF_INET6 if address.version == 6 else socket.AF_INET
+        s = socket.socket(family, socket.SOCK_DGRAM)
+        try:
+            s.connect((str(address), port))
+            return s.getsockname()[0]
+        finally:
+            s.close()
+    except (OSError, ValueError):
+        return None
+
+def chooseInterface(interfaces, mainAddress, preference="", routed=None):
+    # type: (list, str, str, str) -> tuple
+    """Returns (interface, reason). Raises InterfaceError when no interface is left.
+
+    interfaces are the up, non loopback interfaces of the address family, routed is the local
+    address of the route to the main address when known.
+    """
+    candidates = list(interfaces)
+    if preference:
+        candidates = [interface for interface in candidates if any(matchesPreference(interface, item) for item in preference.split(","))]
+        if not candidates:
+            raise InterfaceError(f"No interface matches {preference}, this machine has: {', '.join(describe(interface) for interface in interfaces) or 'none'}")
+    if not candidates:
+        raise InterfaceError("This machine has no network interface that is up")
+
+    def fastest(items):
+        # Interfaces of the same speed keep the OS order
+        return max(items, key=lambda interface: interface.Speed or 0)
+
+    try:
+        main = _address(mainAddress)
+    except ValueError:
+        main = None
+    if main is not None:
+        for interface in candidates:
+            if _address(interface.Address) == main:
+                return interface, "it has the main address"
+        sameSubnet = [interface for interface in candidates if _address(interface.Address).version == main.version and main in _network(interface)]
+        if sameSubnet:
+            return fastest(sameSubnet), f"fastest of {len(sameSubnet)} on the subnet of {mainAddress}"
+    if routed:
+        for interface in candidates:
+            if _address(interface.Address) == _address(routed):
+                return interface, f"the route to {mainAddress} goes through it"
+    return fastest(candidates), f"fastest interface, none is on the subnet of or routes to {mainAddress}"
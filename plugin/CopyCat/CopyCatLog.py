@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+Classifier for the lines Nuke and CopyCat write while training.
+
+The errors, progress, readiness and training lines are one regex with an alternative per kind of
+line. The plugin registers it as its only stdout handler, so Deadline looks at each line once
+instead of once per handler, and the handler finds out which kinds the line has in one more pass.
+The classifier has no Deadline dependencies, `python CopyCatLog.py --benchmark nuke.log` compares
+it with the original plugin's separate handlers on a recorded log.
+"""
+
+from __future__ import absolute_import
+import re
+import sys
+import time
+import random
+import argparse
+
+ERROR = "error"
+READY = "ready"
+FRAME = "frame"
+TRAINING = "training"
+LICENSE = "license"
+
+# A line can be of several kinds, the plugin handles errors first
+_ALTERNATIVES = (
+    (ERROR, r"ERROR:|Error ?:|Eddy\[ERROR\]"),
+    (READY, r"READY FOR INPUT"),
+    (FRAME, r"Frame [0-9]+ \((?P<frameNumber>[0-9]+) of (?P<frameCount>[0-9]+)\)"),
+    (TRAINING, r"(?i:\b(?:step|epoch|loss)\b)"),
+    (LICENSE, r"(?i:\blicen[sc]e)"),
+)
+LINE_PATTERN = "|".join(f"(?P<{kind}>{pattern})" for kind, pattern in _ALTERNATIVES)
+_LINE = re.compile(LINE_PATTERN)
+
+# The same regex for the .NET stdout handler, which matches the whole line so GetRegexMatch( 0 ) is the line.
+# .NET writes named groups as (?<name>), the groups are not needed there so they are dropped.
+HANDLER_PATTERN = "^.*?(?:" + re.sub(r"\(\?P<\w+>", "(?:", LINE_PATTERN) + ").*$"
+
+# The handlers of the original plugin, for the benchmark. They don't look for training and license
+# lines, which the combined handler does on top.
+BASELINE_HANDLER_PATTERNS = (
+    "READY FOR INPUT",
+    ".*ERROR:.*",
+    ".*Error:.*",
+    ".*Error :.*",
+    "Eddy\\[ERROR\\]",
+    "Frame [0-9]+ \\(([0-9]+) of ([0-9]+)\\)",
+)
+
+class LineKinds(object):
+    """What a line is, Frame and FrameCount are set for frame lines."""
+    __slots__ = ("Kinds", "Frame", "FrameCount")
+
+    def __init__(self):
+        self.Kinds = set()
+        self.Frame = None
+        self.FrameCount = None
+
+    def __contains__(self, kind):
+        return kind in self.Kinds
+
+def classifyLine(line):
+    """Returns the kinds of the line, None for the lines nothing is interested in (almost all of them)."""
+    result = None
+    for match in _LINE.finditer(line):
+        if result is None:
+            result = LineKinds()
+        # The kind's group closes after the groups inside it, so it's the last group
+        kind = match.lastgroup
+        result.Kinds.add(kind)
+        if kind == FRAME:
+            result.Frame = int(match.group("frameNumber"))
+            result.FrameCount = int(match.group("frameCount"))
+    return result
+
+_SAMPLE_LINES = (
+    "[12:01:33.120] Eddy[INFO] - Allocating device buffers for 4 inputs",
+    "[12:01:33.121] CopyCat: dataset sample 312 of 4096 loaded in 0.004 s",
+    "[12:01:33.122] Timing: forward 12.1 ms, backward 25.3 ms, allreduce 3.2 ms",
+    "[12:01:33.125] CopyCat: Step 1200/10000, Loss: 0.01234, lr 0.0001",
+    "[12:01:33.130] CopyCat: Epoch 3 of 20",
+    "Frame 1 (1 of 1)",
+    "READY FOR INPUT",
+)
+
+def sampleLog(count=200000, seed=1):
+    """A made up -V 2 log for when no recorded one is at hand, one line in a hundred is a progress line."""
+    generator = random.Random(seed)
+    lines = []
+    for index in range(count):
+        if index % 100 == 0:
+            lines.append(generator.choice(_SAMPLE_LINES[3:]))
+        else:
+            lines.append(generator.choice(_SAMPLE_LINES[:3]))
+    return lines
+
+def _runSeparate(lines, patterns):
+    found = 0
+    for line in lines:
+        for pattern in patterns:
+            if pattern.search(line):
+                found += 1
+    return found
+
+def _runCombined(lines, handler):
+    found = 0
+    for line in lines:
+        if handler.search(line) and classifyLine(line):
+            found += 1
+    return found
+
+def benchmark(lines, repeat=3):
+    """Lines per second of the original separate handlers and of the combined one, best of repeat runs."""
+    separate = [re.compile(pattern) for pattern in BASELINE_HANDLER_PATTERNS]
+    handler = re.compile(HANDLER_PATTERN)
+    results = {}
+    for name, run, argument in (("separate", _runSeparate, separate), ("combined", _runCombined, handler)):
+        best = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            run(lines, argument)
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        results[name] = len(lines) / best if best else float("inf")
+    return results
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Classify CopyCat output, or benchmark the classifier.")
+    parser.add_argument("logs", nargs="*", help="recorded Nuke/CopyCat logs")
+    parser.add_argument("--benchmark", action="store_true", help="compare lines per second of the original separate handlers and the combined one")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    lines = []
+    for path in args.logs:
+        with open(path, "r", errors="replace") as f:
+            lines.extend(line.rstrip("\n") for line in f)
+
+    if args.benchmark:
+        if not lines:
+            lines = sampleLog()
+            print(f"No log given, using {len(lines)} made up lines")
+        results = benchmark(lines, args.repeat)
+        print(f"{len(lines)} lines")
+        print(f"Original handlers: {results['separate']:,.0f} lines/s")
+        print(f"Combined handler:  {results['combined']:,.0f} lines/s ({results['combined'] / results['separate']:.1f}x)")
+        return 0
+
+    for line in lines:
+        kinds = classifyLine(line)
+        if kinds:
+            print(f"{','.join(sorted(kinds.Kinds))}: {line}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
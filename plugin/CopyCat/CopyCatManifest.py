@@ -0,0 +1,131 @@
+"""
+Rank manifest of a CopyCat job.
+
+The submitter decides every rank once, which machine and local rank (Worker thread) runs it with
+the main address and port, the GPUs and the interface, and sends it with
+the job as an auxiliary file. The plugin looks its rank up by machine name and thread number
+instead of deriving it from TrainingSlaves, and fails the task when the manifest doesn't add up.
+No Deadline dependencies, the submitter uses it too.
+"""
+
+from __future__ import absolute_import
+import os
+import json
+import ipaddress
+import collections
+
+MANIFEST_VERSION = 1
+
+class ManifestError(Exception):
+    pass
+
+def normalizeMachine(name):
+    return str(name).strip().lower()
+
+def buildManifest(machines, mainAddress, port, ranksPerWorker=1, gpus=None, interface=""):
+    # type: (list, str, int, int, callable, str) -> dict
+    """machines are in rank order with the main machine first, gpus(machine, localRank) gives a rank's GPUs."""
+    ranks = []
+    for machine in machines:
+        for localRank in range(ranksPerWorker):
+            ranks.append({"Rank": len(ranks), "Machine": str(machine).strip(), "LocalRank": localRank,
+                          "Gpus": [str(gpu) for gpu in gpus(machine, localRank)] if gpus else [],
+                          "Interface": interface})
+    return {"Version": MANIFEST_VERSION, "WorldSize": len(ranks), "MainMachine": str(machines[0]).strip() if machines else "",
+            "MainAddress": str(mainAddress), "Port": int(port), "RanksPerWorker": ranksPerWorker, "Ranks": ranks}
+
+def _isAddress(value):
+    try:
+        ipaddress.ip_address(str(value).split("%")[0])
+        return True
+    except ValueError:
+        return False
+
+def validateManifest(manifest):
+    # type: (dict) -> list
+    """Everything wrong with the manifest, empty when ranks, machines and GPUs add up."""
+    if manifest.get("Version") != MANIFEST_VERSION:
+        return [f"manifest version {manifest.get('Version')} is not supported, this plugin reads version {MANIFEST_VERSION}"]
+    ranks = manifest.get("Ranks") or []
+    if not ranks:
+        return ["the manifest has no ranks"]
+
+    problems = []
+    worldSize = manifest.get("WorldSize")
+    if worldSize != len(ranks):
+        problems.append(f"world size {worldSize} but {len(ranks)} ranks")
+    numbers = sorted(entry.get("Rank") for entry in ranks if isinstance(entry.get("Rank"), int))
+    if numbers != list(range(len(ranks))):
+        duplicates = sorted(number for number, count in collections.Counter(numbers).items() if count > 1)
+        missing = sorted(set(range(len(ranks))) - set(numbers))
+        problems.append(f"ranks are not numbered 0 to {len(ranks) - 1} once each (duplicates {duplicates or 'none'}, missing {missing or 'none'})")
+    if not _isAddress(manifest.get("MainAddress", "")):
+        problems.append(f"main address {manifest.get('MainAddress')!r} is not an IP address")
+    if not isinstance(manifest.get("Port"), int) or not 0 < manifest["Port"] < 65535:
+        problems.append(f"port {manifest.get('Port')!r} is not a usable port, the rendezvous uses the next one")
+
+    ranksPerWorker = manifest.get("RanksPerWorker", 1)
+    slots = {}
+    gpus = {}
+    for entry in ranks:
+        machine = normalizeMachine(entry.get("Machine", ""))
+        if machine == "":
+            problems.append(f"rank {entry.get('Rank')} has no machine")
+            continue
+        localRank = entry.get("LocalRank")
+        if not isinstance(localRank, int) or not 0 <= localRank < ranksPerWorker:
+            problems.append(f"rank {entry.get('Rank')} on {machine} has local rank {localRank!r}, the job runs {ranksPerWorker} per machine")
+        if (machine, localRank) in slots:
+            problems.append(f"ranks {slots[(machine, localRank)]} and {entry.get('Rank')} are both {machine} thread {localRank}")
+        slots[(machine, localRank)] = entry.get("Rank")
+        for gpu in entry.get("Gpus", []):
+            if (machine, gpu) in gpus:
+                problems.append(f"ranks {gpus[(machine, gpu)]} and {entry.get('Rank')} share GPU {gpu} of {machine}")
+            gpus[(machine, gpu)] = entry.get("Rank")
+
+    first = next((entry for entry in ranks if entry.get("Rank") == 0), None)
+    if first is not None and normalizeMachine(first.get("Machine", "")) != normalizeMachine(manifest.get("MainMachine", "")):
+        problems.append(f"rank 0 is on {first.get('Machine')}, not on the main machine {manifest.get('MainMachine')}")
+    return problems
+
+class RankManifest(object):
+    """A validated manifest with its ranks indexed by machine and local rank."""
+
+    def __init__(self, manifest):
+        problems = validateManifest(manifest)
+        if problems:
+            raise ManifestError("; ".join(problems))
+        self.manifest = manifest
+        self.WorldSize = manifest["WorldSize"]
+        self.MainMachine = manifest["MainMachine"]
+        self.MainAddress = manifest["MainAddress"]
+        self.Port = manifest["Port"]
+        self._ranks = dict(((normalizeMachine(entry["Machine"]), entry["LocalRank"]), entry) for entry in manifest["Ranks"])
+
+    def machines(self):
+        """Machines in rank order."""
+        machines = []
+        for entry in sorted(self.manifest["Ranks"], key=lambda entry: entry["Rank"]):
+            if entry["Machine"] not in machines:
+                machines.append(entry["Machine"])
+        return machines
+
+    def lookup(self, machine, localRank):
+        entry = self._ranks.get((normalizeMachine(machine), localRank))
+        if entry is None:
+            raise ManifestError(f"{machine} thread {localRank} has no rank in the manifest, it was made for {', '.join(self.machines())}")
+        return entry
+
+def writeManifest(manifest, path):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path + ".tmp", "w") as f:
+        json.dump(manifest, f, indent=1)
+    os.replace(path + ".tmp", path)
+
+def loadManifest(path):
+    # type: (str) -> RankManifest
+    try:
+        with open(path, "r") as f:
+            return RankManifest(json.load(f))
+    except (IOError, OSError, ValueError) as e:
+        raise ManifestError(f"Unable to read the rank manifest {path}: {e}")
@@ -0,0 +1,259 @@
+"""
+Metrics of a running CopyCat rank in the Prometheus text format.
+
+Every rank keeps its current step, step time, loss, throughput, the time it spent in the
+rendezvous and the resources of its Nuke process, labelled with the job and the rank. They are
+written to a textfile for node_exporter's textfile collector every interval and/or served on a
+small local HTTP endpoint (http://worker:port/metrics). CopyCat doesn't print how long its
+gradient syncs take, so there is no sync wait metric. No Deadline dependencies, the plugin feeds it
+from the task's output.
+"""
+
+from __future__ import absolute_import
+import os
+import sys
+import time
+import threading
+
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+except ImportError:
+    pass
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+METRICS_INTERVAL = 15 # seconds between two exports
+
+# name -> (type, help)
+METRICS = {
+    "copycat_rank": ("gauge", "Rank of this task in the CopyCat world."),
+    "copycat_world_size": ("gauge", "Number of ranks training together."),
+    "copycat_step": ("gauge", "Last training step CopyCat printed."),
+    "copycat_total_steps": ("gauge", "Steps the training runs for."),
+    "copycat_step_seconds": ("gauge", "Seconds per training step, measured over the last minutes of output."),
+    "copycat_samples_per_second": ("gauge", "Training samples per second of the whole world (steps/s x batch size x world size)."),
+    "copycat_loss": ("gauge", "Last loss CopyCat printed."),
+    "copycat_read_bytes_total": ("counter", "Bytes the rank's Nuke processes read from storage."),
+    "copycat_rendezvous_wait_seconds": ("gauge", "Seconds this rank spent in the plugin's rendezvous before Nuke started, not gradient sync time during training."),
+    "copycat_process_resident_bytes": ("gauge", "Resident memory of the rank's Nuke processes."),
+    "copycat_last_update_timestamp_seconds": ("gauge", "Unix time of the last training output, to spot ranks that stopped training."),
+}
+
+def _escapeLabel(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+class RankMetrics(object):
+    """Current values of one rank, safe to update from the output handler and read from the HTTP server."""
+
+    def __init__(self, **labels):
+        self.labels = labels
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def update(self, stamp=True, **values):
+        """Sets the values, stamp=False for measurements that don't come from the training."""
+        with self._lock:
+            for name, value in values.items():
+                if value is not None:
+                    self._values["copycat_" + name] = value
+            if stamp:
+                self._values["copycat_last_update_timestamp_seconds"] = time.time()
+
+    def render(self):
+        labels = ",".join(f'{name}="{_escapeLabel(value)}"' for name, value in sorted(self.labels.items()))
+        with self._lock:
+            values = dict(self._values)
+        lines = []
+        for name, (kind, help) in METRICS.items():
+            if name in values:
+                lines.append(f"# HELP {name} {help}")
+                lines.append(f"# TYPE {name} {kind}")
+                lines.append(f"{name}{{{labels}}} {float(values[name]):.10g}")
+        return "\n".join(lines) + "\n"
+
+def _linuxEnvironment(pid):
+    try:
+        with open(f"/proc/{pid}/environ", "rb") as f:
+            items = f.read().split(b"\0")
+    except (IOError, OSError):
+        return {}
+    environment = {}
+    for item in items:
+        name, _, value = item.partition(b"=")
+        environment[name.decode("utf-8", "replace")] = value.decode("utf-8", "replace")
+    return environment
+
+def _linuxStats(pid):
+    resident, readBytes = 0, 0
+    try:
+        with open(f"/proc/{pid}/statm", "r") as f:
+            resident = int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+        with open(f"/proc/{pid}/io", "r") as f:
+            for line in f:
+                if line.startswith("read_bytes:"):
+                    readBytes = int(line.split()[1])
+    except (IOError, OSError, ValueError, IndexError):
+        pass
+    return resident, readBytes
+
+def findRankProcesses(environment):
+    """Process ids of the processes started with the given COPYCAT_* environment, the Nuke of one rank.
+
+    Main address, port and rank together are unique on a machine even with several jobs or ranks on it.
+    """
+    pids = []
+    if psutil is not None:
+        for process in psutil.process_iter():
+            try:
+                processEnvironment = process.environ()
+            except (psutil.Error, OSError):
+                continue
+            if all(processEnvironment.get(name) == value for name, value in environment.items()):
+                pids.append(process.pid)
+    elif sys.platform.startswith("linux"):
+        for name in os.listdir("/proc"):
+            if name.isdigit():
+                processEnvironment = _linuxEnvironment(name)
+                if all(processEnvironment.get(key) == value for key, value in environment.items()):
+                    pids.append(int(name))
+    return pids
+
+def processStats(pids):
+    """(resident bytes, read bytes) summed over the processes, None where it can't be measured on this platform."""
+    if not pids:
+        return None, None
+    resident, readBytes = 0, 0
+    if psutil is not None:
+        for pid in pids:
+            try:
+                process = psutil.Process(pid)
+                resident += process.memory_info().rss
+                readBytes += getattr(process.io_counters(), "read_bytes", 0)
+            except (psutil.Error, OSError, AttributeError):
+                continue
+        return resident, readBytes
+    if sys.platform.startswith("linux"):
+        for pid in pids:
+            processResident, processReadBytes = _linuxStats(pid)
+            resident += processResident
+            readBytes += processReadBytes
+        return resident, readBytes
+    return None, None
+
+def writeTextfile(path, text):
+    # node_exporter may read at any time, it must never see half a file
+    with open(path + ".tmp", "w") as f:
+        f.write(text)
+    os.replace(path + ".tmp", path)
+
+class _ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+class MetricsServer(object):
+    """Serves the metrics on /metrics from a background thread."""
+
+    def __init__(self, metrics, port, address=""):
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(handler):
+                if handler.path.split("?")[0] not in ("/", "/metrics"):
+                    handler.send_error(404)
+                    return
+                body = metrics.render().encode("utf-8")
+                handler.send_response(200)
+                handler.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                handler.send_header("Content-Length", str(len(body)))
+                handler.end_headers()
+                handler.wfile.write(body)
+
+            def log_message(handler, *args):
+                pass
+
+        self._server = _ThreadingHTTPServer((address, port), Handler)
+        self._thread = threading.Thread(target=self._server.serve_forever, name="CopyCatMetrics", daemon=True)
+        self._thread.start()
+
+    def close(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+class MetricsExporter(object):
+    """Publishes a rank's metrics, to a textfile and/or over HTTP, every interval seconds.
+
+    The export runs on its own thread, so the textfile and the process measurements stay current
+    while Nuke starts up or trains without printing anything.
+    """
+
+    def __init__(self, metrics, textfile=None, port=0, processEnvironment=None, interval=METRICS_INTERVAL, log=print):
+        self.metrics = metrics
+        self.textfile = textfile
+        self.processEnvironment = processEnvironment or {}
+        self.interval = interval
+        self.log = log
+        self._pids = []
+        self._exportLock = threading.Lock()
+        self._stop = threading.Event()
+        self.server = None
+        if port:
+            try:
+                self.server = MetricsServer(metrics, port)
+                log(f"CopyCat metrics are served on port {port}")
+            except OSError as e:
+                log(f"Unable to serve CopyCat metrics on port {port}: {e}")
+        if textfile:
+            os.makedirs(os.path.dirname(textfile) or ".", exist_ok=True)
+        self._thread = threading.Thread(target=self._run, name="CopyCatMetricsExport", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(max(1.0, self.interval)):
+            self.export()
+
+    def update(self, progress=None, force=False, **values):
+        """Takes the values of a CopyCatTraining.TrainingProgress and any others, force exports them right away."""
+        if progress is not None:
+            rate = progress.stepsPerSecond()
+            values.setdefault("step", progress.step)
+            values.setdefault("total_steps", progress.totalSteps)
+            values.setdefault("loss", progress.loss)
+            values.setdefault("step_seconds", 1.0 / rate if rate else None)
+            if rate and progress.batchSize:
+                values.setdefault("samples_per_second", rate * progress.batchSize * progress.worldSize)
+        self.metrics.update(**values)
+        if force:
+            self.export()
+
+    def export(self):
+        """Measures the rank's Nuke processes and writes the textfile."""
+        with self._exportLock:
+            if self._stop.is_set():
+                return
+            if self.processEnvironment:
+                # Nuke may start helper processes later, look them up again whenever the known ones are gone
+                if not self._pids or processStats(self._pids)[0] in (None, 0):
+                    self._pids = findRankProcesses(self.processEnvironment)
+                resident, readBytes = processStats(self._pids)
+                self.metrics.update(stamp=False, process_resident_bytes=resident, read_bytes_total=readBytes)
+            if self.textfile:
+                try:
+                    writeTextfile(self.textfile, self.metrics.render())
+                except (IOError, OSError) as e:
+                    self.log(f"Unable to write CopyCat metrics to {self.textfile}: {e}")
+
+    def close(self):
+        # Taken so an export in progress can't write the textfile again after it was removed
+        with self._exportLock:
+            self._stop.set()
+        if self.server:
+            self.server.close()
+            self.server = None
+        # A textfile left behind would keep reporting a rank that's gone
+        if self.textfile and os.path.exists(self.textfile):
+            try:
+                os.remove(self.textfile)
+            except OSError:
+                pass
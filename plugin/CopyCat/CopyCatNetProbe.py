@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+"""
+Pairwise network probe for CopyCat training machines.
+
+Every machine runs a small TCP server and measures round trip time and throughput to every
+other machine. Results are written as one JSON file per machine into a shared directory,
+the submitter merges them into a matrix. The probe has no Deadline dependencies so it can
+also be run by hand, `python CopyCatNetProbe.py --loopback` checks the local stack.
+"""
+
+from __future__ import absolute_import
+import os
+import sys
+import json
+import time
+import socket
+import struct
+import argparse
+import threading
+
+PROBE_RTT_SAMPLES = 50
+PROBE_PAYLOAD_BYTES = 64 * 1024 * 1024
+PROBE_CHUNK_BYTES = 1024 * 1024
+PROBE_CONNECT_TIMEOUT = 300 # seconds to wait for a peer to start its probe server
+
+_PING = b"P"
+_THROUGHPUT = b"T"
+_QUIT = b"Q"
+
+def _recvExactly(connection, size):
+    data = bytearray()
+    while len(data) < size:
+        chunk = connection.recv(size - len(data))
+        if not chunk:
+            raise ConnectionError("Connection closed by peer")
+        data.extend(chunk)
+    return bytes(data)
+
+class ProbeServer(object):
+    """Answers ping and throughput requests from peers until stopped."""
+
+    def __init__(self, host="", port=0, family=socket.AF_INET):
+        self._socket = socket.socket(family, socket.SOCK_STREAM)
+        self._socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._socket.bind((host, port))
+        self._socket.listen(64)
+        self._socket.settimeout(0.5)
+        self.port = self._socket.getsockname()[1]
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._serve, name="CopyCatProbeServer")
+        self._thread.daemon = True
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stopped.set()
+        self._thread.join(5)
+        self._socket.close()
+
+    def _serve(self):
+        while not self._stopped.is_set():
+            try:
+                connection, _ = self._socket.accept()
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+            handler = threading.Thread(target=self._handle, args=(connection,), name="CopyCatProbeHandler")
+            handler.daemon = True
+            handler.start()
+
+    def _handle(self, connection):
+        connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        try:
+            while True:
+                command = connection.recv(1)
+                if not command or command == _QUIT:
+                    break
+                if command == _PING:
+                    connection.sendall(_recvExactly(connection, 8))
+                elif command == _THROUGHPUT:
+                    remaining = struct.unpack("!Q", _recvExactly(connection, 8))[0]
+                    while remaining > 0:
+                        chunk = connection.recv(min(PROBE_CHUNK_BYTES, remaining))
+                        if not chunk:
+                            raise ConnectionError("Connection closed by peer")
+                        remaining -= len(chunk)
+                    connection.sendall(b"K")
+        except (OSError, ConnectionError):
+            pass
+        finally:
+            connection.close()
+
+def connectToPeer(address, port, timeout=PROBE_CONNECT_TIMEOUT):
+    """Keeps trying until the peer's probe server is up or the timeout runs out."""
+    deadline = time.time() + timeout
+    while True:
+        try:
+            connection = socket.create_connection((address, port), timeout=10)
+            connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            return connection
+        except OSError:
+            if time.time() > deadline:
+                raise
+            time.sleep(1)
+
+def measureRtt(connection, samples=PROBE_RTT_SAMPLES):
+    """Median round trip time in seconds."""
+    rtts = []
+    for index in range(samples):
+        start = time.perf_counter()
+        connection.sendall(_PING + struct.pack("!Q", index))
+        _recvExactly(connection, 8)
+        rtts.append(time.perf_counter() - start)
+    rtts.sort()
+    return rtts[len(rtts) // 2]
+
+def measureThroughput(connection, payloadBytes=PROBE_PAYLOAD_BYTES):
+    """One way throughput in bytes per second."""
+    chunk = b"\0" * PROBE_CHUNK_BYTES
+    start = time.perf_counter()
+    connection.sendall(_THROUGHPUT + struct.pack("!Q", payloadBytes))
+    remaining = payloadBytes
+    while remaining > 0:
+        connection.sendall(chunk[:min(PROBE_CHUNK_BYTES, remaining)])
+        remaining -= min(PROBE_CHUNK_BYTES, remaining)
+    _recvExactly(connection, 1)
+    return payloadBytes / max(time.perf_counter() - start, 1e-9)
+
+def probePeer(address, port, samples=PROBE_RTT_SAMPLES, payloadBytes=PROBE_PAYLOAD_BYTES, timeout=PROBE_CONNECT_TIMEOUT):
+    connection = connectToPeer(address, port, timeout)
+    try:
+        result = {"Rtt": measureRtt(connection, samples), "Bandwidth": measureThroughput(connection, payloadBytes)}
+        connection.sendall(_QUIT)
+    finally:
+        connection.close()
+    return result
+
+def runProbe(thisMachine, peers, port, resultDirectory, log=print, timeout=PROBE_CONNECT_TIMEOUT, payloadBytes=PROBE_PAYLOAD_BYTES, family=socket.AF_INET):
+    """Probes every peer and writes this machine's row of the matrix to resultDirectory.
+
+    peers maps machine name -> address. The probe server is kept running until every peer
+    has written its own row, so late peers can still measure the link to this machine.
+    """
+    server = ProbeServer(port=port, family=family).start()
+    try:
+        # Start at a different peer on every machine so the links are not all measured at once
+        names = sorted(peers)
+        offset = names.index(thisMachine) if thisMachine in names else 0
+        results = {}
+        for name in names[offset + 1:] + names[:offset]:
+            if name == thisMachine:
+                continue
+            try:
+                results[name] = probePeer(peers[name], port, payloadBytes=payloadBytes, timeout=timeout)
+                log(f"Probe {thisMachine} -> {name}: rtt {results[name]['Rtt'] * 1000.0:.3f} ms, {results[name]['Bandwidth'] / 1e6:.1f} MB/s")
+            except OSError as e:
+                results[name] = {"Error": str(e)}
+                log(f"Probe {thisMachine} -> {name} failed: {e}")
+
+        os.makedirs(resultDirectory, exist_ok=True)
+        rowFile = os.path.join(resultDirectory, thisMachine + ".json")
+        with open(rowFile + ".tmp", "w") as f:
+            json.dump({"Machine": thisMachine, "Results": results}, f, indent=2)
+        os.replace(rowFile + ".tmp", rowFile)
+
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            if all(os.path.exists(os.path.join(resultDirectory, name + ".json")) for name in names):
+                break
+            time.sleep(1)
+    finally:
+        server.stop()
+    return results
+
+def loadProbeMatrix(resultDirectory):
+    """Reads every machine's row into matrix[source][destination]."""
+    matrix = {}
+    if not os.path.isdir(resultDirectory):
+        return matrix
+    for fileName in os.listdir(resultDirectory):
+        if not fileName.endswith(".json"):
+            continue
+        try:
+            with open(os.path.join(resultDirectory, fileName), "r") as f:
+                row = json.load(f)
+        except (IOError, OSError, ValueError):
+            continue
+        matrix[row["Machine"]] = row["Results"]
+    return matrix
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure RTT and throughput between CopyCat training machines.")
+    parser.add_argument("--loopback", action="store_true", help="probe a local server over loopback")
+    parser.add_argument("--serve", action="store_true", help="only run the probe server")
+    parser.add_argument("--port", type=int, default=0)
+    parser.add_argument("--payload-mb", type=int, default=PROBE_PAYLOAD_BYTES // (1024 * 1024))
+    parser.add_argument("peers", nargs="*", help="peer addresses to probe")
+    args = parser.parse_args(argv)
+    payloadBytes = args.payload_mb * 1024 * 1024
+
+    if args.serve:
+        server = ProbeServer(port=args.port).start()
+        print(f"Probe server listening on port {server.port}, Ctrl+C to stop")
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            server.stop()
+        return 0
+
+    server = None
+    peers = list(args.peers)
+    port = args.port
+    if args.loopback:
+        server = ProbeServer(host="127.0.0.1", port=args.port).start()
+        peers.append("127.0.0.1")
+        port = server.port
+    try:
+        for peer in peers:
+            result = probePeer(peer, port, payloadBytes=payloadBytes, timeout=10)
+            print(f"{peer}: rtt {result['Rtt'] * 1000.0:.3f} ms, {result['Bandwidth'] / 1e6:.1f} MB/s")
+    finally:
+        if server:
+            server.stop()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,408 @@
+"""
+Rendezvous of the CopyCat ranks before Nuke starts.
+
+Rank 0 listens on the main address and every other rank registers with it. Once all ranks of the
+world are there, rank 0 tells them to go and each one starts Nuke. If the world is not complete
+within the timeout, every rank gives up instead of holding its GPU while waiting inside CopyCat.
+
+Rank 0 binds to the main address itself, so a main address that does not belong to the main
+machine fails right away, and a rank that reaches rank 0 has proven the address works.
+
+Elastic jobs use ElasticRendezvous instead, which hands out the ranks through a shared directory
+so the world can be formed again without the main machine.
+"""
+
+from __future__ import absolute_import
+import os
+import json
+import time
+import socket
+import threading
+
+RENDEZVOUS_TIMEOUT = 600
+_CONNECT_RETRY_SECONDS = 1.0
+
+class RendezvousError(Exception):
+    pass
+
+def _sendMessage(connection, message):
+    connection.sendall((json.dumps(message) + "\n").encode("utf-8"))
+
+def _receiveMessage(connection):
+    # One JSON message per line
+    line = connection.makefile("rb").readline()
+    if not line:
+        raise RendezvousError("Connection closed during rendezvous")
+    return json.loads(line.decode("utf-8"))
+
+def _family(address):
+    return socket.AF_INET6 if ":" in address else socket.AF_INET
+
+class RendezvousServer(object):
+    """Hosted by rank 0, collects the registrations of every other rank."""
+
+    def __init__(self, mainAddress, port, worldSize, log=print):
+        self.mainAddress = mainAddress
+        self.worldSize = worldSize
+        self.log = log
+        self._socket = socket.socket(_family(mainAddress), socket.SOCK_STREAM)
+        self._socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        try:
+            self._socket.bind((mainAddress, port))
+        except OSError as e:
+            self._socket.close()
+            raise RendezvousError(f"Unable to listen on main address {mainAddress}:{port}, is it an address of this machine? {e}")
+        self._socket.listen(max(16, worldSize))
+        self._lock = threading.Lock()
+        self._members = {} # rank -> (registration, connection)
+
+    def _register(self, registration, connection):
+        """Returns the reason a registration is refused, None when it's accepted."""
+        rank = registration.get("Rank")
+        if registration.get("WorldSize") != self.worldSize:
+            return f"rank {rank} expects world size {registration.get('WorldSize')}, rank 0 has {self.worldSize}"
+        if registration.get("MainAddress") != self.mainAddress:
+            return f"rank {rank} was given main address {registration.get('MainAddress')}, rank 0 listens on {self.mainAddress}"
+        if not isinstance(rank, int) or rank < 1 or rank >= self.worldSize:
+            return f"rank {rank} is not in 1-{self.worldSize - 1}"
+        with self._lock:
+            if rank in self._members:
+                return f"rank {rank} is already taken by {self._members[rank][0].get('Machine')}"
+            self._members[rank] = (registration, connection)
+            count = len(self._members) + 1
+        self.log(f"Rendezvous: rank {rank} ({registration.get('Machine')}, {registration.get('LocalAddress')}) registered, {count} of {self.worldSize}")
+        return None
+
+    def missingRanks(self):
+        with self._lock:
+            return [rank for rank in range(1, self.worldSize) if rank not in self._members]
+
+    def wait(self, timeout=RENDEZVOUS_TIMEOUT, release=None):
+        """Blocks until every rank registered, then releases them. Raises RendezvousError on timeout.
+
+        release() is called once the world is complete, what it returns is sent to every rank with the go and returned.
+        """
+        deadline = time.time() + timeout
+        try:
+            while self.missingRanks():
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    missing = self.missingRanks()
+                    self._broadcast({"Status": "abort", "Reason": f"ranks {missing} did not register within {timeout} seconds"})
+                    raise RendezvousError(f"Ranks {missing} of {self.worldSize} did not register within {timeout} seconds")
+                self._socket.settimeout(min(remaining, 5.0))
+                try:
+                    connection, _ = self._socket.accept()
+                except socket.timeout:
+                    continue
+                self._accept(connection, deadline)
+            message = {"Status": "go"}
+            if release:
+                message.update(release())
+            self._broadcast(message)
+            self.log(f"Rendezvous complete, all {self.worldSize} ranks are present")
+            return message
+        finally:
+            self.close()
+
+    def _accept(self, connection, deadline):
+        connection.settimeout(max(1.0, min(10.0, deadline - time.time())))
+        try:
+            registration = _receiveMessage(connection)
+        except (OSError, ValueError, RendezvousError) as e:
+            self.log(f"Rendezvous: dropped a bad registration: {e}")
+            connection.close()
+            return
+        reason = self._register(registration, connection)
+        if reason:
+            self.log(f"Rendezvous: refused {registration.get('Machine')}: {reason}")
+            try:
+                _sendMessage(connection, {"Status": "refused", "Reason": reason})
+            except OSError:
+                pass
+            connection.close()
+
+    def _broadcast(self, message):
+        with self._lock:
+            members = list(self._members.values())
+        for _, connection in members:
+            try:
+                _sendMessage(connection, message)
+            except OSError:
+                pass
+
+    def close(self):
+        with self._lock:
+            members = list(self._members.values())
+        for _, connection in members:
+            connection.close()
+        self._socket.close()
+
+def register(mainAddress, port, rank, worldSize, machine, localAddress, timeout=RENDEZVOUS_TIMEOUT):
+    """Registers a rank with rank 0 and blocks until the world is complete. Raises RendezvousError otherwise."""
+    deadline = time.time() + timeout
+    registration = {"Rank": rank, "WorldSize": worldSize, "Machine": machine, "LocalAddress": localAddress, "MainAddress": mainAddress}
+    while True:
+        # Rank 0 may start after this rank, keep trying until it's listening
+        try:
+            connection = socket.create_connection((mainAddress, port), timeout=10)
+            break
+        except OSError as e:
+            if time.time() + _CONNECT_RETRY_SECONDS > deadline:
+                raise RendezvousError(f"Rank 0 at {mainAddress}:{port} could not be reached within {timeout} seconds: {e}")
+            time.sleep(_CONNECT_RETRY_SECONDS)
+
+    try:
+        _sendMessage(connection, registration)
+        # Rank 0 answers once every rank is there, or gives up at its own timeout
+        connection.settimeout(max(1.0, deadline - time.time()) + 30)
+        try:
+            reply = _receiveMessage(connection)
+        except socket.timeout:
+            raise RendezvousError(f"Rank 0 did not complete the rendezvous within {timeout} seconds")
+    finally:
+        connection.close()
+
+    if reply.get("Status") != "go":
+        raise RendezvousError(f"Rendezvous {reply.get('Status')}: {reply.get('Reason')}")
+    return reply
+
+ELASTIC_JOIN_WINDOW = 60
+# Ranks of a formed world touch their heartbeat file this often while they train, a world whose
+# heartbeats are all older than ELASTIC_HEARTBEAT_STALE seconds has stopped, and so has a rank
+# whose heartbeat is that old while the others still train
+ELASTIC_HEARTBEAT_SECONDS = 10.0
+ELASTIC_HEARTBEAT_STALE = 60.0
+# A world lock older than this was left by a rank that died while forming the world
+ELASTIC_LOCK_STALE = 120.0
+_ELASTIC_POLL_SECONDS = 2.0
+_WORLD_FILE = "world.json"
+_HEARTBEAT_SUFFIX = ".alive"
+_DONE_SUFFIX = ".done"
+
+class ElasticRendezvous(object):
+    """Forms the world from the ranks that show up, through a directory on shared storage.
+
+    Every attempt to train is a generation. Ranks register in the newest generation that has not
+    formed a world yet. A world is formed once all maxWorldSize ranks are there, or at least
+    minWorldSize ranks (half of them by default) and nobody joined for joinWindow seconds. The
+    ranks get dense numbers, machines earlier in preferredOrder first, and rank 0's address
+    becomes the main address. When a rank stops beating the others stop too and fail, and their
+    retries, together with any substitute worker that picks up the failed task, register in the
+    next generation. A generation never forms while the world of the one before still has a
+    heartbeat, so late ranks and extra tasks wait instead of training a second world into the
+    same directory.
+    """
+
+    def __init__(self, directory, machine, thread, address, maxWorldSize, minWorldSize=None, joinWindow=ELASTIC_JOIN_WINDOW, preferredOrder=(), release=None, log=print):
+        self.directory = directory
+        self.member = {"Machine": machine.lower(), "Thread": thread, "Address": address}
+        self.memberId = f"{machine.lower()}_{thread}"
+        self.maxWorldSize = maxWorldSize
+        self.minWorldSize = max(1, min(minWorldSize or maxWorldSize // 2, maxWorldSize))
+        self.joinWindow = joinWindow
+        self.preferredOrder = [machine.strip().lower() for machine in preferredOrder]
+        # Called by the rank that forms a world, what it returns is stored with the world
+        self.release = release
+        self.log = log
+        self._heartbeat = None
+        self._heartbeatGeneration = None
+
+    def _generationDirectory(self, generation):
+        return os.path.join(self.directory, f"gen_{generation:04d}")
+
+    def _latestGeneration(self):
+        generations = [int(name[4:]) for name in os.listdir(self.directory) if name.startswith("gen_") and name[4:].isdigit()]
+        return max(generations) if generations else 0
+
+    def _readJson(self, path):
+        try:
+            with open(path, "r") as f:
+                return json.load(f)
+        except (IOError, OSError, ValueError):
+            return None
+
+    def _members(self, generationDirectory):
+        members = []
+        for name in os.listdir(generationDirectory):
+            if name.endswith(".json") and name != _WORLD_FILE and not name.startswith(_WORLD_FILE):
+                member = self._readJson(os.path.join(generationDirectory, name))
+                if member:
+                    members.append(member)
+        return members
+
+    def _sortKey(self, member):
+        machine = member["Machine"]
+        index = self.preferredOrder.index(machine) if machine in self.preferredOrder else len(self.preferredOrder)
+        return (index, machine, member["Thread"])
+
+    def _takeWorldLock(self, lockFile):
+        """Creates the lock with its owner and time, breaking a lock whose owner died while forming the world."""
+        for _ in range(2):
+            try:
+                handle = os.open(lockFile, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            except OSError:
+                lock = self._readJson(lockFile) or {}
+                try:
+                    age = time.time() - float(lock.get("Time", os.path.getmtime(lockFile)))
+                except (OSError, TypeError, ValueError):
+                    return False
+                if age < ELASTIC_LOCK_STALE:
+                    return False
+                self.log(f"Elastic rendezvous: breaking the world lock {lock.get('Owner')} left {int(age)} seconds ago")
+                try:
+                    os.remove(lockFile)
+                except OSError:
+                    return False
+                continue
+            os.write(handle, json.dumps({"Owner": self.memberId, "Time": time.time()}).encode("utf-8"))
+            os.close(handle)
+            return True
+        return False
+
+    def _formWorld(self, generation, members):
+        """Writes the world of the generation unless another rank is doing it."""
+        members = sorted(members, key=self._sortKey)[:self.maxWorldSize]
+        world = {"Generation": generation, "Members": members, "MainAddress": members[0]["Address"]}
+        worldFile = os.path.join(self._generationDirectory(generation), _WORLD_FILE)
+        if not self._takeWorldLock(worldFile + ".lock"):
+            return
+        if self.release:
+            world.update(self.release())
+        with open(worldFile + ".tmp", "w") as f:
+            json.dump(world, f, indent=2)
+        os.replace(worldFile + ".tmp", worldFile)
+
+    def _worldAlive(self, generation):
+        """True while a rank of the generation's world still has a fresh heartbeat, or the world is being formed."""
+        generationDirectory = self._generationDirectory(generation)
+        world = self._readJson(os.path.join(generationDirectory, _WORLD_FILE))
+        if world is None:
+            return False
+        # Ranks that were just released have not written their first heartbeat yet
+        newest = os.path.getmtime(os.path.join(generationDirectory, _WORLD_FILE))
+        for member in world["Members"]:
+            try:
+                newest = max(newest, os.path.getmtime(os.path.join(generationDirectory, f"{member['Machine']}_{member['Thread']}{_HEARTBEAT_SUFFIX}")))
+            except OSError:
+                pass
+        return time.time() - newest < ELASTIC_HEARTBEAT_STALE
+
+    def stalePeers(self, generation, members):
+        """The other ranks of the generation's world whose heartbeat is older than ELASTIC_HEARTBEAT_STALE.
+
+        Ranks that finished training don't count, ranks that never beat are timed from when the world was formed.
+        """
+        generationDirectory = self._generationDirectory(generation)
+        try:
+            formed = os.path.getmtime(os.path.join(generationDirectory, _WORLD_FILE))
+        except OSError:
+            return []
+        stale = []
+        for member in members:
+            memberId = f"{member['Machine']}_{member['Thread']}"
+            if memberId == self.memberId or os.path.exists(os.path.join(generationDirectory, memberId + _DONE_SUFFIX)):
+                continue
+            try:
+                beat = os.path.getmtime(os.path.join(generationDirectory, memberId + _HEARTBEAT_SUFFIX))
+            except OSError:
+                beat = formed
+            if time.time() - beat >= ELASTIC_HEARTBEAT_STALE:
+                stale.append(memberId)
+        return stale
+
+    def startHeartbeat(self, generation, members=(), onPeerLost=None):
+        """Keeps touching this rank's heartbeat in the generation until stopHeartbeat, call it once the rank is in a world.
+
+        With onPeerLost the other members are watched on every beat. Once one of them is stale this rank
+        stops beating, so the next generation can form, and onPeerLost is called with the reason.
+        """
+        heartbeatFile = os.path.join(self._generationDirectory(generation), self.memberId + _HEARTBEAT_SUFFIX)
+        stop = threading.Event()
+
+        def beat():
+            while True:
+                try:
+                    with open(heartbeatFile, "w") as f:
+                        f.write(str(time.time()))
+                except (IOError, OSError) as e:
+                    self.log(f"Elastic rendezvous: unable to write the heartbeat {heartbeatFile}: {e}")
+                if stop.wait(ELASTIC_HEARTBEAT_SECONDS):
+                    return
+                stale = self.stalePeers(generation, members) if onPeerLost is not None else []
+                if stale:
+                    onPeerLost(f"{', '.join(stale)} of elastic generation {generation} stopped beating for {int(ELASTIC_HEARTBEAT_STALE)} seconds")
+                    return
+
+        thread = threading.Thread(target=beat, name="CopyCatElasticHeartbeat")
+        thread.daemon = True
+        thread.start()
+        self._heartbeat = stop
+        self._heartbeatGeneration = generation
+
+    def stopHeartbeat(self, finished=False):
+        """Stops beating, a rank that finished training says so, so the ranks still training don't take it for lost."""
+        if self._heartbeat is not None:
+            self._heartbeat.set()
+            self._heartbeat = None
+            if finished:
+                with open(os.path.join(self._generationDirectory(self._heartbeatGeneration), self.memberId + _DONE_SUFFIX), "w") as f:
+                    f.write(str(time.time()))
+
+    def _register(self, generation):
+        generationDirectory = self._generationDirectory(generation)
+        os.makedirs(generationDirectory, exist_ok=True)
+        memberFile = os.path.join(generationDirectory, self.memberId + ".json")
+        with open(memberFile + ".tmp", "w") as f:
+            json.dump(self.member, f)
+        os.replace(memberFile + ".tmp", memberFile)
+        self.log(f"Elastic rendezvous: {self.memberId} registered in generation {generation}")
+
+    def join(self, timeout=RENDEZVOUS_TIMEOUT):
+        """Blocks until this rank is part of a world. Returns the world with this rank's Rank and the WorldSize."""
+        deadline = time.time() + timeout
+        os.makedirs(self.directory, exist_ok=True)
+        generation = self._latestGeneration()
+        # A generation that formed its world already is training or has failed, retries start the next one
+        if os.path.exists(os.path.join(self._generationDirectory(generation), _WORLD_FILE)):
+            generation += 1
+        self._register(generation)
+
+        memberCount = 0
+        lastJoin = time.time()
+        waitingForWorld = False
+        while time.time() < deadline:
+            generationDirectory = self._generationDirectory(generation)
+            world = self._readJson(os.path.join(generationDirectory, _WORLD_FILE))
+            if world:
+                memberIds = [f"{member['Machine']}_{member['Thread']}" for member in world["Members"]]
+                if self.memberId in memberIds:
+                    world["Rank"] = memberIds.index(self.memberId)
+                    world["WorldSize"] = len(memberIds)
+                    return world
+                # Joined too late for this world, wait for the next restart
+                generation += 1
+                self._register(generation)
+                memberCount = 0
+                lastJoin = time.time()
+                waitingForWorld = False
+                continue
+
+            members = self._members(generationDirectory)
+            # Joins are timed on this machine's clock, the workers' clocks may not agree
+            if len(members) != memberCount:
+                memberCount = len(members)
+                lastJoin = time.time()
+                self.log(f"Elastic rendezvous: {memberCount} of up to {self.maxWorldSize} ranks in generation {generation}")
+            if memberCount >= self.maxWorldSize or (memberCount >= self.minWorldSize and time.time() - lastJoin >= self.joinWindow):
+                if generation > 0 and self._worldAlive(generation - 1):
+                    if not waitingForWorld:
+                        self.log(f"Elastic rendezvous: the world of generation {generation - 1} is still training, waiting for it to stop")
+                    waitingForWorld = True
+                else:
+                    self._formWorld(generation, members)
+            time.sleep(_ELASTIC_POLL_SECONDS)
+
+        if waitingForWorld:
+            raise RendezvousError(f"The world of generation {generation - 1} kept training for {timeout} seconds, this rank is not needed")
+        raise RendezvousError(f"No world with at least {self.minWorldSize} ranks was formed within {timeout} seconds")
@@ -0,0 +1,189 @@
+"""
+Minimal reader for Nuke script (.nk) files.
+
+The plugin only needs a few knob values of the CopyCat node (model and batch settings, data
+directory) and the Read nodes feeding it, so instead of starting Nuke the script is read as
+text. Every node is a block `Class {` ... `}` with one knob per line, connections are stored
+with Nuke's node stack (`push`, `set`, and the `inputs` knob).
+"""
+
+from __future__ import absolute_import
+import os
+import re
+
+_NODE_START = re.compile(r"^\s*(\w+) \{\s*$")
+_KNOB_LINE = re.compile(r"^\s+(\w+)\s+(.*?)\s*$")
+_PUSH = re.compile(r"^push (\$?\w+)\s*$")
+_SET = re.compile(r"^set (\w+) \[stack (\d+)\]\s*$")
+_FRAME_PATTERN = re.compile(r"(#+)|(%0?(\d*)d)")
+
+# Absolute POSIX, UNC and drive letter paths, up to the quote, brace or bracket that ends them
+_PATH_STRING = re.compile(r"(?:[A-Za-z]:[\\/]|[\\/])[^\s\"'{}\[\]]*")
+
+def parseKnobValue(value):
+    """Strips the {braces} or "quotes" Nuke puts around knob values."""
+    if len(value) >= 2 and ((value[0] == "{" and value[-1] == "}") or (value[0] == '"' and value[-1] == '"')):
+        return value[1:-1].strip()
+    return value
+
+class NukeNode(object):
+    def __init__(self, nodeClass, startLine):
+        self.Class = nodeClass
+        self.StartLine = startLine
+        self.EndLine = startLine
+        self.Knobs = {}
+        self.KnobLines = {}
+        self.Inputs = []
+        self.Parent = None
+        self.Children = []
+
+    def name(self):
+        return self.Knobs.get("name", "")
+
+    def knob(self, name, default=None):
+        if name in self.Knobs:
+            return parseKnobValue(self.Knobs[name])
+        return default
+
+    def inputCount(self):
+        # Nodes with a single input don't write the knob, "inputs 2+1" counts the mask input
+        try:
+            return sum(int(count) for count in self.Knobs.get("inputs", "1").split("+"))
+        except ValueError:
+            return 1
+
+def iterNodes(lines, commands=None):
+    """Yields every node block of the script in file order.
+
+    Any other line at the top level (push, set, end_group...) is appended to commands as (index, line).
+    """
+    node = None
+    depth = 0
+    for index, line in enumerate(lines):
+        if node is None:
+            match = _NODE_START.match(line)
+            if match:
+                node = NukeNode(match.group(1), index)
+                depth = 1
+            elif commands is not None:
+                commands.append((index, line))
+            continue
+
+        if depth == 1:
+            if line.strip() == "}":
+                node.EndLine = index
+                yield node
+                node = None
+                continue
+            match = _KNOB_LINE.match(line)
+            if match:
+                node.Knobs[match.group(1)] = match.group(2)
+                node.KnobLines[match.group(1)] = index
+        # Multi-line knob values (user knobs, curves...) are skipped
+        depth += line.count("{") - line.count("}")
+        depth = max(depth, 1)
+
+def readScriptLines(sceneFile):
+    with open(sceneFile, "r", encoding="utf-8", errors="surrogateescape") as f:
+        return f.read().splitlines()
+
+def findNode(lines, nodeName):
+    for node in iterNodes(lines):
+        if node.name() == nodeName:
+            return node
+    return None
+
+def readNodeKnobs(sceneFile, nodeName):
+    """Returns the knob values of the named node, or None if the script has no such node."""
+    node = findNode(readScriptLines(sceneFile), nodeName)
+    if node is None:
+        return None
+    return dict((name, node.knob(name)) for name in node.Knobs)
+
+def _applyStackCommand(line, stacks, variables, groups):
+    stack = stacks[-1]
+    pushMatch = _PUSH.match(line)
+    setMatch = _SET.match(line)
+    if pushMatch:
+        value = pushMatch.group(1)
+        stack.append(variables.get(value[1:]) if value.startswith("$") else None)
+    elif setMatch:
+        depth = int(setMatch.group(2))
+        variables[setMatch.group(1)] = stack[-1 - depth] if len(stack) > depth else None
+    elif line == "end_group" and groups:
+        stacks.pop()
+        stacks[-1].append(groups.pop())
+
+def readNodeGraph(lines):
+    """Returns every node of the script with its Inputs connected, by replaying Nuke's node stack."""
+    nodes = []
+    commands = []
+    stacks = [[]]
+    variables = {}
+    groups = []
+
+    replayed = 0
+    for node in iterNodes(lines, commands):
+        # iterNodes collects the lines between node blocks while it goes, replay the ones before this node
+        while replayed < len(commands) and commands[replayed][0] < node.StartLine:
+            _applyStackCommand(commands[replayed][1].strip(), stacks, variables, groups)
+            replayed += 1
+
+        stack = stacks[-1]
+        count = 0 if node.Class == "Root" else node.inputCount()
+        for _ in range(count):
+            node.Inputs.append(stack.pop() if stack else None)
+        node.Parent = groups[-1] if groups else None
+        if node.Parent is not None:
+            node.Parent.Children.append(node)
+        nodes.append(node)
+
+        if node.Class in ("Group", "LiveGroup"):
+            # Children use their own stack, the group is pushed once end_group is reached
+            groups.append(node)
+            stacks.append([])
+        elif node.Class != "Root":
+            stack.append(node)
+    return nodes
+
+def findUpstreamNodes(node, nodeClass):
+    """All nodes of nodeClass that feed node, directly, through other nodes or through groups."""
+    found = []
+    visited = set()
+    pending = [node]
+    while pending:
+        current = pending.pop()
+        if current is None or id(current) in visited:
+            continue
+        visited.add(id(current))
+        if current is not node and current.Class == nodeClass:
+            found.append(current)
+        pending.extend(current.Inputs)
+        if current.Class in ("Group", "LiveGroup"):
+            pending.extend(child for child in current.Children if child.Class == "Output")
+        elif current.Class == "Input" and current.Parent is not None:
+            number = int(current.knob("number", "0"))
+            if number < len(current.Parent.Inputs):
+                pending.append(current.Parent.Inputs[number])
+    return found
+
+def expandSequence(path, first, last):
+    """Frame files of a Read node's file knob (#### and %04d patterns), a single file if it has no pattern."""
+    match = _FRAME_PATTERN.search(os.path.basename(path))
+    if not match:
+        return [path]
+    directory = os.path.dirname(path)
+    fileName = os.path.basename(path)
+    padding = len(match.group(1)) if match.group(1) else int(match.group(3) or 0)
+    return [os.path.join(directory, fileName[:match.start()] + str(frame).zfill(padding) + fileName[match.end():]) for frame in range(first, last + 1)]
+
+def readPathStrings(lines):
+    """Distinct path-like strings anywhere in the script, knobs, expressions and Python code alike.
+
+    Path mapping replaces its rules' paths wherever they appear in the file, so these are all the
+    strings a mapping can change.
+    """
+    values = set()
+    for line in lines:
+        values.update(_PATH_STRING.findall(line))
+    return sorted(values)
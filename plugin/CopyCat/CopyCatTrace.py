@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+Timeline of a CopyCat task, from the Worker picking it up to the first training step.
+
+Every rank records its phases (library path scrubbing, OFX prep, version lookup, rendezvous, scene
+path mapping, Nuke startup, ...) and writes them as a Chrome trace, which chrome://tracing and
+https://ui.perfetto.dev open. The ranks of a job are merged into one timeline with a row per rank,
+so one rank starting late stands out:
+
+    python CopyCatTrace.py /traces/<job id> -o timeline.json
+
+Timestamps are the machines' wall clocks, ranks line up as well as the clocks agree.
+"""
+
+from __future__ import absolute_import
+import os
+import sys
+import json
+import time
+import argparse
+import contextlib
+
+FIRST_STEP = "first training step"
+TIMELINE_FILE = "timeline.json"
+
+def _microseconds(seconds):
+    return int(seconds * 1e6)
+
+class PhaseTracer(object):
+    """Collects the phases of one rank. Phases can nest, and the ones spanning callbacks use begin and end."""
+
+    def __init__(self, name="", rank=0, clock=time.time):
+        self.name = name
+        self.rank = rank
+        self.clock = clock
+        self._events = []
+        self._open = {}
+
+    @contextlib.contextmanager
+    def phase(self, name, **args):
+        start = self.clock()
+        try:
+            yield
+        finally:
+            self._complete(name, start, self.clock(), args)
+
+    def begin(self, name, **args):
+        self._open[name] = (self.clock(), args)
+
+    def end(self, name, **args):
+        """Ends a phase started with begin, does nothing when it's not open."""
+        if name not in self._open:
+            return
+        start, beginArgs = self._open.pop(name)
+        beginArgs.update(args)
+        self._complete(name, start, self.clock(), beginArgs)
+
+    def isOpen(self, name):
+        return name in self._open
+
+    def instant(self, name, **args):
+        self._events.append({"name": name, "ph": "i", "s": "p", "ts": _microseconds(self.clock()), "args": args})
+
+    def _complete(self, name, start, end, args):
+        self._events.append({"name": name, "ph": "X", "ts": _microseconds(start), "dur": max(0, _microseconds(end - start)), "args": args})
+
+    def trace(self):
+        """The Chrome trace of this rank, phases still open end now."""
+        now = self.clock()
+        events = [{"name": "process_name", "ph": "M", "args": {"name": self.name or f"rank {self.rank}"}},
+                  {"name": "process_sort_index", "ph": "M", "args": {"sort_index": self.rank}}]
+        events.extend(self._events)
+        for name, (start, args) in self._open.items():
+            events.append({"name": name, "ph": "X", "ts": _microseconds(start), "dur": max(0, _microseconds(now - start)), "args": dict(args, Unfinished=True)})
+        for event in events:
+            event.update(pid=self.rank, tid=0)
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def write(self, path):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path + ".tmp", "w") as f:
+            json.dump(self.trace(), f)
+        os.replace(path + ".tmp", path)
+
+def _readTrace(path):
+    try:
+        with open(path, "r") as f:
+            return json.load(f).get("traceEvents", [])
+    except (IOError, OSError, ValueError, AttributeError):
+        return None
+
+def mergeTraces(paths):
+    """One trace with a row per file, files that can't be read are left out."""
+    merged = []
+    for pid, path in enumerate(sorted(paths)):
+        events = _readTrace(path)
+        if events is None:
+            continue
+        for event in events:
+            event = dict(event)
+            # Ranks of different generations or requeued tasks share numbers, every file gets its own row
+            event["pid"] = pid
+            merged.append(event)
+    return {"traceEvents": merged, "displayTimeUnit": "ms"}
+
+def rankTraceFiles(directory):
+    return [os.path.join(directory, name) for name in os.listdir(directory) if name.endswith(".json") and name != TIMELINE_FILE]
+
+def writeTimeline(directory):
+    """Merges the rank traces in the directory into its timeline.json, returns the merged trace."""
+    trace = mergeTraces(rankTraceFiles(directory))
+    path = os.path.join(directory, TIMELINE_FILE)
+    # Every rank rewrites it when its trace changes, the last one has all of them
+    with open(f"{path}.{os.getpid()}.tmp", "w") as f:
+        json.dump(trace, f)
+    os.replace(f"{path}.{os.getpid()}.tmp", path)
+    return trace
+
+def startupSkew(trace, marker=FIRST_STEP):
+    """Seconds from the earliest rank to each rank reaching the marker, by row name."""
+    names = {}
+    reached = {}
+    for event in trace["traceEvents"]:
+        if event.get("ph") == "M" and event.get("name") == "process_name":
+            names[event["pid"]] = event["args"]["name"]
+        elif event.get("name") == marker and event["pid"] not in reached:
+            reached[event["pid"]] = event["ts"]
+    if not reached:
+        return {}
+    first = min(reached.values())
+    return {names.get(pid, str(pid)): (ts - first) / 1e6 for pid, ts in reached.items()}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Merge the phase traces of CopyCat ranks into one timeline.")
+    parser.add_argument("traces", nargs="+", help="trace files or directories of a job's traces")
+    parser.add_argument("-o", "--output", help="merged timeline, defaults to timeline.json in the first directory")
+    args = parser.parse_args(argv)
+
+    paths = []
+    for path in args.traces:
+        paths.extend(rankTraceFiles(path) if os.path.isdir(path) else [path])
+    trace = mergeTraces(paths)
+    output = args.output or os.path.join(next((path for path in args.traces if os.path.isdir(path)), "."), TIMELINE_FILE)
+    with open(output, "w") as f:
+        json.dump(trace, f)
+    print(f"{len(paths)} traces merged into {output}")
+
+    skew = startupSkew(trace)
+    for name in sorted(skew, key=skew.get):
+        print(f"    {name}: {FIRST_STEP} +{skew[name]:.1f}s")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
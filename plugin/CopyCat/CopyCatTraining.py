@@ -0,0 +1,204 @@
+"""
+Training settings derived by the CopyCat plugin.
+"""
+
+from __future__ import absolute_import
+import os
+import re
+import time
+import collections
+
+# Rough size of the gradients exchanged on every sync and time per training sample at a 256px crop,
+# per CopyCat model size. They only need to be in the right ballpark to pick a sync interval.
+MODEL_GRADIENT_BYTES = {"small": 8e6, "medium": 32e6, "large": 128e6}
+MODEL_SECONDS_PER_SAMPLE = {"small": 0.004, "medium": 0.012, "large": 0.04}
+REFERENCE_CROP_SIZE = 256.0
+
+# Sync as often as possible while keeping the time spent syncing under this share of a step
+SYNC_OVERHEAD_TARGET = 0.1
+MAX_SYNC_INTERVAL = 32
+
+def estimateSyncSeconds(latency, bandwidth, worldSize, gradientBytes):
+    """Ring all-reduce: 2*(N-1) hops, each moving 1/N of the gradients."""
+    hops = 2 * (worldSize - 1)
+    return hops * latency + hops * (gradientBytes / worldSize) / bandwidth
+
+def estimateStepSeconds(modelSize, batchSize, cropSize):
+    perSample = MODEL_SECONDS_PER_SAMPLE.get(modelSize.lower(), MODEL_SECONDS_PER_SAMPLE["medium"])
+    return batchSize * perSample * (cropSize / REFERENCE_CROP_SIZE) ** 2
+
+def chooseSyncInterval(latency, bandwidth, worldSize, modelSize="Medium", batchSize=4, cropSize=256):
+    """Picks the smallest COPYCAT_SYNC_INTERVAL that keeps sync overhead under SYNC_OVERHEAD_TARGET.
+
+    latency is the one way latency in seconds and bandwidth the throughput in bytes per second of the
+    slowest link between the ranks. Returns the interval and the lines explaining the choice.
+    """
+    if worldSize <= 1:
+        return 1, ["Single rank, nothing to sync"]
+
+    gradientBytes = MODEL_GRADIENT_BYTES.get(modelSize.lower(), MODEL_GRADIENT_BYTES["medium"])
+    syncSeconds = estimateSyncSeconds(latency, bandwidth, worldSize, gradientBytes)
+    stepSeconds = estimateStepSeconds(modelSize, batchSize, cropSize)
+    interval = 1
+    while interval < MAX_SYNC_INTERVAL and syncSeconds / (interval * stepSeconds) > SYNC_OVERHEAD_TARGET:
+        interval += 1
+
+    reasons = [
+        f"Slowest link: latency {latency * 1000.0:.3f} ms, throughput {bandwidth / 1e6:.1f} MB/s",
+        f"World size {worldSize}, model {modelSize} (~{gradientBytes / 1e6:.0f} MB of gradients), batch size {batchSize}, crop size {cropSize}",
+        f"Estimated sync {syncSeconds * 1000.0:.1f} ms, estimated step {stepSeconds * 1000.0:.1f} ms",
+        f"Sync interval {interval} keeps sync at {100.0 * syncSeconds / (interval * stepSeconds):.1f}% of training time (target {100.0 * SYNC_OVERHEAD_TARGET:.0f}%, max interval {MAX_SYNC_INTERVAL})",
+    ]
+    return interval, reasons
+
+def slowestLinkFromProbe(matrix, machines):
+    """Worst one way latency and throughput between the given machines in a network probe matrix.
+
+    Returns None when the probe is missing any of the pairs.
+    """
+    latency = 0.0
+    bandwidth = None
+    for source in machines:
+        for destination in machines:
+            if source == destination:
+                continue
+            result = matrix.get(source, {}).get(destination)
+            if result is None or "Error" in result:
+                return None
+            latency = max(latency, result["Rtt"] / 2.0)
+            bandwidth = result["Bandwidth"] if bandwidth is None else min(bandwidth, result["Bandwidth"])
+    if bandwidth is None:
+        return None
+    return latency, bandwidth
+
+# CopyCat saves checkpoints as .cat files in the data directory, the step is the last number of the name
+_CHECKPOINT_STEP = re.compile(r"(\d+)\D*\.cat$", re.IGNORECASE)
+# A checkpoint much smaller than the others was cut short when its task died
+CHECKPOINT_MIN_SIZE_RATIO = 0.9
+
+def findCheckpoints(directory, newerThan=0.0):
+    """Checkpoints in directory written after newerThan (a timestamp), as (step, path) sorted by step."""
+    checkpoints = []
+    if not os.path.isdir(directory):
+        return checkpoints
+    for fileName in os.listdir(directory):
+        match = _CHECKPOINT_STEP.search(fileName)
+        path = os.path.join(directory, fileName)
+        if match and os.path.isfile(path) and os.path.getmtime(path) >= newerThan:
+            checkpoints.append((int(match.group(1)), path))
+    checkpoints.sort(key=lambda checkpoint: (checkpoint[0], os.path.getmtime(checkpoint[1])))
+    return checkpoints
+
+def findLatestCheckpoint(directory, newerThan=0.0):
+    """The checkpoint with the highest step that looks complete, None if there is none.
+
+    Returns (step, path, reasons), reasons explain the checkpoints that were skipped.
+    """
+    checkpoints = findCheckpoints(directory, newerThan)
+    sizes = sorted(os.path.getsize(path) for _, path in checkpoints)
+    typicalSize = sizes[len(sizes) // 2] if sizes else 0
+    reasons = []
+    for step, path in reversed(checkpoints):
+        size = os.path.getsize(path)
+        if size == 0 or size < CHECKPOINT_MIN_SIZE_RATIO * typicalSize:
+            reasons.append(f"Skipped {os.path.basename(path)}, {size} bytes against {typicalSize} for the other checkpoints")
+            continue
+        return step, path, reasons
+    return None
+
+# CopyCat's training output, "Step 1200/10000", "epoch 3 of 20", "loss: 0.0123" in any case
+STEP_PATTERN = re.compile(r"\bstep\b\D{0,3}(\d+)\s*(?:/|of)\s*(\d+)", re.IGNORECASE)
+EPOCH_PATTERN = re.compile(r"\bepoch\b\D{0,3}(\d+)\s*(?:/|of)\s*(\d+)", re.IGNORECASE)
+LOSS_PATTERN = re.compile(r"\bloss\b\s*[:=]?\s*([-+]?\d*\.?\d+(?:[eE][-+]?\d+)?)", re.IGNORECASE)
+# Steps per second are measured over this many seconds of output
+RATE_WINDOW_SECONDS = 120.0
+
+def formatDuration(seconds):
+    seconds = int(seconds)
+    if seconds >= 3600:
+        return f"{seconds // 3600}h{(seconds % 3600) // 60:02d}m"
+    if seconds >= 60:
+        return f"{seconds // 60}m{seconds % 60:02d}s"
+    return f"{seconds}s"
+
+class TrainingProgress(object):
+    """Follows step, epoch and loss in CopyCat's output and derives progress, steps per second and ETA."""
+
+    def __init__(self, worldSize=1, batchSize=None, window=RATE_WINDOW_SECONDS):
+        self.worldSize = worldSize
+        self.batchSize = batchSize
+        self.window = window
+        self.step = None
+        self.totalSteps = None
+        self.epoch = None
+        self.totalEpochs = None
+        self.loss = None
+        self._samples = collections.deque()
+
+    def parseLine(self, line, now=None):
+        """Updates from one line of output, returns True when it had anything on training."""
+        found = False
+        match = STEP_PATTERN.search(line)
+        if match:
+            self.updateStep(int(match.group(1)), int(match.group(2)), now)
+            found = True
+        match = EPOCH_PATTERN.search(line)
+        if match:
+            self.epoch, self.totalEpochs = int(match.group(1)), int(match.group(2))
+            found = True
+        match = LOSS_PATTERN.search(line)
+        if match:
+            self.loss = float(match.group(1))
+            found = True
+        return found
+
+    def updateStep(self, step, totalSteps, now=None):
+        now = time.time() if now is None else now
+        self.step = step
+        self.totalSteps = totalSteps
+        self._samples.append((now, step))
+        while len(self._samples) > 2 and now - self._samples[0][0] > self.window:
+            self._samples.popleft()
+
+    def progress(self):
+        """Percent done, None until CopyCat printed a step or an epoch."""
+        if self.step is not None and self.totalSteps:
+            return min(100.0, 100.0 * self.step / self.totalSteps)
+        if self.epoch is not None and self.totalEpochs:
+            return min(100.0, 100.0 * self.epoch / self.totalEpochs)
+        return None
+
+    def stepsPerSecond(self):
+        # Only measured from this run's output, a resumed run starts counting at its checkpoint
+        if len(self._samples) < 2:
+            return None
+        (firstTime, firstStep), (lastTime, lastStep) = self._samples[0], self._samples[-1]
+        if lastTime <= firstTime or lastStep <= firstStep:
+            return None
+        return (lastStep - firstStep) / (lastTime - firstTime)
+
+    def etaSeconds(self):
+        rate = self.stepsPerSecond()
+        if not rate or self.step is None or not self.totalSteps:
+            return None
+        return max(0.0, (self.totalSteps - self.step) / rate)
+
+    def statusMessage(self):
+        parts = []
+        if self.step is not None:
+            parts.append(f"Step {self.step}/{self.totalSteps}")
+        if self.epoch is not None:
+            parts.append(f"Epoch {self.epoch}/{self.totalEpochs}")
+        if self.loss is not None:
+            parts.append(f"Loss {self.loss:.5g}")
+        rate = self.stepsPerSecond()
+        if rate:
+            rateText = f"{rate:.2f} steps/s"
+            if self.batchSize:
+                # Samples over all ranks, what to compare between world sizes for scaling efficiency
+                rateText += f" ({rate * self.batchSize * self.worldSize:.1f} samples/s on {self.worldSize} ranks)"
+            parts.append(rateText)
+        eta = self.etaSeconds()
+        if eta is not None:
+            parts.append("ETA " + formatDuration(eta))
+        return " | ".join(parts)
@@ -0,0 +1,478 @@
+#!/usr/bin/env python3
+"""
+Local farm simulator for the CopyCat plugin and submitter.
+
+Submits training jobs for N simulated workers with the submitter (CopyCatSubmission.py, and the
+dialog of SubmitNukeCopyCat.py) against a fake web service, then runs every task of them through
+the real CopyCatPlugin in a thread per Worker thread, on the Deadline, .NET and Nuke stand-ins of
+CopyCatStandIns.py. Nuke is a fake CopyCat that prints steps and losses. Every worker has a slow
+management interface and a fast one on 127.0.0.0/8 that reaches the main machine, so rendezvous
+and interface selection run for real on this machine (Linux, where all of 127/8 is local).
+
+    python CopyCatFarmSim.py --workers 200 --ranks-per-worker 2 --jobs 2
+
+Reports the time spent in the submission paths and in every setup phase of the tasks, and checks
+the environment the ranks were started with: every rank of a job exactly once, one world size,
+main address and port per job, rank 0 on the main machine, no GPU shared by two ranks of a machine
+and no port shared by two jobs. Exits with 1 when a check or a task fails.
+"""
+
+from __future__ import absolute_import
+import os
+import sys
+import json
+import time
+import uuid
+import random
+import shutil
+import argparse
+import tempfile
+import threading
+import traceback
+import importlib.util
+
+_HERE = os.path.dirname(os.path.abspath(__file__))
+PLUGIN_DIRECTORY = os.path.join(_HERE, os.pardir, "plugin", "CopyCat")
+SUBMITTER_DIRECTORY = os.path.join(_HERE, os.pardir, "customSubmmiter")
+sys.path.insert(0, _HERE)
+
+import CopyCatStandIns
+
+COPYCAT_NODE = "CopyCat1"
+# Waiting 10 minutes for a rank that crashed is no use here
+SIMULATOR_CONFIG = {"RendezvousTimeout": "60", "ReadyForInputTimeout": "60"}
+
+def readParamDefaults(path):
+    """Default of every entry of the plugin's .param file, as Deadline would fill in the configuration."""
+    defaults = {}
+    section = None
+    with open(path, "r") as f:
+        for line in f:
+            line = line.strip()
+            if line.startswith("[") and line.endswith("]"):
+                section = line[1:-1]
+            elif section and line.startswith("Default="):
+                defaults[section] = line[len("Default="):]
+    return defaults
+
+def writeScene(directory, nukeVersion="15.0"):
+    """A Nuke script with a Read feeding the CopyCat node, training into directory/training."""
+    scene = os.path.join(directory, "train.nk")
+    dataDirectory = os.path.join(directory, "training")
+    os.makedirs(dataDirectory, exist_ok=True)
+    lines = [
+        "#! /usr/local/Nuke15.0v4/nuke-15.0.4 -nx",
+        f"version {nukeVersion} v4",
+        "Root {",
+        " inputs 0",
+        f" name {scene}",
+        "}",
+        "Read {",
+        " inputs 0",
+        f" file {os.path.join(directory, 'plates', 'plate.####.exr')}",
+        " first 1",
+        " last 10",
+        " name Read1",
+        "}",
+        "CopyCat {",
+        f" dataDirectory {dataDirectory}",
+        " batchSize 4",
+        " modelSize Medium",
+        f" name {COPYCAT_NODE}",
+        "}",
+    ]
+    with open(scene, "w") as f:
+        f.write("\n".join(lines) + "\n")
+    return scene
+
+class SimulatedWorker(object):
+    def __init__(self, index, gpus, directory):
+        self.name = f"gpu{index + 1:03d}"
+        # The first worker is 127.0.0.1, the main machine of the first job
+        self.address = f"127.0.{index // 250}.{index % 250 + 1}"
+        self.interfaces = [("mgmt0", f"10.{index // 250}.{index % 250}.10", 16, 1e9),
+                           ("fabric0", self.address, 8, 100e9)]
+        self.gpuAffinity = [str(gpu) for gpu in range(gpus)]
+        self.directory = os.path.join(directory, self.name)
+        # What is local on a real worker
+        self.config = {"SceneCacheDirectory": os.path.join(self.directory, "scene_cache"),
+                       "DatasetCacheDirectory": os.path.join(self.directory, "dataset_cache")}
+
+class SimulatedJob(object):
+    def __init__(self, jobId, jobInfo, pluginInfo, auxFiles, config, training):
+        self.JobId = jobId
+        self.JobName = jobInfo["Name"]
+        self.JobSubmitDateTime = CopyCatStandIns.DateTimeValue(time.time())
+        self.jobInfo = jobInfo
+        # Deadline hands out every plugin info entry as a string
+        self.pluginInfo = dict((key, str(value)) for key, value in pluginInfo.items())
+        self.auxiliaryFilenames = [auxFiles] if isinstance(auxFiles, str) else list(auxFiles)
+        self.config = config
+        self.training = training
+
+class SimulatedTask(object):
+    def __init__(self, worker, job, thread, directory):
+        self.worker = worker
+        self.job = job
+        self.thread = thread
+        self.temporaryDirectory = directory
+        self.output = []
+        self.progress = 0.0
+        self.status = ""
+        self.canceled = False
+        self.processes = []
+        self.error = None
+        self.timings = {}
+        self.trace = None
+
+    def config(self):
+        config = dict(self.job.config)
+        config.update(self.worker.config)
+        return config
+
+    def log(self, message):
+        self.output.append(str(message))
+
+    def describe(self):
+        return f"{self.worker.name} thread {self.thread}"
+
+class _TaskOutput(object):
+    """sys.stdout that sends what the plugin prints on a task thread to the task's log."""
+
+    def __init__(self, stream):
+        self.stream = stream
+
+    def write(self, text):
+        task = CopyCatStandIns.currentTask()
+        if task is None:
+            return self.stream.write(text)
+        if text.strip():
+            task.output.append(text.rstrip("\n"))
+        return len(text)
+
+    def flush(self):
+        self.stream.flush()
+
+class _FakeJobs(object):
+    def __init__(self, submitted, seconds):
+        self.submitted = submitted
+        self.seconds = seconds
+
+    def SubmitJob(self, jobInfo, pluginInfo, auxFiles):
+        time.sleep(self.seconds)
+        job = {"_id": uuid.uuid4().hex[:24], "Props": jobInfo, "PluginInfo": pluginInfo, "AuxFiles": auxFiles}
+        self.submitted.append(job)
+        return job
+
+class FakeConnection(object):
+    """The part of the web service client (CopyCatWebService.py) the submitter uses, jobs are kept for the farm."""
+
+    def __init__(self, seconds=0.0):
+        self.submitted = []
+        self.Jobs = _FakeJobs(self.submitted, seconds)
+
+def statistics(values):
+    values = sorted(values)
+    if not values:
+        return None
+    def percentile(fraction):
+        return values[min(len(values) - 1, int(round(fraction * (len(values) - 1))))]
+    return {"Count": len(values), "Mean": sum(values) / len(values), "P50": percentile(0.5), "P95": percentile(0.95), "Max": values[-1]}
+
+def loadPlugin():
+    spec = importlib.util.spec_from_file_location("CopyCat", os.path.join(PLUGIN_DIRECTORY, "CopyCat.py"))
+    module = importlib.util.module_from_spec(spec)
+    sys.modules["CopyCat"] = module
+    spec.loader.exec_module(module)
+    return module
+
+def runTask(plugin, task, jitter):
+    """One task the way a Worker thread runs it: load the plugin, StartJob, RenderTasks, EndJob, clean up."""
+    CopyCatStandIns.setCurrentTask(task)
+    time.sleep(random.uniform(0.0, jitter))
+    deadlinePlugin = None
+    try:
+        start = time.time()
+        deadlinePlugin = plugin.GetDeadlinePlugin()
+        deadlinePlugin.InitializeProcessCallback()
+        for callback in ("StartJobCallback", "RenderTasksCallback", "EndJobCallback"):
+            callbackStart = time.time()
+            getattr(deadlinePlugin, callback)()
+            task.timings[callback.replace("Callback", "")] = time.time() - callbackStart
+        task.timings["Task"] = time.time() - start
+    except CopyCatStandIns.RenderFailure as e:
+        task.error = str(e)
+    except Exception:
+        task.error = traceback.format_exc()
+    finally:
+        if deadlinePlugin is not None:
+            task.trace = deadlinePlugin.Tracer.trace()
+            try:
+                plugin.CleanupDeadlinePlugin(deadlinePlugin)
+            except Exception:
+                task.error = task.error or traceback.format_exc()
+        CopyCatStandIns.setCurrentTask(None)
+
+def checkRanks(job, tasks):
+    """Problems with the environment the ranks of a job were started with."""
+    problems = []
+    launches = [(task, task.processes[0]["Environment"]) for task in tasks if task.processes]
+    if not launches:
+        return ["no rank started"]
+    elastic = job.pluginInfo.get("Elastic", "False") == "True"
+
+    ranks = {}
+    for task, environment in launches:
+        try:
+            rank = int(environment.get("COPYCAT_RANK", ""))
+        except ValueError:
+            problems.append(f"{task.describe()} has no COPYCAT_RANK")
+            continue
+        ranks.setdefault(rank, []).append(task)
+    for rank, owners in sorted(ranks.items()):
+        if len(owners) > 1:
+            problems.append(f"rank {rank} collides: {', '.join(task.describe() for task in owners)}")
+
+    for name in ("COPYCAT_WORLD_SIZE", "COPYCAT_MAIN_ADDR", "COPYCAT_MAIN_PORT"):
+        values = set(environment.get(name) for _, environment in launches)
+        if len(values) > 1:
+            problems.append(f"ranks disagree on {name}: {', '.join(sorted(str(value) for value in values))}")
+    worldSize = int(launches[0][1].get("COPYCAT_WORLD_SIZE", 0))
+    if not elastic and worldSize != int(job.pluginInfo["WorldSize"]):
+        problems.append(f"world size {worldSize}, the job was submitted with {job.pluginInfo['WorldSize']}")
+    missing = sorted(set(range(worldSize)) - set(ranks))
+    if missing and len(launches) >= worldSize:
+        problems.append(f"ranks {', '.join(str(rank) for rank in missing)} were never started")
+    outside = sorted(rank for rank in ranks if not 0 <= rank < worldSize)
+    if outside:
+        problems.append(f"ranks {', '.join(str(rank) for rank in outside)} are outside the world of {worldSize}")
+    if not elastic and 0 in ranks and ranks[0][0].worker.name.lower() != job.pluginInfo["MainMachine"].lower():
+        problems.append(f"rank 0 runs on {ranks[0][0].worker.name}, not on the main machine {job.pluginInfo['MainMachine']}")
+
+    gpus = {}
+    for task, environment in launches:
+        if environment.get("COPYCAT_LOCAL_ADDR") != task.worker.address:
+            problems.append(f"{task.describe()} trains on {environment.get('COPYCAT_LOCAL_ADDR')}, not on its fabric interface {task.worker.address}")
+        for gpu in [gpu for gpu in environment.get("EDDY_DEVICE_LIST", "").split(",") if gpu != ""]:
+            gpus.setdefault((task.worker.name, gpu), []).append(task)
+    for (machine, gpu), owners in sorted(gpus.items()):
+        if len(owners) > 1:
+            problems.append(f"GPU {gpu} of {machine} is used by {', '.join(task.describe() for task in owners)}")
+    return problems
+
+def checkJobPorts(jobs, tasksByJob):
+    """Jobs training at the same time must not share a main address and port (CopyCat's and the rendezvous' after it)."""
+    problems = []
+    used = {}
+    for job in jobs:
+        for task in tasksByJob[job.JobId]:
+            if not task.processes:
+                continue
+            environment = task.processes[0]["Environment"]
+            address, port = environment.get("COPYCAT_MAIN_ADDR"), int(environment.get("COPYCAT_MAIN_PORT", 0))
+            for usedPort in (port, port + 1):
+                owner = used.setdefault((address, usedPort), job.JobId)
+                if owner != job.JobId:
+                    problems.append(f"jobs {owner} and {job.JobId} both use {address}:{usedPort}")
+            break
+    return problems
+
+def firstStepSkew(tasks):
+    """Seconds between the first and the last rank of a job reaching its first training step."""
+    times = []
+    for task in tasks:
+        for event in (task.trace or {}).get("traceEvents", []):
+            if event.get("name") == "first training step":
+                times.append(event["ts"] / 1e6)
+                break
+    return max(times) - min(times) if len(times) > 1 else 0.0
+
+def simulate(args):
+    directory = args.work_directory or tempfile.mkdtemp(prefix="copycat_farm_")
+    os.makedirs(directory, exist_ok=True)
+    random.seed(args.seed)
+
+    CopyCatStandIns.install()
+    for path in (PLUGIN_DIRECTORY, SUBMITTER_DIRECTORY):
+        if path not in sys.path:
+            sys.path.insert(0, path)
+    plugin = loadPlugin()
+    import nuke
+    import CopyCatDeadline
+    import CopyCatNetwork
+    import CopyCatSubmission
+    import SubmitNukeCopyCat
+
+    gpus = args.gpus_per_worker or args.ranks_per_worker
+    workers = [SimulatedWorker(index, gpus, os.path.join(directory, "workers")) for index in range(args.workers)]
+    byName = dict((worker.name, worker) for worker in workers)
+
+    # The farm as the submitter sees it: the CopyCat group, a warm farm info cache and DNS
+    farmInfo = {"Pools": ["none", "copycat"], "Groups": ["none", "copycat"], "MaxPriority": 100, "Timestamp": time.time(),
+                "GroupMachines": {CopyCatDeadline.COPYCAT_GROUP: [worker.name for worker in workers]},
+                "Workers": dict((worker.name, {"State": "Idle", "Enabled": True, "HeartbeatAge": 5, "Gpus": gpus, "FreeMemory": 64 << 30}) for worker in workers)}
+    cache = CopyCatDeadline.FarmInfoCache(os.path.join(directory, "farm_info.json"))
+    cache.save(farmInfo)
+    CopyCatDeadline._farmInfoCache = cache
+
+    def resolveHost(hostname):
+        time.sleep(args.dns_seconds)
+        worker = byName.get(hostname.lower())
+        return {"ipv4": worker.address if worker else None, "ipv6": None}
+    CopyCatNetwork.resolveHost = resolveHost
+
+    scene = writeScene(directory)
+    config = readParamDefaults(os.path.join(PLUGIN_DIRECTORY, "CopyCat.param"))
+    config.update(SIMULATOR_CONFIG)
+    for item in args.config:
+        key, _, value = item.partition("=")
+        config[key] = value
+    training = {"StartupSeconds": args.startup_seconds, "Steps": args.steps, "StepSeconds": args.step_seconds}
+
+    # Submission
+    report = {"Submission": {}, "Tasks": {}, "Jobs": [], "Failures": [], "Problems": []}
+    submissionTimes = {}
+    def timed(name, function, *functionArgs, **functionKwargs):
+        start = time.time()
+        result = function(*functionArgs, **functionKwargs)
+        submissionTimes.setdefault(name, []).append(time.time() - start)
+        return result
+
+    connection = FakeConnection(args.submit_seconds)
+    submitter = CopyCatSubmission.CopyCatSubmitter(connection)
+    perJob = max(1, args.workers // args.jobs)
+    for index in range(args.jobs):
+        machines = [worker.name for worker in workers[index * perJob:(index + 1) * perJob]]
+        if not machines:
+            break
+        settings = timed("prepareSettings", CopyCatSubmission.prepareSettings, scene, COPYCAT_NODE, Name=f"simulated job {index + 1}",
+                         TrainingSlaves=machines, RanksPerWorker=args.ranks_per_worker, Port=args.port + 10 * index,
+                         BatchMode=args.batch_mode, Elastic=args.elastic, RankOrder=args.rank_order)
+        timed("submit", submitter.submit, settings)
+
+    if args.dialog:
+        nuke.scriptOpen(scene)
+        nuke.toNode(COPYCAT_NODE).selected = True
+        dialog = timed("dialog open", SubmitNukeCopyCat.CopyCatStandaloneDialog, SubmitNukeCopyCat.getCopyCatNodes())
+        timed("dialog job and plugin info", lambda: (dialog.getJobInfoDict(), dialog.getPluginInfo()))
+    for name, values in submissionTimes.items():
+        report["Submission"][name] = statistics(values)
+
+    # The farm
+    jobs = [SimulatedJob(submitted["_id"], submitted["Props"], submitted["PluginInfo"], submitted["AuxFiles"], config, training) for submitted in connection.submitted]
+    tasksByJob = {}
+    threads = []
+    farmStart = time.time()
+    realStdout = sys.stdout
+    sys.stdout = _TaskOutput(realStdout)
+    try:
+        for job in jobs:
+            tasks = tasksByJob.setdefault(job.JobId, [])
+            for machine in CopyCatSubmission.getMachineList(job.pluginInfo["TrainingSlaves"]):
+                worker = byName[machine.lower()]
+                for thread in range(int(job.jobInfo["ConcurrentTasks"])):
+                    task = SimulatedTask(worker, job, thread, os.path.join(worker.directory, job.JobId, f"thread{thread}"))
+                    tasks.append(task)
+                    threads.append(threading.Thread(target=runTask, args=(plugin, task, args.pickup_jitter), name=f"{worker.name}-{thread}", daemon=True))
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        sys.stdout = realStdout
+    farmSeconds = time.time() - farmStart
+
+    # Timings and checks
+    taskTimes = {}
+    for tasks in tasksByJob.values():
+        for task in tasks:
+            for name, seconds in task.timings.items():
+                taskTimes.setdefault(name, []).append(seconds)
+            for event in (task.trace or {}).get("traceEvents", []):
+                if event.get("ph") == "X":
+                    taskTimes.setdefault(event["name"], []).append(event["dur"] / 1e6)
+            if task.error:
+                report["Failures"].append({"Job": task.job.JobId, "Task": task.describe(), "Error": task.error, "Log": task.output[-args.log_lines:]})
+    for name, values in taskTimes.items():
+        report["Tasks"][name] = statistics(values)
+    for job in jobs:
+        problems = checkRanks(job, tasksByJob[job.JobId])
+        report["Jobs"].append({"JobId": job.JobId, "Name": job.JobName, "WorldSize": int(job.pluginInfo["WorldSize"]),
+                               "Ranks": sum(1 for task in tasksByJob[job.JobId] if task.processes),
+                               "FirstStepSkew": firstStepSkew(tasksByJob[job.JobId]), "Problems": problems})
+        report["Problems"].extend(f"{job.JobName}: {problem}" for problem in problems)
+    report["Problems"].extend(checkJobPorts(jobs, tasksByJob))
+    report["FarmSeconds"] = farmSeconds
+    report["Tasks"]["Count"] = len(threads)
+
+    if not args.work_directory and not args.keep:
+        shutil.rmtree(directory, ignore_errors=True)
+    else:
+        report["WorkDirectory"] = directory
+    return report
+
+# Setup phases in the order a task goes through them
+_TASK_ORDER = ("StartJob", "scrubLibPaths", "prepForOFX", "SetupCopyCatEnv", "Nuke version lookup", "warm Nuke startup", "RenderTasks",
+               "rendezvous", "scene path mapping", "dataset staging", "resume checkpoint", "Nuke startup", "EndJob", "Task")
+
+def formatReport(report, args):
+    lines = [f"{args.workers} workers x {args.ranks_per_worker} ranks, {len(report['Jobs'])} jobs, {report['Tasks']['Count']} tasks in {report['FarmSeconds']:.1f}s"]
+    def table(title, timings, order=()):
+        lines.append("")
+        lines.append(f"{title:<32}{'count':>7}{'mean':>10}{'p50':>10}{'p95':>10}{'max':>10}")
+        names = [name for name in order if name in timings] + sorted(name for name in timings if name not in order and name != "Count")
+        for name in names:
+            values = timings[name]
+            lines.append(f"  {name:<30}{values['Count']:>7}" + "".join(f"{values[key] * 1000:>8.1f}ms" for key in ("Mean", "P50", "P95", "Max")))
+    table("Submission", report["Submission"])
+    table("Task setup", report["Tasks"], _TASK_ORDER)
+
+    lines.append("")
+    for job in report["Jobs"]:
+        status = "OK" if not job["Problems"] else f"{len(job['Problems'])} problems"
+        lines.append(f"{job['Name']} ({job['JobId']}): {job['Ranks']} of {job['WorldSize']} ranks started, first step skew {job['FirstStepSkew'] * 1000:.0f}ms, {status}")
+    for problem in report["Problems"]:
+        lines.append(f"  PROBLEM {problem}")
+    for failure in report["Failures"]:
+        lines.append(f"  FAILED {failure['Task']} of {failure['Job']}: {failure['Error'].strip()}")
+        lines.extend(f"      {line}" for line in failure["Log"])
+    if "WorkDirectory" in report:
+        lines.append(f"Work directory: {report['WorkDirectory']}")
+    return "\n".join(lines)
+
+def parseArguments(argv=None):
+    parser = argparse.ArgumentParser(description="Run CopyCat jobs on a simulated farm and report setup times and rank problems.")
+    parser.add_argument("--workers", type=int, default=16, help="simulated workers, split evenly between the jobs")
+    parser.add_argument("--ranks-per-worker", type=int, default=1)
+    parser.add_argument("--gpus-per-worker", type=int, default=0, help="defaults to ranks per worker")
+    parser.add_argument("--jobs", type=int, default=1, help="jobs training at the same time")
+    parser.add_argument("--batch-mode", action="store_true", help="train in a warm Nuke per Worker thread")
+    parser.add_argument("--elastic", action="store_true")
+    parser.add_argument("--rank-order", choices=("list", "topology"), default="list")
+    parser.add_argument("--port", type=int, default=23000, help="CopyCat port of the first job, every next job adds 10")
+    parser.add_argument("--steps", type=int, default=20, help="training steps the fake CopyCat prints")
+    parser.add_argument("--step-seconds", type=float, default=0.01)
+    parser.add_argument("--startup-seconds", type=float, default=0.2, help="Nuke startup until the first step")
+    parser.add_argument("--pickup-jitter", type=float, default=0.5, help="tasks are picked up at random within this many seconds")
+    parser.add_argument("--dns-seconds", type=float, default=0.001, help="time every host lookup of the submitter takes")
+    parser.add_argument("--submit-seconds", type=float, default=0.05, help="time the web service takes for a submission")
+    parser.add_argument("--no-dialog", dest="dialog", action="store_false", help="don't time the Nuke submitter dialog")
+    parser.add_argument("--config", action="append", default=[], metavar="KEY=VALUE", help="plugin configuration entry, on top of the .param defaults")
+    parser.add_argument("--work-directory", help="kept after the run, a temporary directory is used otherwise")
+    parser.add_argument("--keep", action="store_true", help="keep the temporary work directory")
+    parser.add_argument("--log-lines", type=int, default=10, help="last log lines shown for failed tasks")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", help="write the report as JSON")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parseArguments(argv)
+    report = simulate(args)
+    print(formatReport(report, args))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+    return 1 if report["Problems"] or report["Failures"] else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
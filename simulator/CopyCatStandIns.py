@@ -0,0 +1,718 @@
+"""
+Stand-ins for the Deadline, .NET and Nuke APIs used by CopyCat.py and SubmitNukeCopyCat.py.
+
+`install()` registers them as the System, Deadline, FranticX, nuke and nukescripts modules so the
+plugin and the submitter dialog import and run in plain Python. Whatever a Worker would answer
+(plugin info, configuration, machine name, network interfaces, GPUs) comes from the
+SimulatedTask of the calling thread, which CopyCatFarmSim.py sets up. Nuke is FakeNuke, it prints
+what CopyCat prints while training and records the environment every rank was started with.
+"""
+
+from __future__ import absolute_import
+import os
+import re
+import ast
+import sys
+import time
+import types
+import shlex
+import shutil
+import tempfile
+import threading
+import subprocess
+
+_current = threading.local()
+
+# (from, to) rules of the simulated repository's path mapping
+PATH_MAPPING = []
+
+def currentTask():
+    return getattr(_current, "task", None)
+
+def setCurrentTask(task):
+    _current.task = task
+
+class RenderFailure(Exception):
+    """What FailRender raises, Deadline stops the task on it."""
+    pass
+
+class Event(object):
+    """A .NET event, handlers are added with += and the owner drops them with del."""
+
+    def __init__(self):
+        self.handlers = []
+
+    def __iadd__(self, handler):
+        self.handlers.append(handler)
+        return self
+
+    def __call__(self, *args):
+        result = None
+        for handler in self.handlers:
+            result = handler(*args)
+        return result
+
+def _mapPath(path):
+    for source, target in PATH_MAPPING:
+        if path.startswith(source):
+            return target + path[len(source):]
+    return path
+
+######################################################################
+## System
+######################################################################
+class TimeSpan(object):
+    def __init__(self, seconds):
+        self.TotalSeconds = seconds
+
+class DateTimeValue(object):
+    def __init__(self, seconds):
+        self.Seconds = seconds
+
+    def ToUniversalTime(self):
+        return self
+
+    def __sub__(self, other):
+        return TimeSpan(self.Seconds - other.Seconds)
+
+class _DateTime(object):
+    @property
+    def UtcNow(self):
+        return DateTimeValue(time.time())
+
+class Environment(object):
+    @staticmethod
+    def GetEnvironmentVariable(name):
+        return os.environ.get(name)
+
+class ProcessPriorityClass(object):
+    Normal = "Normal"
+    BelowNormal = "BelowNormal"
+
+class ProcessStartInfo(object):
+    def __init__(self, fileName, arguments=""):
+        self.FileName = fileName
+        self.Arguments = arguments
+        self.RedirectStandardOutput = False
+        self.UseShellExecute = True
+
+class _StreamReader(object):
+    def __init__(self, stream):
+        self._stream = stream
+
+    def ReadLine(self):
+        return self._stream.readline().rstrip("\r\n")
+
+    def Close(self):
+        self._stream.close()
+
+    def Dispose(self):
+        pass
+
+class Process(object):
+    def __init__(self):
+        self.StartInfo = None
+        self.StandardOutput = None
+        self._process = None
+
+    def Start(self):
+        stdout = subprocess.PIPE if self.StartInfo.RedirectStandardOutput else None
+        self._process = subprocess.Popen([self.StartInfo.FileName] + shlex.split(self.StartInfo.Arguments), stdout=stdout, universal_newlines=True)
+        if stdout:
+            self.StandardOutput = _StreamReader(self._process.stdout)
+
+    def WaitForExit(self):
+        self._process.wait()
+
+    def Close(self):
+        pass
+
+    def Dispose(self):
+        pass
+
+class Path(object):
+    @staticmethod
+    def Combine(*parts):
+        return os.path.join(*parts)
+
+    @staticmethod
+    def GetFileName(path):
+        return os.path.basename(path)
+
+    @staticmethod
+    def GetTempPath():
+        return tempfile.gettempdir() + os.sep
+
+class Directory(object):
+    @staticmethod
+    def Exists(path):
+        return os.path.isdir(path)
+
+    @staticmethod
+    def CreateDirectory(path):
+        os.makedirs(path, exist_ok=True)
+
+class File(object):
+    @staticmethod
+    def Exists(path):
+        return os.path.isfile(path)
+
+    @staticmethod
+    def Delete(path):
+        if os.path.isfile(path):
+            os.remove(path)
+
+class AddressFamily(object):
+    InterNetwork = "InterNetwork"
+    InterNetworkV6 = "InterNetworkV6"
+
+class NetworkInterfaceType(object):
+    Ethernet = "Ethernet"
+    Loopback = "Loopback"
+
+class OperationalStatus(object):
+    Up = "Up"
+    Down = "Down"
+
+class _IPAddress(object):
+    def __init__(self, address):
+        self._address = address
+        self.AddressFamily = AddressFamily.InterNetworkV6 if ":" in address else AddressFamily.InterNetwork
+
+    def ToString(self):
+        return self._address
+
+class _UnicastAddress(object):
+    def __init__(self, address, prefixLength):
+        self.Address = _IPAddress(address)
+        self.PrefixLength = prefixLength
+
+class _IPProperties(object):
+    def __init__(self, unicastAddresses):
+        self.UnicastAddresses = unicastAddresses
+
+class _NetworkInterface(object):
+    def __init__(self, name, address, prefixLength, speed):
+        self.Name = name
+        self.Speed = speed
+        self.OperationalStatus = OperationalStatus.Up
+        self.NetworkInterfaceType = NetworkInterfaceType.Ethernet
+        self._properties = _IPProperties([_UnicastAddress(address, prefixLength)])
+
+    def GetIPProperties(self):
+        return self._properties
+
+class NetworkInterface(object):
+    @staticmethod
+    def GetAllNetworkInterfaces():
+        """The interfaces of the simulated machine the calling thread runs a task on."""
+        return [_NetworkInterface(*interface) for interface in currentTask().worker.interfaces]
+
+######################################################################
+## Deadline.Scripting
+######################################################################
+class RepositoryUtils(object):
+    @staticmethod
+    def CheckPathMapping(path):
+        return _mapPath(path)
+
+    @staticmethod
+    def CheckPathMappingInFileAndReplace(inFileName, outFileName, stringsToReplace, newStrings):
+        with open(inFileName, "r", encoding="utf-8", errors="surrogateescape") as f:
+            text = f.read()
+        for source, target in PATH_MAPPING:
+            text = text.replace(source, target)
+        for old, new in zip(stringsToReplace, newStrings):
+            text = text.replace(old, new)
+        with open(outFileName, "w", encoding="utf-8", errors="surrogateescape") as f:
+            f.write(text)
+
+class SystemUtils(object):
+    @staticmethod
+    def IsRunningOnWindows():
+        return os.name == "nt"
+
+    @staticmethod
+    def IsRunningOnLinux():
+        return sys.platform.startswith("linux")
+
+    @staticmethod
+    def IsRunningOnMac():
+        return sys.platform == "darwin"
+
+    @staticmethod
+    def Sleep(milliseconds):
+        time.sleep(milliseconds / 1000.0)
+
+class PathUtils(object):
+    @staticmethod
+    def GetApplicationPath(name):
+        return shutil.which(name) or ""
+
+######################################################################
+## FranticX.Processes and the Nuke behind them
+######################################################################
+_PROCESS_EVENTS = ("InitializeProcessCallback", "RenderExecutableCallback", "RenderArgumentCallback", "PreRenderTasksCallback", "PostRenderTasksCallback")
+
+class StdoutHandler(object):
+    def __init__(self, pattern):
+        self.Regex = re.compile(pattern)
+        self.HandleCallback = Event()
+
+class ManagedProcess(object):
+    def __init__(self):
+        for name in _PROCESS_EVENTS:
+            setattr(self, name, Event())
+        self.StdoutHandlers = []
+        self.PopupHandlers = []
+        self._match = None
+
+    def AddStdoutHandlerCallback(self, pattern):
+        handler = StdoutHandler(pattern)
+        self.StdoutHandlers.append(handler)
+        return handler
+
+    def AddPopupHandler(self, title, button):
+        self.PopupHandlers.append((title, button))
+
+    def GetRegexMatch(self, index):
+        return self._match.group(index)
+
+    def _handleLine(self, line):
+        for handler in self.StdoutHandlers:
+            match = handler.Regex.search(line)
+            if match:
+                self._match = match
+                handler.HandleCallback()
+
+class FakeNuke(object):
+    """The Nuke of one task: startup, a license checkout and CopyCat's step and loss lines.
+
+    Started with a scene it trains right away, started with -t it reads Python like Nuke's
+    interpreter does and trains whenever CopyCatBatch.train is sent. Lines are handed to the
+    process's stdout handlers when they are due and the output is flushed.
+    """
+
+    def __init__(self, plugin, process):
+        self.plugin = plugin
+        self.process = process
+        self.task = plugin._task
+        self.training = self.task.job.training
+        self.arguments = ""
+        self.exited = False
+        self._lines = []
+        self._lock = threading.Lock()
+
+    def start(self):
+        self.process.InitializeProcessCallback()
+        self.process.PreRenderTasksCallback()
+        self.executable = self.process.RenderExecutableCallback()
+        self.arguments = self.process.RenderArgumentCallback()
+        self._queue(["Nuke 15.0v4, 64 bit, built Mar 14 2024.", "Loading plugins..."], 0.0)
+        if "-t" not in self.arguments.split():
+            self._train(dict(self.plugin._environment))
+        return self
+
+    def _queue(self, lines, delay):
+        due = time.time() + delay
+        with self._lock:
+            self._lines.extend((due, line) for line in lines)
+
+    def _train(self, environment):
+        self.task.processes.append({"Arguments": self.arguments, "Environment": environment, "Started": time.time()})
+        startup = self.training["StartupSeconds"]
+        steps = self.training["Steps"]
+        self._queue(["Checking out license nuke_r", "CopyCat: connecting to the other ranks"], startup * 0.5)
+        for step in range(1, steps + 1):
+            self._queue([f"CopyCat: Step {step}/{steps}, Loss: {1.0 / (step + 1):.5f}"], startup + step * self.training["StepSeconds"])
+        self._queue(["Frame 1 (1 of 1)"], startup + steps * self.training["StepSeconds"])
+
+    def write(self, text):
+        if text == "quit()":
+            self.exited = True
+        elif text.startswith("CopyCatBatch.train("):
+            task = ast.literal_eval(text[len("CopyCatBatch.train("):text.rindex(")")].strip())
+            self._train(dict(task["Environment"]))
+        elif "READY FOR INPUT" in text:
+            # After everything before it, like Nuke's interpreter
+            with self._lock:
+                due = max([time.time()] + [lineDue for lineDue, _ in self._lines])
+                self._lines.append((due, "READY FOR INPUT"))
+
+    def flush(self, handle=True):
+        now = time.time()
+        with self._lock:
+            due = [line for lineDue, line in self._lines if lineDue <= now]
+            self._lines = [(lineDue, line) for lineDue, line in self._lines if lineDue > now]
+        if handle:
+            for line in due:
+                self.process._handleLine(line)
+
+    def runToExit(self):
+        """Command line training, until the last line is out."""
+        while True:
+            with self._lock:
+                remaining = [lineDue for lineDue, _ in self._lines]
+            if not remaining:
+                break
+            time.sleep(max(0.0, min(min(remaining) - time.time(), 0.05)))
+            self.flush()
+            if self.task.canceled:
+                raise RenderFailure("Received cancel task command")
+        self.exited = True
+
+    def waitForExit(self, timeout):
+        """Nuke started with a scene exits once its last line is out, with -t it runs until it quits."""
+        deadline = time.time() + timeout
+        while not self.exited and "-t" not in self.arguments.split():
+            with self._lock:
+                remaining = [lineDue for lineDue, _ in self._lines]
+            if max(remaining + [0.0]) <= time.time():
+                self.exited = True
+            elif time.time() >= deadline:
+                break
+            else:
+                time.sleep(max(0.0, min(deadline - time.time(), 0.05)))
+        return self.exited
+
+    def shutdown(self):
+        self.exited = True
+        self.process.PostRenderTasksCallback()
+
+######################################################################
+## Deadline.Plugins
+######################################################################
+class PluginType(object):
+    Simple = "Simple"
+    Advanced = "Advanced"
+
+_PLUGIN_EVENTS = ("InitializeProcessCallback", "StartJobCallback", "RenderTasksCallback", "EndJobCallback", "IsSingleFramesOnlyCallback")
+
+def _boolean(value):
+    return str(value).strip().lower() in ("true", "1", "yes", "on")
+
+class DeadlinePlugin(object):
+    """Answers for the SimulatedTask of the thread the plugin is created on."""
+
+    def __init__(self):
+        for name in _PLUGIN_EVENTS:
+            setattr(self, name, Event())
+        self.SingleFramesOnly = False
+        self.PluginType = PluginType.Simple
+        self._task = currentTask()
+        self._environment = {}
+        self._processes = {}
+
+    def LogInfo(self, message):
+        self._task.log(message)
+
+    def LogWarning(self, message):
+        self._task.log("WARNING: " + message)
+
+    def FailRender(self, message):
+        raise RenderFailure(message)
+
+    def GetPluginInfoEntry(self, key):
+        if key not in self._task.job.pluginInfo:
+            raise RenderFailure(f"Plugin info entry {key} is missing")
+        return self._task.job.pluginInfo[key]
+
+    def GetPluginInfoEntryWithDefault(self, key, default):
+        return self._task.job.pluginInfo.get(key, default)
+
+    def GetIntegerPluginInfoEntry(self, key):
+        return int(self.GetPluginInfoEntry(key))
+
+    def GetIntegerPluginInfoEntryWithDefault(self, key, default):
+        return int(self.GetPluginInfoEntryWithDefault(key, default))
+
+    def GetBooleanPluginInfoEntry(self, key):
+        return _boolean(self.GetPluginInfoEntry(key))
+
+    def GetBooleanPluginInfoEntryWithDefault(self, key, default):
+        return _boolean(self.GetPluginInfoEntryWithDefault(key, default))
+
+    def GetConfigEntry(self, key):
+        value = self._task.config().get(key)
+        if value is None:
+            raise RenderFailure(f"Plugin configuration entry {key} is missing")
+        return value
+
+    def GetConfigEntryWithDefault(self, key, default):
+        value = self._task.config().get(key)
+        return default if value is None else value
+
+    def GetIntegerConfigEntry(self, key):
+        return int(self.GetConfigEntry(key))
+
+    def GetIntegerConfigEntryWithDefault(self, key, default):
+        return int(self.GetConfigEntryWithDefault(key, default))
+
+    def GetBooleanConfigEntry(self, key):
+        return _boolean(self.GetConfigEntry(key))
+
+    def GetBooleanConfigEntryWithDefault(self, key, default):
+        return _boolean(self.GetConfigEntryWithDefault(key, default))
+
+    def GetThreadNumber(self):
+        return self._task.thread
+
+    def GetSlaveName(self):
+        return self._task.worker.name
+
+    def GetJob(self):
+        return self._task.job
+
+    def SetProcessEnvironmentVariable(self, name, value):
+        self._environment[name] = value
+
+    def GetProcessEnvironmentVariable(self, name):
+        return self._environment.get(name, "")
+
+    def SetProgress(self, progress):
+        self._task.progress = progress
+
+    def SetStatusMessage(self, message):
+        self._task.status = message
+
+    def IsCanceled(self):
+        return self._task.canceled
+
+    def CreateTempDirectory(self, name):
+        path = os.path.join(self._task.temporaryDirectory, name)
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    def GetDataFilename(self):
+        filenames = self.GetAuxiliaryFilenames()
+        return filenames[0] if filenames else ""
+
+    def GetAuxiliaryFilenames(self):
+        return list(self._task.job.auxiliaryFilenames)
+
+    def GetRenderExecutable(self, key, name):
+        # The first of the configured paths, nothing is started
+        return self.GetConfigEntryWithDefault(key, name).split(";")[0]
+
+    def OverrideGpuAffinity(self):
+        return bool(self._task.worker.gpuAffinity)
+
+    def GpuAffinity(self):
+        return list(self._task.worker.gpuAffinity)
+
+    def RunManagedProcess(self, process):
+        nuke = FakeNuke(self, process).start()
+        try:
+            nuke.runToExit()
+        finally:
+            nuke.shutdown()
+
+    def StartMonitoredManagedProcess(self, name, process):
+        self._processes[name] = FakeNuke(self, process).start()
+
+    def FlushMonitoredManagedProcessStdout(self, name):
+        self._processes[name].flush()
+
+    def FlushMonitoredManagedProcessStdoutNoHandling(self, name):
+        self._processes[name].flush(handle=False)
+
+    def WriteStdinToMonitoredManagedProcess(self, name, text):
+        self._processes[name].write(text)
+
+    def VerifyMonitoredManagedProcess(self, name):
+        if self._processes[name].exited:
+            raise RenderFailure(f"Monitored managed process {name} is no longer running")
+
+    def CheckForMonitoredManagedProcessPopups(self, name):
+        return ""
+
+    def WaitForMonitoredManagedProcessToExit(self, name, timeoutMilliseconds):
+        return self._processes[name].waitForExit(timeoutMilliseconds / 1000.0)
+
+    def ShutdownMonitoredManagedProcess(self, name):
+        self._processes.pop(name).shutdown()
+
+######################################################################
+## nuke and nukescripts
+######################################################################
+STARTLINE = 0x1000
+
+class Knob(object):
+    def __init__(self, name, label="", values=None):
+        self._name = name
+        self.label = label
+        self._values = list(values or [])
+        self._value = self._values[0] if self._values else self.default
+        self.tooltip = ""
+        self.enabled = True
+        self.flags = STARTLINE
+
+    default = ""
+
+    def name(self):
+        return self._name
+
+    def value(self):
+        return self._value
+
+    def setValue(self, value):
+        self._value = value
+
+    def setValues(self, values):
+        self._values = list(values)
+
+    def values(self):
+        return list(self._values)
+
+    def setTooltip(self, tooltip):
+        self.tooltip = tooltip
+
+    def setEnabled(self, enabled):
+        self.enabled = bool(enabled)
+
+    def setFlag(self, flag):
+        self.flags |= flag
+
+    def clearFlag(self, flag):
+        self.flags &= ~flag
+
+class Text_Knob(Knob):
+    pass
+
+class String_Knob(Knob):
+    pass
+
+class File_Knob(Knob):
+    pass
+
+class Multiline_Eval_String_Knob(Knob):
+    pass
+
+class PyScript_Knob(Knob):
+    pass
+
+class Enumeration_Knob(Knob):
+    pass
+
+class Int_Knob(Knob):
+    default = 0
+
+class Boolean_Knob(Knob):
+    default = False
+
+class Node(object):
+    def __init__(self, name, nodeClass, knobs):
+        self._name = name
+        self._class = nodeClass
+        self._knobs = dict((knob, String_Knob(knob)) for knob in knobs)
+        for knob, value in knobs.items():
+            self._knobs[knob].setValue(value)
+        self.selected = False
+
+    def name(self):
+        return self._name
+
+    def Class(self):
+        return self._class
+
+    def knobs(self):
+        return self._knobs
+
+    def __getitem__(self, name):
+        return self._knobs[name]
+
+    def modified(self):
+        return False
+
+class PythonPanel(object):
+    def __init__(self, title="", id=""):
+        self.title = title
+        self._knobs = []
+
+    def addKnob(self, knob):
+        self._knobs.append(knob)
+
+    def knobs(self):
+        return dict((knob.name(), knob) for knob in self._knobs)
+
+    def setMinimumSize(self, width, height):
+        pass
+
+    def setTooltip(self, tooltip):
+        # The dialog calls it on the panel itself
+        pass
+
+    def showModalDialog(self):
+        return True
+
+_script = {"Root": None, "Nodes": []}
+
+def _scriptOpen(path):
+    """Reads the nodes and their knobs from the .nk with the plugin's CopyCatScene."""
+    import CopyCatScene
+    nodes = []
+    root = Node("Root", "Root", {})
+    for sceneNode in CopyCatScene.iterNodes(CopyCatScene.readScriptLines(path)):
+        knobs = dict((name, sceneNode.knob(name)) for name in sceneNode.Knobs)
+        if sceneNode.Class == "Root":
+            root = Node(path, "Root", knobs)
+        else:
+            nodes.append(Node(sceneNode.name(), sceneNode.Class, knobs))
+    _script["Root"] = root
+    _script["Nodes"] = nodes
+
+def _scriptClear():
+    _script["Root"] = None
+    _script["Nodes"] = []
+
+def _root():
+    return _script["Root"] or Node("Root", "Root", {})
+
+def _toNode(name):
+    for node in _script["Nodes"]:
+        if node.name() == name:
+            return node
+    return None
+
+def _selectedNodes():
+    return [node for node in _script["Nodes"] if node.selected]
+
+def _executeInMainThread(function, args=(), kwargs=None):
+    return function(*args, **(kwargs or {}))
+
+def _module(name, **attributes):
+    module = types.ModuleType(name)
+    module.__dict__.update(attributes)
+    sys.modules[name] = module
+    return module
+
+def install(nukeVersion=(15, 0, 4)):
+    """Registers the stand-ins as the Deadline, System, FranticX, nuke and nukescripts modules."""
+    system = _module("System", DateTime=_DateTime(), Environment=Environment)
+    system.Diagnostics = _module("System.Diagnostics", ProcessStartInfo=ProcessStartInfo, Process=Process, ProcessPriorityClass=ProcessPriorityClass)
+    system.IO = _module("System.IO", Path=Path, Directory=Directory, File=File)
+    system.Net = _module("System.Net")
+    system.Net.NetworkInformation = _module("System.Net.NetworkInformation", NetworkInterface=NetworkInterface, NetworkInterfaceType=NetworkInterfaceType, OperationalStatus=OperationalStatus)
+    system.Net.Sockets = _module("System.Net.Sockets", AddressFamily=AddressFamily)
+
+    deadline = _module("Deadline")
+    deadline.Plugins = _module("Deadline.Plugins", DeadlinePlugin=DeadlinePlugin, PluginType=PluginType)
+    deadline.Scripting = _module("Deadline.Scripting", RepositoryUtils=RepositoryUtils, SystemUtils=SystemUtils, PathUtils=PathUtils)
+
+    frantic = _module("FranticX")
+    frantic.Processes = _module("FranticX.Processes", ManagedProcess=ManagedProcess)
+
+    try:
+        import six
+    except ImportError:
+        # The plugin only takes range from it
+        six = _module("six")
+        six.moves = _module("six.moves", range=range)
+
+    env = {"NukeVersionMajor": nukeVersion[0], "NukeVersionMinor": nukeVersion[1], "NukeVersionRelease": nukeVersion[2], "studio": False}
+    _module("nuke", STARTLINE=STARTLINE, env=env, Knob=Knob, Text_Knob=Text_Knob, String_Knob=String_Knob, File_Knob=File_Knob,
+            Multiline_Eval_String_Knob=Multiline_Eval_String_Knob, PyScript_Knob=PyScript_Knob, Enumeration_Knob=Enumeration_Knob,
+            Int_Knob=Int_Knob, Boolean_Knob=Boolean_Knob, root=_root, Root=_root, toNode=_toNode, selectedNodes=_selectedNodes,
+            scriptOpen=_scriptOpen, scriptClear=_scriptClear, scriptSave=lambda path=None: None, message=print,
+            ask=lambda question: True, executeInMainThread=_executeInMainThread)
+    _module("nukescripts", PythonPanel=PythonPanel)
@@ -0,0 +1,8 @@
+import os
+import sys
+
+# The plugin's helper modules and the submitter's are imported the way the plugin and Nuke do, from their folders
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for folder in (os.path.join(ROOT, "plugin", "CopyCat"), os.path.join(ROOT, "customSubmmiter")):
+    if folder not in sys.path:
+        sys.path.insert(0, folder)
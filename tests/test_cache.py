@@ -0,0 +1,28 @@
+import os
+
+import CopyCatCache
+
+def sequence(directory, name, frames=3, size=1000):
+    files = []
+    for frame in range(frames):
+        path = os.path.join(str(directory), f"{name}.{frame}.exr")
+        with open(path, "wb") as f:
+            f.write(b"x" * size)
+        files.append(path)
+    return os.path.join(str(directory), f"{name}.%d.exr"), files
+
+def test_pinned_entries_are_not_evicted(tmp_path):
+    source = tmp_path / "source"
+    source.mkdir()
+    root = str(tmp_path / "cache")
+    training = CopyCatCache.DatasetCache(root, 3500, log=lambda message: None)
+    training.stageSequence(*sequence(source, "a"))
+    other = CopyCatCache.DatasetCache(root, 3500, log=lambda message: None)
+    b = sequence(source, "b")
+    other.stageSequence(*b)
+    assert len(other._loadIndex()) == 2
+
+    training.release()
+    other.stageSequence(*b)
+    assert len(other._loadIndex()) == 1
+    other.release()
@@ -0,0 +1,24 @@
+import os
+
+import CopyCatTraining
+
+def writeCheckpoint(directory, name, size, mtime):
+    path = os.path.join(str(directory), name)
+    with open(path, "wb") as f:
+        f.write(b"x" * size)
+    os.utime(path, (mtime, mtime))
+    return path
+
+def test_latest_complete_checkpoint(tmp_path):
+    writeCheckpoint(tmp_path, "Training_1000.cat", 100, 1000)
+    complete = writeCheckpoint(tmp_path, "Training_2000.cat", 100, 2000)
+    writeCheckpoint(tmp_path, "Training_3000.cat", 10, 3000)
+    writeCheckpoint(tmp_path, "notes.txt", 100, 3000)
+    step, path, reasons = CopyCatTraining.findLatestCheckpoint(str(tmp_path))
+    assert (step, path) == (2000, complete)
+    assert reasons and "Training_3000.cat" in reasons[0]
+
+def test_checkpoints_older_than_the_job_are_ignored(tmp_path):
+    writeCheckpoint(tmp_path, "Training_1000.cat", 100, 1000)
+    assert CopyCatTraining.findLatestCheckpoint(str(tmp_path), newerThan=2000) is None
+    assert CopyCatTraining.findLatestCheckpoint(str(tmp_path / "missing")) is None
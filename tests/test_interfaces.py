@@ -0,0 +1,42 @@
+import pytest
+
+from CopyCatInterfaces import Interface, InterfaceError, chooseInterface
+
+MANAGEMENT = Interface("eth0", "192.168.1.20", 24, 1e9)
+FABRIC = Interface("ib0", "10.20.0.20", 16, 100e9)
+FABRIC_SLOW = Interface("eth1", "10.20.1.20", 16, 10e9)
+
+def test_interface_with_the_main_address():
+    interface, reason = chooseInterface([MANAGEMENT, FABRIC_SLOW, FABRIC], "10.20.1.20")
+    assert interface is FABRIC_SLOW
+    assert reason == "it has the main address"
+
+def test_fastest_on_the_main_subnet():
+    interface, reason = chooseInterface([MANAGEMENT, FABRIC_SLOW, FABRIC], "10.20.0.1")
+    assert interface is FABRIC
+    assert "fastest of 2 on the subnet" in reason
+
+def test_routed_interface():
+    interface, reason = chooseInterface([MANAGEMENT, FABRIC], "172.16.0.1", routed="192.168.1.20")
+    assert interface is MANAGEMENT
+    assert "route" in reason
+
+def test_fastest_when_nothing_reaches_the_main_address():
+    interface, _ = chooseInterface([MANAGEMENT, FABRIC], "172.16.0.1")
+    assert interface is FABRIC
+
+def test_preference_by_name_or_subnet():
+    assert chooseInterface([MANAGEMENT, FABRIC], "10.20.0.1", preference="ETH0")[0] is MANAGEMENT
+    assert chooseInterface([MANAGEMENT, FABRIC_SLOW, FABRIC], "10.20.0.1", preference="10.20.1.0/24")[0] is FABRIC_SLOW
+
+def test_preference_that_matches_nothing():
+    with pytest.raises(InterfaceError, match="No interface matches bond0"):
+        chooseInterface([MANAGEMENT, FABRIC], "10.20.0.1", preference="bond0")
+
+def test_no_interfaces():
+    with pytest.raises(InterfaceError, match="no network interface"):
+        chooseInterface([], "10.20.0.1")
+
+def test_ipv6_main_address_with_scope():
+    local = Interface("eth0", "fe80::20%eth0", 64, 1e9)
+    assert chooseInterface([MANAGEMENT, local], "fe80::1%eth0")[0] is local
@@ -0,0 +1,34 @@
+import re
+
+import CopyCatLog
+
+def test_lines_nothing_is_interested_in():
+    assert CopyCatLog.classifyLine("[12:01:33.120] Eddy[INFO] - Allocating device buffers for 4 inputs") is None
+
+def test_error_lines():
+    for line in ("ERROR: license", "Read1: Error : missing frame", "Eddy[ERROR] - out of memory"):
+        assert CopyCatLog.ERROR in CopyCatLog.classifyLine(line)
+
+def test_frame_line():
+    kinds = CopyCatLog.classifyLine("Frame 12 (3 of 20)")
+    assert CopyCatLog.FRAME in kinds
+    assert (kinds.Frame, kinds.FrameCount) == (3, 20)
+
+def test_training_line_has_several_kinds():
+    kinds = CopyCatLog.classifyLine("CopyCat: Step 1200/10000, Loss: 0.01234")
+    assert kinds.Kinds == {CopyCatLog.TRAINING}
+    kinds = CopyCatLog.classifyLine("ERROR: epoch 3 failed")
+    assert kinds.Kinds == {CopyCatLog.ERROR, CopyCatLog.TRAINING}
+
+def test_words_inside_other_words_are_not_training():
+    assert CopyCatLog.classifyLine("stepping through lossless frames") is None
+
+def test_ready_and_license():
+    assert CopyCatLog.READY in CopyCatLog.classifyLine("READY FOR INPUT")
+    assert CopyCatLog.LICENSE in CopyCatLog.classifyLine("Checking out a Licence")
+
+def test_handler_pattern_matches_the_lines_classified():
+    handler = re.compile(CopyCatLog.HANDLER_PATTERN)
+    for line in CopyCatLog.sampleLog(500):
+        assert bool(handler.match(line)) == (CopyCatLog.classifyLine(line) is not None)
+    assert handler.match("Frame 1 (1 of 1)").group(0) == "Frame 1 (1 of 1)"
@@ -0,0 +1,85 @@
+import pytest
+
+import CopyCatManifest
+
+def build(machines=("main", "w1"), ranksPerWorker=2):
+    return CopyCatManifest.buildManifest(list(machines), "10.0.0.1", 3000, ranksPerWorker, lambda machine, localRank: [localRank])
+
+def test_build_numbers_ranks_main_machine_first():
+    manifest = build()
+    assert manifest["WorldSize"] == 4
+    assert manifest["MainMachine"] == "main"
+    assert [(entry["Rank"], entry["Machine"], entry["LocalRank"], entry["Gpus"]) for entry in manifest["Ranks"]] == [
+        (0, "main", 0, ["0"]), (1, "main", 1, ["1"]), (2, "w1", 0, ["0"]), (3, "w1", 1, ["1"])]
+    assert CopyCatManifest.validateManifest(manifest) == []
+
+def test_build_without_machines():
+    manifest = build(machines=())
+    assert manifest["MainMachine"] == ""
+    assert CopyCatManifest.validateManifest(manifest) == ["the manifest has no ranks"]
+
+def test_validate_unsupported_version():
+    manifest = build()
+    manifest["Version"] = 99
+    assert "not supported" in CopyCatManifest.validateManifest(manifest)[0]
+
+def test_validate_duplicate_and_missing_ranks():
+    manifest = build()
+    manifest["Ranks"][3]["Rank"] = 2
+    problems = CopyCatManifest.validateManifest(manifest)
+    assert any("duplicates [2], missing [3]" in problem for problem in problems)
+
+def test_validate_shared_gpu_and_slot():
+    manifest = build()
+    manifest["Ranks"][1]["Gpus"] = ["0"]
+    manifest["Ranks"][3]["LocalRank"] = 0
+    problems = CopyCatManifest.validateManifest(manifest)
+    assert any("share GPU 0 of main" in problem for problem in problems)
+    assert any("are both w1 thread 0" in problem for problem in problems)
+
+def test_validate_main_address_port_and_rank_zero():
+    manifest = build()
+    manifest["MainAddress"] = "main.example.com"
+    manifest["Port"] = 65535
+    manifest["MainMachine"] = "w1"
+    problems = CopyCatManifest.validateManifest(manifest)
+    assert any("is not an IP address" in problem for problem in problems)
+    assert any("is not a usable port" in problem for problem in problems)
+    assert any("rank 0 is on main, not on the main machine w1" in problem for problem in problems)
+
+def test_validate_ipv6_main_address_with_scope():
+    manifest = CopyCatManifest.buildManifest(["main"], "fe80::1%eth0", 3000)
+    assert CopyCatManifest.validateManifest(manifest) == []
+
+def test_local_rank_outside_ranks_per_worker():
+    manifest = build()
+    manifest["Ranks"][1]["LocalRank"] = 2
+    problems = CopyCatManifest.validateManifest(manifest)
+    assert any("has local rank 2, the job runs 2 per machine" in problem for problem in problems)
+
+def test_lookup_ignores_machine_case():
+    rankManifest = CopyCatManifest.RankManifest(build())
+    assert rankManifest.lookup(" W1 ", 1)["Rank"] == 3
+    assert rankManifest.machines() == ["main", "w1"]
+
+def test_lookup_unknown_rank():
+    rankManifest = CopyCatManifest.RankManifest(build())
+    with pytest.raises(CopyCatManifest.ManifestError, match="w2 thread 0 has no rank"):
+        rankManifest.lookup("w2", 0)
+
+def test_invalid_manifest_is_refused():
+    manifest = build()
+    manifest["WorldSize"] = 5
+    with pytest.raises(CopyCatManifest.ManifestError, match="world size 5 but 4 ranks"):
+        CopyCatManifest.RankManifest(manifest)
+
+def test_write_and_load(tmp_path):
+    path = str(tmp_path / "job" / "manifest.json")
+    CopyCatManifest.writeManifest(build(), path)
+    assert CopyCatManifest.loadManifest(path).WorldSize == 4
+
+def test_load_unreadable(tmp_path):
+    path = tmp_path / "manifest.json"
+    path.write_text("{")
+    with pytest.raises(CopyCatManifest.ManifestError, match="Unable to read"):
+        CopyCatManifest.loadManifest(str(path))
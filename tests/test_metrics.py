@@ -0,0 +1,29 @@
+import time
+
+import CopyCatMetrics
+
+def test_render_with_labels():
+    metrics = CopyCatMetrics.RankMetrics(job="j1", rank=3)
+    metrics.update(step=120, rendezvous_wait_seconds=4.5)
+    text = metrics.render()
+    assert 'copycat_step{job="j1",rank="3"} 120' in text
+    assert "# HELP copycat_rendezvous_wait_seconds Seconds this rank spent in the plugin's rendezvous" in text
+    assert "copycat_loss" not in text
+
+def test_process_measurements_do_not_stamp_the_update_time():
+    metrics = CopyCatMetrics.RankMetrics()
+    metrics.update(stamp=False, process_resident_bytes=1)
+    assert "copycat_last_update_timestamp_seconds" not in metrics.render()
+
+def test_textfile_is_written_without_training_output(tmp_path):
+    textfile = str(tmp_path / "rank0.prom")
+    exporter = CopyCatMetrics.MetricsExporter(CopyCatMetrics.RankMetrics(rank=0), textfile, interval=1, log=lambda message: None)
+    try:
+        exporter.metrics.update(step=1)
+        deadline = time.time() + 5
+        while time.time() < deadline and "copycat_step" not in (open(textfile).read() if (tmp_path / "rank0.prom").exists() else ""):
+            time.sleep(0.1)
+        assert "copycat_step" in open(textfile).read()
+    finally:
+        exporter.close()
+    assert not (tmp_path / "rank0.prom").exists()
@@ -0,0 +1,24 @@
+import time
+
+import CopyCatNetwork
+
+def test_machines_are_resolved_together(monkeypatch):
+    def slowResolve(hostname):
+        time.sleep(0.2)
+        return {"ipv4": "10.0.%d.1" % int(hostname[3:]), "ipv6": None}
+    monkeypatch.setattr(CopyCatNetwork, "resolveHost", slowResolve)
+    monkeypatch.setattr(CopyCatNetwork, "_resolver", CopyCatNetwork.HostResolver(timeout=2))
+    machines = ["gpu%02d" % index for index in range(16)]
+    start = time.time()
+    distance, source = CopyCatNetwork.machineDistance(machines)
+    assert time.time() - start < 1.0
+    assert source == "subnets of the machines"
+    assert distance("gpu01", "gpu01") == 0.0 and distance("gpu01", "gpu02") == 1.0
+
+def test_hosts_that_time_out_have_no_entry(monkeypatch):
+    monkeypatch.setattr(CopyCatNetwork, "resolveHost", lambda hostname: time.sleep(0.5) or {"ipv4": "10.0.0.1", "ipv6": None})
+    resolver = CopyCatNetwork.HostResolver(timeout=0.1)
+    resolver._cache["cached"] = {"ipv4": "10.0.0.2", "ipv6": None, "Timestamp": time.time()}
+    entries = resolver.resolveAll(["cached", "slow"])
+    assert entries["cached"]["ipv4"] == "10.0.0.2"
+    assert entries["slow"] is None
@@ -0,0 +1,122 @@
+import os
+import json
+import time
+import threading
+
+import pytest
+
+import CopyCatRendezvous
+from CopyCatRendezvous import ElasticRendezvous, RendezvousError
+
+@pytest.fixture(autouse=True)
+def fastPolling(monkeypatch):
+    monkeypatch.setattr(CopyCatRendezvous, "_ELASTIC_POLL_SECONDS", 0.05)
+    monkeypatch.setattr(CopyCatRendezvous, "ELASTIC_HEARTBEAT_SECONDS", 0.1)
+    monkeypatch.setattr(CopyCatRendezvous, "ELASTIC_HEARTBEAT_STALE", 0.5)
+
+def rank(directory, machine, thread=0, worldSize=2, **options):
+    options.setdefault("joinWindow", 0.2)
+    options.setdefault("log", lambda message: None)
+    return ElasticRendezvous(str(directory), machine, thread, f"10.0.0.{len(machine)}", worldSize, **options)
+
+def joinAll(ranks, timeout=5):
+    results = {}
+    def join(rendezvous):
+        try:
+            results[rendezvous.memberId] = rendezvous.join(timeout)
+        except RendezvousError as e:
+            results[rendezvous.memberId] = e
+    threads = [threading.Thread(target=join, args=(rendezvous,)) for rendezvous in ranks]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+def test_full_world_in_preferred_order(tmp_path):
+    order = ("main", "worker")
+    results = joinAll([rank(tmp_path, "worker", preferredOrder=order), rank(tmp_path, "Main", preferredOrder=order)])
+    assert results["main_0"]["Rank"] == 0 and results["worker_0"]["Rank"] == 1
+    assert results["main_0"]["WorldSize"] == 2
+    assert results["worker_0"]["MainAddress"] == results["main_0"]["Members"][0]["Address"]
+    assert results["main_0"]["Generation"] == 0
+
+def test_min_world_size_defaults_to_half_the_world(tmp_path):
+    with pytest.raises(RendezvousError, match="at least 2 ranks"):
+        rank(tmp_path, "main", worldSize=4).join(1)
+    world = rank(tmp_path, "main", worldSize=2).join(2)
+    assert world["WorldSize"] == 1
+
+def test_smaller_world_after_the_join_window(tmp_path):
+    world = rank(tmp_path, "main", worldSize=3, minWorldSize=1).join(2)
+    assert world["WorldSize"] == 1
+
+def test_release_is_stored_with_the_world(tmp_path):
+    world = rank(tmp_path, "main", worldSize=1, release=lambda: {"Checkpoint": "Training_100.cat"}).join(2)
+    assert world["Checkpoint"] == "Training_100.cat"
+
+def test_fresh_world_lock_is_respected(tmp_path):
+    generation = tmp_path / "gen_0000"
+    generation.mkdir()
+    (generation / "world.json.lock").write_text(json.dumps({"Owner": "dead_0", "Time": time.time()}))
+    with pytest.raises(RendezvousError, match="No world"):
+        rank(tmp_path, "main", worldSize=1).join(0.5)
+
+def test_stale_world_lock_is_broken(tmp_path):
+    generation = tmp_path / "gen_0000"
+    generation.mkdir()
+    (generation / "world.json.lock").write_text(json.dumps({"Owner": "dead_0", "Time": time.time() - CopyCatRendezvous.ELASTIC_LOCK_STALE - 1}))
+    world = rank(tmp_path, "main", worldSize=1).join(2)
+    assert world["Generation"] == 0
+    assert json.loads((generation / "world.json.lock").read_text())["Owner"] == "main_0"
+
+def test_late_joiner_waits_for_the_training_world(tmp_path):
+    ranks = [rank(tmp_path, "main"), rank(tmp_path, "worker")]
+    worlds = joinAll(ranks)
+    for rendezvous in ranks:
+        rendezvous.startHeartbeat(worlds[rendezvous.memberId]["Generation"])
+    try:
+        late = rank(tmp_path, "late", minWorldSize=1)
+        with pytest.raises(RendezvousError, match="generation 0 kept training"):
+            late.join(1.5)
+        assert not os.path.exists(os.path.join(str(tmp_path), "gen_0001", "world.json"))
+    finally:
+        for rendezvous in ranks:
+            rendezvous.stopHeartbeat()
+
+def test_next_generation_forms_once_the_world_stopped(tmp_path):
+    ranks = [rank(tmp_path, "main"), rank(tmp_path, "worker")]
+    joinAll(ranks)
+    # The world failed, its ranks retry together with a substitute for a dead worker
+    results = joinAll([rank(tmp_path, "main"), rank(tmp_path, "spare")])
+    assert results["main_0"]["Generation"] == 1
+    assert sorted(member["Machine"] for member in results["main_0"]["Members"]) == ["main", "spare"]
+
+def test_survivor_stops_once_a_peer_is_lost(tmp_path):
+    ranks = [rank(tmp_path, "main"), rank(tmp_path, "worker")]
+    worlds = joinAll(ranks)
+    lost = threading.Event()
+    reasons = []
+    def onPeerLost(reason):
+        reasons.append(reason)
+        lost.set()
+    world = worlds["main_0"]
+    ranks[0].startHeartbeat(world["Generation"], world["Members"], onPeerLost=onPeerLost)
+    # The worker died before its first heartbeat
+    try:
+        assert lost.wait(2)
+        assert "worker_0" in reasons[0]
+        # The survivor stopped beating, so the next generation doesn't wait for it
+        time.sleep(CopyCatRendezvous.ELASTIC_HEARTBEAT_STALE)
+        assert not ranks[0]._worldAlive(0)
+    finally:
+        ranks[0].stopHeartbeat()
+
+def test_finished_peers_are_not_lost(tmp_path):
+    ranks = [rank(tmp_path, "main"), rank(tmp_path, "worker")]
+    worlds = joinAll(ranks)
+    members = worlds["main_0"]["Members"]
+    ranks[1].startHeartbeat(0)
+    ranks[1].stopHeartbeat(finished=True)
+    time.sleep(CopyCatRendezvous.ELASTIC_HEARTBEAT_STALE)
+    assert ranks[0].stalePeers(0, members) == []
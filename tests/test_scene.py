@@ -0,0 +1,98 @@
+import os
+
+import CopyCatScene
+
+SCRIPT = """#! nuke -nx
+version 14.1 v1
+Root {
+ inputs 0
+ name /shots/a/comp.nk
+ project_directory "\\[python \\{nuke.script_directory()\\}]"
+}
+Read {
+ inputs 0
+ file /mnt/plates/a.####.exr
+ first 1001
+ last 1003
+ name Plate
+}
+set N1 [stack 0]
+Group {
+ name Grade
+ addUserKnob {20 User}
+ addUserKnob {7 gain
+  l Gain}
+}
+ Input {
+  inputs 0
+  name Input1
+ }
+ Grade {
+  name Inner
+ }
+ Output {
+  name Output1
+ }
+end_group
+Read {
+ inputs 0
+ file "P:\\\\shots\\\\target.%04d.exr"
+ name Target
+}
+CopyCat {
+ inputs 2
+ dataDirectory /mnt/train/a
+ name CopyCat1
+}
+push $N1
+Write {
+ file "[file dirname [value root.name]]/out.exr"
+ name Write1
+}
+"""
+
+def lines():
+    return SCRIPT.splitlines()
+
+def test_find_node_and_knobs():
+    node = CopyCatScene.findNode(lines(), "CopyCat1")
+    assert node.Class == "CopyCat"
+    assert node.knob("dataDirectory") == "/mnt/train/a"
+    assert node.knob("missing", "default") == "default"
+    assert CopyCatScene.findNode(lines(), "Nothing") is None
+
+def test_quoted_and_braced_values():
+    assert CopyCatScene.parseKnobValue('"a b"') == "a b"
+    assert CopyCatScene.parseKnobValue("{1 2}") == "1 2"
+    assert CopyCatScene.parseKnobValue("plain") == "plain"
+
+def test_multi_line_knobs_are_skipped():
+    group = CopyCatScene.findNode(lines(), "Grade")
+    assert group.Class == "Group"
+    assert "l" not in group.Knobs
+
+def test_node_graph_follows_the_stack_and_groups():
+    nodes = CopyCatScene.readNodeGraph(lines())
+    copycat = next(node for node in nodes if node.name() == "CopyCat1")
+    assert [node.name() for node in copycat.Inputs] == ["Target", "Grade"]
+    inner = next(node for node in nodes if node.name() == "Inner")
+    assert inner.Parent.name() == "Grade"
+    write = next(node for node in nodes if node.name() == "Write1")
+    assert write.Inputs[0].name() == "Plate"
+
+def test_upstream_reads_through_groups():
+    nodes = CopyCatScene.readNodeGraph(lines())
+    copycat = next(node for node in nodes if node.name() == "CopyCat1")
+    assert sorted(node.name() for node in CopyCatScene.findUpstreamNodes(copycat, "Read")) == ["Plate", "Target"]
+
+def test_expand_sequence():
+    assert CopyCatScene.expandSequence("/mnt/plates/a.####.exr", 8, 10) == [os.path.join("/mnt/plates", f"a.{frame:04d}.exr") for frame in (8, 9, 10)]
+    assert CopyCatScene.expandSequence("/mnt/plates/b.%03d.exr", 1, 1) == [os.path.join("/mnt/plates", "b.001.exr")]
+    assert CopyCatScene.expandSequence("/mnt/plates/still.exr", 1, 5) == ["/mnt/plates/still.exr"]
+
+def test_path_strings_anywhere_in_the_script():
+    values = CopyCatScene.readPathStrings(lines())
+    assert "/mnt/plates/a.####.exr" in values
+    assert "/mnt/train/a" in values
+    assert "/shots/a/comp.nk" in values
+    assert "P:\\\\shots\\\\target.%04d.exr" in values
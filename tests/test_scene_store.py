@@ -0,0 +1,13 @@
+import CopyCatCache
+
+def test_scene_store_pins_the_project_directory(tmp_path):
+    scene = tmp_path / "shot" / "comp.nk"
+    scene.parent.mkdir()
+    scene.write_text('Root {\n inputs 0\n project_directory "\\[python \\{nuke.script_directory()\\}]"\n}\nRead {\n file plates/a.exr\n}\n')
+    store = CopyCatCache.SceneStore(str(tmp_path / "store"), log=lambda message: None)
+    storedScene, digest = store.addScene(str(scene))
+    content = open(storedScene).read()
+    assert 'project_directory "%s"' % str(scene.parent).replace("\\", "/") in content
+    assert "script_directory" not in content
+    assert CopyCatCache.SceneStore.verifyScene(storedScene, digest)
+    assert store.addScene(str(scene)) == (storedScene, digest)
@@ -0,0 +1,22 @@
+import CopyCatTraining
+
+def test_single_rank_does_not_sync():
+    assert CopyCatTraining.chooseSyncInterval(0.001, 1e9, 1)[0] == 1
+
+def test_fast_network_syncs_every_step():
+    interval, reasons = CopyCatTraining.chooseSyncInterval(0.00005, 25e9, 4)
+    assert interval == 1
+    assert len(reasons) == 4
+
+def test_slow_network_syncs_less_often():
+    fast = CopyCatTraining.chooseSyncInterval(0.0005, 1e9, 8)[0]
+    slow = CopyCatTraining.chooseSyncInterval(0.0005, 500e6, 8)[0]
+    assert 1 < fast < slow <= CopyCatTraining.MAX_SYNC_INTERVAL
+
+def test_sync_interval_is_capped():
+    assert CopyCatTraining.chooseSyncInterval(1.0, 1e3, 16, "Large")[0] == CopyCatTraining.MAX_SYNC_INTERVAL
+
+def test_slowest_link_from_probe():
+    matrix = {"a": {"b": {"Rtt": 0.002, "Bandwidth": 5e8}}, "b": {"a": {"Rtt": 0.001, "Bandwidth": 2e8}}}
+    assert CopyCatTraining.slowestLinkFromProbe(matrix, ["a", "b"]) == (0.001, 2e8)
+    assert CopyCatTraining.slowestLinkFromProbe(matrix, ["a", "b", "c"]) is None
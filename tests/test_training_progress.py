@@ -0,0 +1,25 @@
+import CopyCatTraining
+
+def test_progress_from_steps():
+    progress = CopyCatTraining.TrainingProgress(worldSize=2, batchSize=4)
+    assert progress.progress() is None
+    assert progress.parseLine("CopyCat: Step 100/1000, Loss: 0.5", now=0.0)
+    assert progress.parseLine("CopyCat: step 300 of 1000", now=10.0)
+    assert not progress.parseLine("Eddy[INFO] - allocating buffers", now=11.0)
+    assert progress.progress() == 30.0
+    assert progress.stepsPerSecond() == 20.0
+    assert progress.etaSeconds() == 35.0
+    assert progress.statusMessage() == "Step 300/1000 | Loss 0.5 | 20.00 steps/s (160.0 samples/s on 2 ranks) | ETA 35s"
+
+def test_progress_from_epochs():
+    progress = CopyCatTraining.TrainingProgress()
+    progress.parseLine("Epoch 5 of 20")
+    assert progress.progress() == 25.0
+    assert progress.stepsPerSecond() is None
+
+def test_rate_window_drops_old_samples():
+    progress = CopyCatTraining.TrainingProgress(window=60.0)
+    for second, step in ((0.0, 0), (10.0, 1000), (100.0, 1100), (110.0, 1200)):
+        progress.updateStep(step, 10000, now=second)
+    # Only the last two samples are in the window
+    assert progress.stepsPerSecond() == 10.0
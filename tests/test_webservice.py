@@ -0,0 +1,95 @@
+import socket
+import http.client
+
+import pytest
+
+from CopyCatWebService import WebServiceClient, WebServiceError
+
+class FakeResponse(object):
+    def __init__(self, status, body=b"{}"):
+        self.status = status
+        self.reason = http.client.responses.get(status, "")
+        self.will_close = False
+        self._body = body
+
+    def read(self):
+        return self._body
+
+class FakeConnection(object):
+    """Answers with the next of answers, an exception is raised by getresponse."""
+
+    def __init__(self, answers, log):
+        self.answers = answers
+        self.log = log
+        self.sock = None
+        self.timeout = None
+
+    def request(self, method, path, body=None, headers=None):
+        self.log.append((id(self), method, path))
+
+    def getresponse(self):
+        answer = self.answers.pop(0)
+        if isinstance(answer, Exception):
+            raise answer
+        return answer
+
+    def close(self):
+        pass
+
+@pytest.fixture
+def client():
+    client = WebServiceClient("deadline:8081", backoff=0)
+    client.answers = []
+    client.sent = []
+    client._connect = lambda timeout: FakeConnection(client.answers, client.sent)
+    return client
+
+def test_get_is_retried_on_busy_answers(client):
+    client.answers.extend([FakeResponse(503), FakeResponse(502), FakeResponse(200, b'["gpu"]')])
+    assert client.Pools.GetPoolNames() == ["gpu"]
+    assert len(client.sent) == 3
+
+def test_get_gives_up_after_the_retries(client):
+    client.answers.extend([FakeResponse(503)] * 4)
+    with pytest.raises(WebServiceError) as error:
+        client.Groups.GetGroupNames()
+    assert error.value.status == 503
+    assert len(client.sent) == 4
+
+def test_get_is_retried_on_timeouts(client):
+    client.answers.extend([socket.timeout(), FakeResponse(200, b"[]")])
+    assert client.Pools.GetPoolNames() == []
+
+def test_submission_is_not_retried_once_sent(client):
+    client.answers.extend([FakeResponse(503)])
+    with pytest.raises(WebServiceError, match="returned 503"):
+        client.Jobs.SubmitJob({}, {})
+    client.answers[:] = [socket.timeout(), FakeResponse(200)]
+    with pytest.raises(WebServiceError, match="timed out"):
+        client.Jobs.SubmitJob({}, {})
+    assert len(client.sent) == 2
+
+def test_submission_is_retried_when_an_idle_connection_was_closed(client):
+    # The first request leaves its connection in the pool, the server closes it before the submission
+    client.answers.extend([FakeResponse(200, b"[]"), http.client.RemoteDisconnected("closed"), FakeResponse(200, b'{"_id": "job"}')])
+    client.Pools.GetPoolNames()
+    assert client.Jobs.SubmitJob({}, {}) == {"_id": "job"}
+    assert len(client.sent) == 3
+    assert client.sent[0][0] == client.sent[1][0] != client.sent[2][0]
+
+def test_client_errors_are_not_retried(client):
+    client.answers.extend([FakeResponse(404, b"no such pool")])
+    with pytest.raises(WebServiceError, match="404: no such pool"):
+        client.Pools.GetPoolNames()
+
+def test_plain_text_answers(client):
+    client.answers.extend([FakeResponse(200, b"Success")])
+    assert client.request("PUT", "/api/jobs") == "Success"
+
+def test_host_forms():
+    assert (WebServiceClient("https://deadline.example.com").port, WebServiceClient("deadline").port) == (443, 8081)
+
+def test_maximum_priority(client):
+    client.answers.extend([FakeResponse(200, b"250")])
+    assert client.Misc.GetMaximumPriority() == 250
+    assert client.sent[0][1:] == ("GET", "/api/maximumpriority")